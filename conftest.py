@@ -0,0 +1,16 @@
+import cadquery as cq
+import numpy as np
+
+from mesh import Mesh, volume
+
+# Helpers shared by the tests, pytest puts this directory on sys.path so
+# they're imported with "from conftest import ..."
+
+
+def mesh_volume(shape: cq.Shape) -> float:
+    """
+    The volume of the tessellation, Shape.Volume isn't accurate
+    for the faces between exact helixes
+    """
+    vertices, triangles = shape.tessellate(1e-3, 0.1)
+    return volume(Mesh(np.array([v.toTuple() for v in vertices]), np.array(triangles)))
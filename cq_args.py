@@ -0,0 +1,102 @@
+import argparse
+import os
+
+# The command line arguments of the stl cache, cq-daemon, the watchdog
+# and profiling. Only the standard library is imported so the scripts
+# print their help without importing cq_cache, cq_daemon, cq_watchdog or
+# cq_profile, which are imported after the arguments are parsed.
+
+# Default directory of the cache, overridden by $CQ_THREADS_CACHE
+DFLT_cache_directory: str = os.environ.get(
+    "CQ_THREADS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "cq-threads")
+)
+
+# Default maximum size of the cached files
+DFLT_cache_max_mb: float = 1024
+
+# Default path of the daemon's socket, overridden by $CQ_THREADS_SOCKET.
+# $TMPDIR rather than tempfile.gettempdir(), importing tempfile imports
+# shutil and random which is about a sixth of the time to print the help.
+DFLT_socket_path: str = os.environ.get(
+    "CQ_THREADS_SOCKET",
+    os.path.join(os.environ.get("TMPDIR", "/tmp"), f"cq-threads-{os.getuid()}.sock"),
+)
+
+# Default seconds a job may take, 0 is no limit
+DFLT_timeout: float = 0
+
+# Default MB a job may allocate, 0 is no limit
+DFLT_max_memory_mb: float = 0
+
+# File extensions of --profile which dump cProfile stats, anything else is json
+PSTATS_EXTENSIONS = (".prof", ".pstats")
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the command line arguments to control the StlCache"""
+    parser.add_argument(
+        "--no_cache",
+        help="Always generate the stl file, don't use the cache",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        help="Directory of the stl cache, also set by $CQ_THREADS_CACHE",
+        default=DFLT_cache_directory,
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        help="Maximum size of the stl cache in MB",
+        type=float,
+        default=DFLT_cache_max_mb,
+    )
+    parser.add_argument(
+        "--thread_cache_dir",
+        help="Directory where thread Solids are cached as BREP files, default is none",
+        default=None,
+    )
+
+
+def add_daemon_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the command line arguments to use a running daemon"""
+    parser.add_argument(
+        "--socket",
+        help="Socket of cq-daemon, also set by $CQ_THREADS_SOCKET",
+        default=DFLT_socket_path,
+    )
+    parser.add_argument(
+        "--no_daemon",
+        help="Build the part in this process even if cq-daemon is running",
+        action="store_true",
+    )
+
+
+def add_watchdog_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the command line arguments for the Limits of jobs"""
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        help="Seconds a part may take to build before it's killed and retried with coarser parameters, 0 is no limit",
+        type=float,
+        default=DFLT_timeout,
+    )
+    parser.add_argument(
+        "--max_memory_mb",
+        help="MB a part may allocate while it's built, 0 is no limit",
+        type=float,
+        default=DFLT_max_memory_mb,
+    )
+    parser.add_argument(
+        "--no_retry",
+        help="Don't retry a part that fails or is killed with coarser parameters",
+        action="store_true",
+    )
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the command line arguments to control profiling"""
+    parser.add_argument(
+        "--profile",
+        help=f"Write the time, memory and counts of each stage as json to PROFILE, or cProfile stats if it ends with {' or '.join(PSTATS_EXTENSIONS)}",
+        default=None,
+    )
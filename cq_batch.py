@@ -0,0 +1,383 @@
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from math import sqrt
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import cadquery as cq
+from helical_thread import ThreadHelixes, helical_thread
+
+from cq_bolt import cq_bolt
+from cq_cache import StlCache
+from cq_chunks import build_chunked
+from cq_nut import cq_nut
+from cq_params import (
+    BUDGET_PASSES,
+    DFLT_directory,
+    JobResult,
+    PartParams,
+    budget_scale,
+    pair_params,
+)
+from cq_profile import Stage, stage
+from cq_stl import ExportResult, export_stl
+from cq_threads import PREVIEW_OPTIONS, ThreadCache, ThreadOptions, set_thread_cache
+from cq_validate import ParamProblem, check_params, validate_params
+from cq_watchdog import FALLBACKS, Limits, run_limited
+from mesh import Mesh, write_stl
+from mesh_parts import mesh_bolt, mesh_nut
+
+
+def build_part(
+    params: PartParams, ths: Optional[ThreadHelixes] = None
+) -> Union[cq.Workplane, Mesh]:
+    """
+    Build the bolt or nut defined by params
+
+    :param params: The parameters of the part
+    :param ths: If not None the helixes of params.helical_thread(),
+                shared by the parts of a pair, otherwise they're computed
+    :returns: Workplane containing the part or its Mesh if params.engine is "mesh",
+              if params.quality is "preview" the Workplane contains the
+              separate Solids of the head, core and threads, if
+              params.chunks > 1 it's built by cq_chunks.build_chunked
+    :raises ValueError: If params are invalid, see cq_validate
+    """
+    check_params(params)
+    if ths is None:
+        ths = helical_thread(params.helical_thread())
+    if params.engine == "mesh":
+        return build_mesh(ths, params)
+
+    opts: ThreadOptions = ThreadOptions(
+        replicate=params.replicate, native_helix=params.native_helix
+    )
+    union: bool = params.union
+    if params.quality == "preview":
+        opts = PREVIEW_OPTIONS
+        union = False
+
+    if union and (params.chunks > 1):
+        return build_chunked(params, ths, opts)
+
+    if params.part == "bolt":
+        return cq_bolt(
+            ths,
+            params.head_size,
+            params.head_height,
+            params.wall_thickness,
+            opts,
+            union,
+        )
+    else:
+        return cq_nut(ths, params.head_size, opts, union)
+
+
+def build_mesh(ths: ThreadHelixes, params: PartParams) -> Mesh:
+    """
+    Create the Mesh of the bolt or nut defined by params. If params.max_triangles
+    > 0 and there are more triangles the tolerances are increased and the
+    Mesh is created again, up to BUDGET_PASSES times.
+    """
+    scale: float = 1
+    mesh: Mesh
+    for i in range(BUDGET_PASSES):
+        mesh = _build_mesh(ths, params, scale)
+        triangles: int = len(mesh.faces)
+        if (params.max_triangles <= 0) or (triangles <= params.max_triangles):
+            break
+        if i < BUDGET_PASSES - 1:
+            scale *= budget_scale(triangles, params.max_triangles)
+
+    # The mesh deviates from the helixes and circles by no more than the tolerances
+    mesh.deviation = max(params.stl_tolerance, params.core_tolerance) * scale
+    return mesh
+
+
+def _build_mesh(ths: ThreadHelixes, params: PartParams, scale: float) -> Mesh:
+    """Create the Mesh with the tolerances of params multiplied by scale"""
+    angular_scale: float = sqrt(scale)
+    if params.part == "bolt":
+        return mesh_bolt(
+            ths,
+            params.head_size,
+            params.head_height,
+            params.wall_thickness,
+            params.stl_tolerance * scale,
+            params.angular_tolerance * angular_scale,
+            params.core_tolerance * scale,
+            params.core_angular_tolerance * angular_scale,
+        )
+    else:
+        return mesh_nut(
+            ths,
+            params.head_size,
+            params.stl_tolerance * scale,
+            params.angular_tolerance * angular_scale,
+            params.core_tolerance * scale,
+            params.core_angular_tolerance * angular_scale,
+        )
+
+
+def export_part(
+    part: Union[cq.Workplane, Mesh], params: PartParams, path: str
+) -> ExportResult:
+    """Export part as defined by params to path"""
+    if isinstance(part, Mesh):
+        s: Stage
+        start: float = time.perf_counter()
+        with stage("export.write") as s:
+            size: int = write_stl(part, path, params.stl_format, params.stl_gzip)
+            s.count(triangles=len(part.faces), bytes=size)
+        return ExportResult(
+            path,
+            size,
+            time.perf_counter() - start,
+            triangles=len(part.faces),
+            deviation=part.deviation,
+        )
+
+    return export_stl(
+        part,
+        path,
+        params.stl_tolerance,
+        params.angular_tolerance,
+        stl_format=params.stl_format,
+        compress=params.stl_gzip,
+        core_tolerance=params.core_tolerance,
+        core_angular_tolerance=params.core_angular_tolerance,
+        max_triangles=params.max_triangles,
+        jobs=params.jobs,
+    )
+
+
+def run_job(
+    params: PartParams,
+    directory: str = DFLT_directory,
+    cache: Optional[StlCache] = None,
+    ths: Optional[ThreadHelixes] = None,
+    path: Optional[str] = None,
+) -> JobResult:
+    """
+    Build the part and export it as an stl file to directory. Exceptions
+    are caught and returned in JobResult.error so a failing job doesn't
+    stop a batch.
+
+    If cache isn't None the part is only built if it's not in the cache.
+    If ths isn't None they're the helixes of params, see build_part.
+    If path isn't None it's the stl file rather than params.path(directory).
+    If params are invalid nothing is built and JobResult.skipped is True.
+    """
+    result: JobResult = _validate_job(params, directory)
+    if path is not None:
+        result.path = path
+    if result.skipped:
+        return result
+    start: float = time.perf_counter()
+    try:
+        if cache is not None and cache.get(params, result.path):
+            result.cached = True
+        else:
+            part: Union[cq.Workplane, Mesh] = build_part(params, ths)
+            er: ExportResult = export_part(part, params, result.path)
+            result.export_seconds = er.seconds
+            result.triangles = er.triangles
+            result.deviation = er.deviation
+            if cache is not None:
+                cache.put(params, result.path)
+        result.bytes = os.path.getsize(result.path)
+        result.ok = True
+    except Exception:
+        result.error = traceback.format_exc()
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _validate_job(params: PartParams, directory: str) -> JobResult:
+    """
+    Return the JobResult of params with the warnings from validate_params,
+    if there are errors it's skipped and they're the error.
+    """
+    result: JobResult = JobResult(params=params, path=params.path(directory))
+    problems: List[ParamProblem] = validate_params(params)
+    result.warnings = [str(p) for p in problems if not p.error]
+    errors: List[str] = [str(p) for p in problems if p.error]
+    if errors:
+        result.skipped = True
+        result.error = "\n".join(errors)
+    return result
+
+
+def _init_worker(thread_cache_dir: Optional[str]) -> None:
+    """Each worker caches the threads so parts with the same threads share them"""
+    set_thread_cache(ThreadCache(thread_cache_dir))
+
+
+def _watched_job(
+    thread_cache_dir: Optional[str],
+    params: PartParams,
+    directory: str,
+    cache: Optional[StlCache],
+    ths: Optional[ThreadHelixes],
+) -> JobResult:
+    """run_job in the process forked by run_limited"""
+    if thread_cache_dir is not None:
+        set_thread_cache(ThreadCache(thread_cache_dir))
+    return run_job(params, directory, cache, ths)
+
+
+def run_watched(
+    params: PartParams,
+    directory: str = DFLT_directory,
+    cache: Optional[StlCache] = None,
+    limits: Limits = Limits(),
+    thread_cache_dir: Optional[str] = None,
+    ths: Optional[ThreadHelixes] = None,
+) -> JobResult:
+    """
+    Run the job in a process forked for it, see cq_watchdog.run_limited,
+    which is killed if it exceeds limits. If it fails, is killed or runs
+    out of memory and limits.retry the job is run again with each of
+    cq_watchdog.FALLBACKS until one succeeds. A fallback's stl file is
+    its own path, which encodes the coarser options, see PartParams.fname,
+    so it isn't mistaken for, or cached as, the requested part.
+
+    :param params: The parameters of the part
+    :param directory: Where the stl file is written
+    :param cache: If not None the StlCache used by each attempt
+    :param limits: The limits of each attempt
+    :param thread_cache_dir: If not None the ThreadCache directory
+    :param ths: If not None the helixes of params, see build_part
+    :returns: The JobResult of the attempt which succeeded, or the last
+              one, its params are params, its path is the file of the
+              attempt, fallback is the name of the fallback used and
+              error has the errors of each attempt
+    """
+    result: JobResult = _validate_job(params, directory)
+    if result.skipped:
+        return result
+
+    attempts: List[Tuple[Optional[str], PartParams]] = [(None, params)]
+    if limits.retry:
+        attempts.extend((name, f(params)) for name, f in FALLBACKS.items())
+
+    errors: List[str] = []
+    start: float = time.perf_counter()
+    for fallback, p in attempts:
+        r: Optional[JobResult]
+        error: Optional[str]
+        r, error = run_limited(
+            _watched_job,
+            # The FALLBACKS don't change the threads so ths are the same
+            (thread_cache_dir, p, directory, cache, ths),
+            limits,
+        )
+        if (r is not None) and not r.ok:
+            error = r.error
+        if r is not None:
+            result = r
+        result.fallback = fallback
+        result.attempts = len(errors) + 1
+        if result.ok:
+            break
+        errors.append(f"{fallback or 'params'}: {error}")
+
+    result.params = params
+    result.seconds = time.perf_counter() - start
+    if not result.ok:
+        result.error = "\n".join(errors)
+    return result
+
+
+def run_batch(
+    jobs: Sequence[PartParams],
+    directory: str = DFLT_directory,
+    max_workers: Optional[int] = None,
+    cache: Optional[StlCache] = None,
+    thread_cache_dir: Optional[str] = None,
+    limits: Optional[Limits] = None,
+) -> Iterator[JobResult]:
+    """
+    Run the jobs on a pool of processes yielding each JobResult as
+    the job completes, so the order is not the order of jobs.
+
+    If limits isn't None each job is run by run_watched, max_workers
+    threads each wait for a process forked for one job, so a job which
+    never finishes is killed rather than stalling its worker.
+
+    :param jobs: The parts to generate
+    :param directory: Where the stl files are written
+    :param max_workers: Number of processes, None is os.cpu_count()
+    :param cache: If not None the StlCache used by each job
+    :param thread_cache_dir: If not None the ThreadCache directory shared
+                             by the workers, otherwise the ThreadCache of
+                             each worker is only in memory
+    :param limits: If not None the Limits of each job
+    :returns: Iterator of JobResult, jobs whose parameters are invalid
+              are skipped and their JobResult is yielded first
+    """
+    os.makedirs(directory, exist_ok=True)
+    valid: List[PartParams] = []
+    for params in jobs:
+        result: JobResult = _validate_job(params, directory)
+        if result.skipped:
+            yield result
+        else:
+            valid.append(params)
+
+    if limits is not None:
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            futures = [
+                pool.submit(
+                    run_watched, params, directory, cache, limits, thread_cache_dir
+                )
+                for params in valid
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(thread_cache_dir,),
+    ) as executor:
+        futures = [
+            executor.submit(run_job, params, directory, cache) for params in valid
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def run_pair(
+    params: PartParams,
+    directory: str = DFLT_directory,
+    cache: Optional[StlCache] = None,
+    thread_cache_dir: Optional[str] = None,
+) -> Tuple[JobResult, JobResult]:
+    """
+    Generate a bolt and the nut that it mates with. The ThreadHelixes
+    are computed once, the bolt uses the external helixes and the nut
+    the internal ones, and the two parts are built in parallel by a
+    pool of two processes.
+
+    :param params: The parameters of both parts, see pair_params
+    :param directory: Where the stl files are written
+    :param cache: If not None the StlCache used by each job
+    :param thread_cache_dir: If not None the ThreadCache directory
+                             shared by the workers
+    :returns: The JobResult of the bolt and of the nut
+    """
+    bolt, nut = pair_params(params)
+    ths: ThreadHelixes = helical_thread(params.helical_thread())
+    os.makedirs(directory, exist_ok=True)
+    with ProcessPoolExecutor(
+        max_workers=2,
+        initializer=_init_worker,
+        initargs=(thread_cache_dir,),
+    ) as executor:
+        futures = [
+            executor.submit(run_job, p, directory, cache, ths) for p in (bolt, nut)
+        ]
+        return futures[0].result(), futures[1].result()
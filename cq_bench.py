@@ -0,0 +1,304 @@
+import json
+import os
+import platform
+import time
+import traceback
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union, cast
+
+import cadquery as cq
+from helical_thread import ThreadHelixes, helical_thread
+
+from cq_batch import build_part, export_part
+from cq_cache import library_versions
+from cq_params import PartParams, expand_grid
+from cq_profile import peak_rss_mb
+from cq_stl import ExportResult
+from cq_threads import ThreadOptions, ext_threads, int_threads
+from cq_watchdog import Limits, run_limited
+from mesh import Mesh
+from mesh_threads import ext_threads_mesh, int_threads_mesh
+
+# Bump when the results file changes
+BENCH_FORMAT: int = 1
+
+# What is benchmarked, threads are only built, parts are built and exported
+SUBJECTS: Sequence[str] = ("int_threads", "ext_threads", "bolt", "nut")
+
+# The thread profiles, the cutoffs are fractions of the pitch
+PROFILES: Dict[str, Dict[str, float]] = {
+    "triangle": {
+        "major_cutoff": 0,
+        "minor_cutoff": 0,
+        "taper_out_rpos": 0,
+        "taper_in_rpos": 1,
+    },
+    "trapezoid": {
+        "major_cutoff": 1 / 8,
+        "minor_cutoff": 1 / 4,
+        "taper_out_rpos": 0,
+        "taper_in_rpos": 1,
+    },
+    "tapered": {
+        "major_cutoff": 1 / 8,
+        "minor_cutoff": 1 / 4,
+        "taper_out_rpos": 0.1,
+        "taper_in_rpos": 0.9,
+    },
+}
+
+# The fields varied by the matrices, they identify a case
+MATRIX_FIELDS: Sequence[str] = ("dia_major", "pitch", "height", "stl_tolerance")
+
+# The named matrices, the profiles and a grid of MATRIX_FIELDS
+MATRICES: Dict[str, Dict[str, Sequence[Any]]] = {
+    "quick": {
+        "profile": ["tapered"],
+        "dia_major": [8],
+        "pitch": [2],
+        "height": [11.5],
+        "stl_tolerance": [1e-3],
+    },
+    "default": {
+        "profile": list(PROFILES),
+        "dia_major": [8],
+        "pitch": [1, 2],
+        "height": [10, 30],
+        "stl_tolerance": [1e-3],
+    },
+    "full": {
+        "profile": list(PROFILES),
+        "dia_major": [4, 8, 16],
+        "pitch": [1, 2],
+        "height": [10, 30],
+        "stl_tolerance": [1e-3, 1e-2],
+    },
+}
+
+# Default relative increase of a metric that is a regression
+DFLT_threshold: float = 0.2
+
+# Increases of a metric no larger than these are noise, not regressions
+METRIC_FLOORS: Dict[str, float] = {
+    "seconds": 0.02,
+    "export_seconds": 0.02,
+    "peak_rss_mb": 5,
+    "bytes": 0,
+}
+
+
+@dataclass
+class BenchCase:
+    """One benchmark, a subject built with params"""
+
+    subject: str
+    """One of SUBJECTS"""
+
+    profile: str
+    """One of PROFILES"""
+
+    params: PartParams
+    """The parameters of the subject"""
+
+    def key(self) -> str:
+        """Return the name of the case, it's the same in every run"""
+        values: str = " ".join(
+            f"{name}={getattr(self.params, name):g}" for name in MATRIX_FIELDS
+        )
+        opts: str = (
+            f"engine={self.params.engine}"
+            + (" replicate" if self.params.replicate else "")
+            + (" native_helix" if self.params.native_helix else "")
+            + ("" if self.params.union else " no_union")
+            + (f" chunks={self.params.chunks}" if self.params.chunks > 1 else "")
+        )
+        return f"{self.subject} {self.profile} {values} {opts}"
+
+
+@dataclass
+class BenchResult:
+    """The measurements of a BenchCase"""
+
+    key: str
+    """BenchCase.key()"""
+
+    subject: str
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    seconds: float = 0
+    """Fastest wall time to build the subject"""
+
+    export_seconds: float = 0
+    """Fastest wall time to export the part, 0 for threads"""
+
+    bytes: int = 0
+    """Size of the stl file, 0 for threads"""
+
+    peak_rss_mb: float = 0
+    """Peak resident set size of the process running the case"""
+
+    error: Optional[str] = None
+    """The error if the case failed"""
+
+
+@dataclass
+class Regression:
+    """A metric of a case which is worse than the baseline"""
+
+    key: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline > 0 else float("inf")
+
+
+def bench_cases(
+    matrix: Dict[str, Sequence[Any]],
+    subjects: Sequence[str] = SUBJECTS,
+    base: PartParams = PartParams(),
+) -> List[BenchCase]:
+    """
+    Return the cases of matrix for each of subjects, the fields
+    of base that aren't in the matrix are used for all cases.
+    """
+    grid: Dict[str, Sequence[float]] = {
+        k: v for k, v in matrix.items() if k != "profile"
+    }
+    cases: List[BenchCase] = []
+    for profile in matrix.get("profile", ["tapered"]):
+        if profile not in PROFILES:
+            raise ValueError(f"profile:{profile} should be one of {list(PROFILES)}")
+        for params in expand_grid(base, grid):
+            overrides: Dict[str, Any] = dict(PROFILES[profile])
+            overrides["major_cutoff"] *= params.pitch
+            overrides["minor_cutoff"] *= params.pitch
+            for subject in subjects:
+                part: str = subject if subject in ("bolt", "nut") else params.part
+                cases.append(
+                    BenchCase(subject, profile, replace(params, part=part, **overrides))
+                )
+    return cases
+
+
+def _build(
+    subject: str, ths: ThreadHelixes, params: PartParams
+) -> Union[cq.Workplane, cq.Solid, Mesh]:
+    if subject in ("bolt", "nut"):
+        return build_part(params)
+
+    external: bool = subject == "ext_threads"
+    if params.engine == "mesh":
+        f = ext_threads_mesh if external else int_threads_mesh
+        return f(ths, params.stl_tolerance, params.angular_tolerance)
+    opts: ThreadOptions = ThreadOptions(
+        replicate=params.replicate, native_helix=params.native_helix
+    )
+    return ext_threads(ths, opts) if external else int_threads(ths, opts)
+
+
+def run_case(case: BenchCase, repeat: int, directory: str) -> BenchResult:
+    """
+    Build, and export if it's a part, the subject of case repeat
+    times recording the fastest times.
+    """
+    params: PartParams = case.params
+    result: BenchResult = BenchResult(case.key(), case.subject, asdict(params))
+    try:
+        ths: ThreadHelixes = helical_thread(params.helical_thread())
+        seconds: List[float] = []
+        export_seconds: List[float] = []
+        for _ in range(max(1, repeat)):
+            start: float = time.perf_counter()
+            part = _build(case.subject, ths, params)
+            seconds.append(time.perf_counter() - start)
+
+            if case.subject in ("bolt", "nut"):
+                path: str = os.path.join(directory, f"bench-{os.getpid()}.stl")
+                er: ExportResult = export_part(
+                    cast(Union[cq.Workplane, Mesh], part), params, path
+                )
+                export_seconds.append(er.seconds)
+                result.bytes = er.bytes
+                os.remove(path)
+        result.seconds = min(seconds)
+        result.export_seconds = min(export_seconds) if export_seconds else 0
+    except Exception:
+        result.error = traceback.format_exc()
+    result.peak_rss_mb = peak_rss_mb()
+    return result
+
+
+def run_bench(
+    cases: Sequence[BenchCase], repeat: int = 1, directory: Optional[str] = None
+) -> Iterator[BenchResult]:
+    """
+    Run each case, one at a time, in a new forked process so the peak
+    memory is that of the case and one case doesn't warm up another.
+
+    :param cases: The cases to run
+    :param repeat: Number of times each case is run, the fastest is reported
+    :param directory: Where the stl files are temporarily written
+    :returns: Iterator of the BenchResult of each case in order
+    """
+    directory = directory if directory is not None else os.getcwd()
+    for case in cases:
+        # Not a multiprocessing.Pool, its workers are daemons which
+        # can't start the processes of PartParams.chunks
+        result: Optional[BenchResult]
+        error: Optional[str]
+        result, error = run_limited(run_case, (case, repeat, directory), Limits())
+        if result is None:
+            # The process exited without a result, i.e. OCC crashed
+            result = BenchResult(
+                case.key(), case.subject, asdict(case.params), error=error
+            )
+        yield result
+
+
+def save_results(path: str, results: Sequence[BenchResult]) -> None:
+    """Write the results and the environment they were measured in as json"""
+    d: Dict[str, Any] = {
+        "format": BENCH_FORMAT,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "versions": library_versions(),
+        "results": [asdict(r) for r in results],
+    }
+    with open(path, "w") as f:
+        json.dump(d, f, indent=2)
+
+
+def load_results(path: str) -> List[BenchResult]:
+    """Read the results written by save_results"""
+    with open(path) as f:
+        d: Dict[str, Any] = json.load(f)
+    if d.get("format") != BENCH_FORMAT:
+        raise ValueError(f"{path} format:{d.get('format')} expected {BENCH_FORMAT}")
+    return [BenchResult(**r) for r in d["results"]]
+
+
+def compare_results(
+    baseline: Sequence[BenchResult],
+    current: Sequence[BenchResult],
+    threshold: float = DFLT_threshold,
+) -> List[Regression]:
+    """
+    Return the metrics of the cases in both baseline and current which
+    increased by more than threshold, a fraction of the baseline, and by
+    more than METRIC_FLOORS. Failed cases are ignored.
+    """
+    base: Dict[str, BenchResult] = {r.key: r for r in baseline if r.error is None}
+    regressions: List[Regression] = []
+    for r in current:
+        b: Optional[BenchResult] = base.get(r.key)
+        if b is None or r.error is not None:
+            continue
+        for metric, floor in METRIC_FLOORS.items():
+            bv: float = getattr(b, metric)
+            cv: float = getattr(r, metric)
+            if (cv > bv * (1 + threshold)) and (cv - bv > floor):
+                regressions.append(Regression(r.key, metric, bv, cv))
+    return regressions
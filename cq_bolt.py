@@ -4,16 +4,30 @@ from typing import cast
 import cadquery as cq
 from helical_thread import ThreadHelixes
 
-from cq_threads import ext_threads
+from cq_profile import Stage, stage
+from cq_threads import ThreadOptions, ext_threads
 from utils import dbg, setCtx, show
 
 setCtx(globals())
 
 
 def cq_bolt(
-    ths: ThreadHelixes, head_size: float, head_height: float, wall_thickness: float
+    ths: ThreadHelixes,
+    head_size: float,
+    head_height: float,
+    wall_thickness: float,
+    opts: ThreadOptions = ThreadOptions(),
+    union: bool = True,
 ) -> cq.Workplane:
-    bolt_threads: cq.Solid = ext_threads(ths)
+    """
+    Create a bolt, a hexagonal head and a hollow core with external threads.
+
+    :param union: If True the head, core and threads are combined with
+                  union, otherwise the Workplane contains the three
+                  Solids which overlap, slicers combine them, and
+                  the expensive union is avoided
+    """
+    bolt_threads: cq.Solid = ext_threads(ths, opts)
     # show(bolt_threads, "bolt_threads-0")
     # bolt_threads_bb: cq.BoundBox = bolt_threads.BoundingBox()
     # dbg(f"bolthreads_bb={vars(bolt_threads_bb)}")
@@ -21,25 +35,36 @@ def cq_bolt(
     bolt_core_radius: float = ths.ext_helix_radius
     # dbg(f"bolt_core_radius={bolt_core_radius} boltRadius={boltRadius:.3f})
 
-    boltHead: cq.Workplane = (
-        cq.Workplane("XY", origin=(0, 0, 0)).polygon(6, head_size).extrude(head_height)
-    )
-    # show(boltHead, "boltHead-0")
+    s: Stage
+    with stage("bolt.core"):
+        boltHead: cq.Workplane = (
+            cq.Workplane("XY", origin=(0, 0, 0))
+            .polygon(6, head_size)
+            .extrude(head_height)
+        )
+        # show(boltHead, "boltHead-0")
 
-    bolt_core: cq.Workplane = (
-        cq.Workplane("XY", origin=(0, 0, head_height))
-        .circle(bolt_core_radius)
-        .circle(bolt_core_radius - wall_thickness)
-        .extrude(ths.ht.height)
-    )
-    # show(bolt_core, "bolt_core-0")
+        bolt_core: cq.Workplane = (
+            cq.Workplane("XY", origin=(0, 0, head_height))
+            .circle(bolt_core_radius)
+            .circle(bolt_core_radius - wall_thickness)
+            .extrude(ths.ht.height)
+        )
+        # show(bolt_core, "bolt_core-0")
 
-    bolt: cq.Workplane = boltHead.union(bolt_core).union(
-        # TODO: What is the "right" way to allow a moved Shape to something
-        # acceptable to .union? I'm using cast to convert the Shape returned
-        # by .move back to Solid to satisfy mypy.
-        cast(cq.Solid, bolt_threads.move(cq.Location(cq.Vector(0, 0, head_height))))
+    # TODO: What is the "right" way to allow a moved Shape to something
+    # acceptable to .union? I'm using cast to convert the Shape returned
+    # by .move back to Solid to satisfy mypy.
+    moved_threads: cq.Solid = cast(
+        cq.Solid, bolt_threads.move(cq.Location(cq.Vector(0, 0, head_height)))
     )
+    if not union:
+        return boltHead.add(bolt_core).add(moved_threads)
+
+    with stage("bolt.union") as s:
+        bolt: cq.Workplane = boltHead.union(bolt_core).union(moved_threads)
+        if s.enabled:
+            s.count(faces=len(bolt.faces().vals()))
     # show(bolt, "bolt-0")
 
     return bolt
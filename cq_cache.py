@@ -0,0 +1,227 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import site
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from cq_args import DFLT_cache_directory, DFLT_cache_max_mb
+from cq_params import PartParams
+
+# Bump when the contents of a generated file changes without any
+# of the parameters or library versions changing
+CACHE_FORMAT: int = 1
+
+# Libraries whose version changes the generated geometry
+CACHE_LIBRARIES = (
+    "cadquery",
+    "cadquery-ocp",
+    "OCP",
+    "helical_thread",
+    "taperable_helix",
+)
+
+# Fields that don't change a nut
+NUT_IGNORED_FIELDS = ("head_height", "wall_thickness")
+
+# Fields that don't change any stl file
+IGNORED_FIELDS = ("jobs",)
+
+
+@lru_cache(maxsize=None)
+def library_versions(directory: Optional[str] = None) -> Dict[str, str]:
+    """
+    Return the versions of the CACHE_LIBRARIES that are installed.
+
+    Finding them imports importlib.metadata and reads the metadata of
+    the installed packages, tens of milliseconds, which is most of the
+    time of a cache hit. So if directory isn't None they're saved in its
+    versions.json and read from it until a package is installed or
+    removed, which changes the modification time of site-packages.
+    """
+    if directory is None:
+        return _installed_versions()
+
+    path: str = os.path.join(directory, "versions.json")
+    stamp: Dict[str, int] = _site_stamp()
+    try:
+        with open(path) as f:
+            saved: Dict[str, Any] = json.load(f)
+        if saved.get("stamp") == stamp:
+            return saved["versions"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    versions: Dict[str, str] = _installed_versions()
+    os.makedirs(directory, exist_ok=True)
+    tmp: str = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"stamp": stamp, "versions": versions}, f)
+    os.replace(tmp, path)
+    return versions
+
+
+def _installed_versions() -> Dict[str, str]:
+    """Return the versions of the CACHE_LIBRARIES read from their metadata"""
+    from importlib import metadata
+
+    versions: Dict[str, str] = {}
+    for lib in CACHE_LIBRARIES:
+        try:
+            versions[lib] = metadata.version(lib)
+        except metadata.PackageNotFoundError:
+            pass
+    return versions
+
+
+def _site_stamp() -> Dict[str, int]:
+    """Return the modification time of each site-packages directory"""
+    dirs: List[str] = site.getsitepackages() + [site.getusersitepackages()]
+    stamp: Dict[str, int] = {}
+    for d in dirs:
+        try:
+            stamp[d] = os.stat(d).st_mtime_ns
+        except OSError:
+            pass
+    return stamp
+
+
+def cache_key(params: PartParams, directory: Optional[str] = None) -> str:
+    """
+    Return a stable hash of everything that affects the generated
+    stl file, the parameters and the library versions.
+
+    :param params: The parameters of the part
+    :param directory: If not None the directory the library versions
+                      are saved in, see library_versions
+    """
+    values: Dict[str, Any] = asdict(params)
+    for name in IGNORED_FIELDS:
+        del values[name]
+    if params.part == "nut":
+        for name in NUT_IGNORED_FIELDS:
+            del values[name]
+    d: Dict[str, Any] = {
+        "format": CACHE_FORMAT,
+        "params": values,
+        "versions": library_versions(directory),
+    }
+    s: str = json.dumps(d, sort_keys=True)
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+
+class StlCache:
+    """
+    A size bounded on-disk cache of generated stl files.
+
+    The files are stored in directory, named by cache_key(params), and an
+    index file, index.json, maps each key to its size and last use
+    so lookups and evictions never scan the directory. When the total
+    size exceeds max_bytes the least recently used files are removed.
+    The index is locked while it's read and written so a cache
+    may be shared by concurrent processes.
+    """
+
+    def __init__(
+        self,
+        directory: str = DFLT_cache_directory,
+        max_bytes: int = int(DFLT_cache_max_mb * 1024 * 1024),
+    ):
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        self.index_path: str = os.path.join(directory, "index.json")
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.stl")
+
+    @contextmanager
+    def _index(self) -> Iterator[Dict[str, Dict[str, float]]]:
+        """
+        Lock, read and yield the index, it's written back when
+        the with statement completes.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "index.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index: Dict[str, Dict[str, float]]
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                index = {}
+
+            yield index
+
+            tmp: str = f"{self.index_path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, self.index_path)
+
+    def contains(self, params: PartParams) -> bool:
+        """Return True if params are in the cache, nothing is copied"""
+        key: str = cache_key(params, self.directory)
+        with self._index() as index:
+            return (key in index) and os.path.exists(self._entry_path(key))
+
+    def get(self, params: PartParams, path: str) -> bool:
+        """
+        If params are in the cache copy the cached file to path.
+
+        :returns: True if it was a hit and path has been written
+        """
+        key: str = cache_key(params, self.directory)
+        with self._index() as index:
+            entry: Optional[Dict[str, float]] = index.get(key)
+            if entry is None:
+                return False
+
+            src: str = self._entry_path(key)
+            try:
+                if not (os.path.exists(path) and os.path.samefile(src, path)):
+                    shutil.copyfile(src, path)
+            except FileNotFoundError:
+                # Removed behind our back
+                del index[key]
+                return False
+
+            entry["used"] = time.time()
+            return True
+
+    def put(self, params: PartParams, path: str) -> None:
+        """Add the file at path, generated using params, to the cache"""
+        key: str = cache_key(params, self.directory)
+        dst: str = self._entry_path(key)
+        with self._index() as index:
+            tmp: str = f"{dst}.tmp"
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, dst)
+            index[key] = {"size": os.path.getsize(dst), "used": time.time()}
+            self._evict(index)
+
+    def _evict(self, index: Dict[str, Dict[str, float]]) -> None:
+        total: float = sum(entry["size"] for entry in index.values())
+        if total <= self.max_bytes:
+            return
+
+        for key in sorted(index, key=lambda k: index[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= index[key]["size"]
+            del index[key]
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                pass
+
+
+def cache_from_args(args: argparse.Namespace) -> Optional[StlCache]:
+    """Return the StlCache defined by add_cache_arguments or None if disabled"""
+    if args.no_cache:
+        return None
+    return StlCache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024))
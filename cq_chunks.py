@@ -0,0 +1,244 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional, Sequence, cast
+
+import cadquery as cq
+from helical_thread import HelicalThread, ThreadHelixes
+from OCP.BRepBuilderAPI import BRepBuilderAPI_Sewing
+
+from cq_params import PartParams
+from cq_profile import Stage, stage
+from cq_threads import ThreadOptions, thread_chunk
+
+# Long threaded parts are built in axial chunks by a pool of processes.
+# Most of the time to build a part is the union of the threads and the
+# core, it grows faster than the number of turns, so each chunk is the
+# union of its threads and core and the chunks are joined by sewing.
+#
+# The union of two chunks would take about as long as building the
+# part in one piece, the long helical faces of adjacent chunks touch
+# so all of their intersections are computed. Instead each chunk is
+# built a little longer than it is and cut by the planes at its ends,
+# so adjacent chunks have identical planar faces at the seam between
+# them. Those faces are dropped and the other faces of all the chunks
+# are sewn into one shell, which takes milliseconds.
+
+# Tolerance used to sew the chunks, the edges at a seam are the same
+# plane section of helixes approximated separately by each chunk, for
+# chunks of more than 10 turns they differ by more than 1e-5. It's much
+# less than thread_overlap and the stl tolerance.
+SEW_TOLERANCE: float = 1e-4
+
+
+@dataclass
+class ChunkBounds:
+    """The part of the threads and core of one chunk"""
+
+    t_start: float
+    """The t of the helixes at the start of the chunk"""
+
+    t_stop: float
+    """The t of the helixes at the end of the chunk"""
+
+    z_lo: float
+    """The bottom of the chunk, 0 is the bottom of the core"""
+
+    z_hi: float
+    """The top of the chunk"""
+
+
+def chunk_bounds(ht: HelicalThread, chunks: int) -> List[ChunkBounds]:
+    """
+    Return the bounds of each chunk, the t ranges of the helixes are
+    equal and the z of the ends are the heights of the helixes at
+    t_start and t_stop except the first chunk starts at the bottom of
+    the core, 0, and the last ends at its top, ht.height.
+
+    :param ht: The HelicalThread of the part
+    :param chunks: The number of chunks, >= 1
+    """
+    t_range: float = ht.last_t - ht.first_t
+    helix_height: float = ht.height - (2 * ht.inset_offset)
+    ts: List[float] = [ht.first_t + (t_range * i / chunks) for i in range(chunks + 1)]
+    zs: List[float] = [
+        ht.inset_offset + (helix_height * i / chunks) for i in range(chunks + 1)
+    ]
+    zs[0] = 0
+    zs[-1] = ht.height
+    return [ChunkBounds(ts[i], ts[i + 1], zs[i], zs[i + 1]) for i in range(chunks)]
+
+
+def _core(
+    params: PartParams, ths: ThreadHelixes, z_lo: float, z_hi: float
+) -> cq.Workplane:
+    """Create the core of the part from z_lo to z_hi, and the head of a bolt if z_lo is 0"""
+    if params.part == "bolt":
+        radius: float = ths.ext_helix_radius
+        core: cq.Workplane = (
+            cq.Workplane("XY", origin=(0, 0, params.head_height + z_lo))
+            .circle(radius)
+            .circle(radius - params.wall_thickness)
+            .extrude(z_hi - z_lo)
+        )
+        if z_lo == 0:
+            head: cq.Workplane = (
+                cq.Workplane("XY", origin=(0, 0, 0))
+                .polygon(6, params.head_size)
+                .extrude(params.head_height)
+            )
+            core = head.union(core)
+        return core
+    else:
+        return (
+            cq.Workplane("XY", origin=(0, 0, z_lo))
+            .circle(ths.int_helix_radius)
+            .polygon(6, params.head_size)
+            .extrude(z_hi - z_lo)
+        )
+
+
+def build_chunk(
+    params: PartParams,
+    ths: ThreadHelixes,
+    opts: ThreadOptions,
+    index: int,
+    chunks: int,
+) -> bytes:
+    """
+    Build chunk index of chunks and return it serialized as BREP so it
+    can be returned by a worker process.
+
+    Unless it's the first or last chunk the threads are one turn longer
+    at each end and the core two pitches longer, so the threads never
+    cross the thin overlap at the ends of the core, and after the union
+    they're cut by the planes at z_lo and z_hi.
+    """
+    ht: HelicalThread = ths.ht
+    bounds: ChunkBounds = chunk_bounds(ht, chunks)[index]
+    t_turn: float = (
+        (ht.last_t - ht.first_t) * ht.pitch / (ht.height - (2 * ht.inset_offset))
+    )
+    first: bool = index == 0
+    last: bool = index == chunks - 1
+
+    threads: cq.Solid = thread_chunk(
+        params.part == "bolt",
+        ths,
+        bounds.t_start if first else max(ht.first_t, bounds.t_start - t_turn),
+        bounds.t_stop if last else min(ht.last_t, bounds.t_stop + t_turn),
+        opts,
+    )
+    # The z of the bottom of the core
+    base: float = 0
+    if params.part == "bolt":
+        base = params.head_height
+        threads = cast(cq.Solid, threads.move(cq.Location(cq.Vector(0, 0, base))))
+
+    with stage("chunks.union"):
+        core: cq.Workplane = _core(
+            params,
+            ths,
+            bounds.z_lo if first else max(0, bounds.z_lo - (2 * ht.pitch)),
+            bounds.z_hi if last else min(ht.height, bounds.z_hi + (2 * ht.pitch)),
+        )
+        chunk: cq.Shape = cast(cq.Shape, core.union(threads).val())
+
+    if not (first and last):
+        with stage("chunks.cut"):
+            # Larger than the part, below 0 so the head is kept and above the top
+            size: float = 2 * (params.head_size + params.dia_major)
+            lo: float = (base + bounds.z_lo) if not first else -size
+            hi: float = (base + bounds.z_hi) if not last else base + ht.height + size
+            chunk = chunk.intersect(
+                cq.Solid.makeBox(
+                    size, size, hi - lo, cq.Vector(-size / 2, -size / 2, lo)
+                )
+            )
+
+    buf: BytesIO = BytesIO()
+    chunk.exportBrep(buf)
+    return buf.getvalue()
+
+
+def _is_seam(face: cq.Face, seams: Sequence[float]) -> bool:
+    """Return True if face is a horizontal plane at the z of one of the seams"""
+    if face.geomType() != "PLANE":
+        return False
+    center: cq.Vector = face.Center()
+    return (abs(face.normalAt(center).z) > 1 - 1e-9) and any(
+        abs(center.z - z) <= SEW_TOLERANCE for z in seams
+    )
+
+
+def join_chunks(chunks: Sequence[cq.Shape], seams: Sequence[float]) -> cq.Solid:
+    """
+    Join chunks, whose adjacent chunks share identical planar faces at
+    the z of seams, by sewing their other faces into one Solid.
+
+    :param chunks: The Solids of the chunks, see build_chunk
+    :param seams: The z of the seams between the chunks
+    :raises ValueError: If the faces aren't one closed shell or the Solid isn't valid
+    """
+    s: Stage
+    with stage("chunks.sew") as s:
+        sewing = BRepBuilderAPI_Sewing(SEW_TOLERANCE)
+        faces: int = 0
+        for chunk in chunks:
+            for face in chunk.Faces():
+                if not _is_seam(face, seams):
+                    sewing.Add(face.wrapped)
+                    faces += 1
+        sewing.Perform()
+        sewn: cq.Shape = cq.Shape.cast(sewing.SewedShape())
+        shells: List[cq.Shell] = sewn.Shells()
+        if (len(shells) != 1) or (sewing.NbFreeEdges() != 0):
+            raise ValueError(
+                f"join_chunks: sewing {faces} faces created {len(shells)} shells with {sewing.NbFreeEdges()} free edges"
+            )
+        solid: cq.Solid = cast(cq.Solid, cq.Solid.makeSolid(shells[0]).clean())
+        if not solid.isValid():
+            raise ValueError(
+                f"join_chunks: the Solid sewn from {faces} faces isn't valid"
+            )
+        s.count(faces=faces)
+    return solid
+
+
+def build_chunked(
+    params: PartParams,
+    ths: ThreadHelixes,
+    opts: ThreadOptions = ThreadOptions(),
+    max_workers: Optional[int] = None,
+) -> cq.Workplane:
+    """
+    Build the part defined by params from params.chunks chunks, each is
+    built by build_chunk in a pool of processes, and join them into one
+    Solid. The build time of long parts is about the time to build one
+    chunk when there are params.chunks cpus.
+
+    :param params: The parameters of the part
+    :param ths: The helixes of params.helical_thread()
+    :param opts: How the threads are constructed
+    :param max_workers: Number of processes, None is the smaller of
+                        params.chunks and os.cpu_count()
+    :returns: Workplane containing the part
+    """
+    chunks: int = max(params.chunks, 1)
+    if max_workers is None:
+        max_workers = min(chunks, os.cpu_count() or 1)
+    s: Stage
+    with stage("chunks.build") as s:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(build_chunk, params, ths, opts, i, chunks)
+                for i in range(chunks)
+            ]
+            breps: List[bytes] = [f.result() for f in futures]
+        s.count(bytes=sum(len(b) for b in breps))
+
+    base: float = params.head_height if params.part == "bolt" else 0
+    seams: List[float] = [base + b.z_lo for b in chunk_bounds(ths.ht, chunks)[1:]]
+    solids: List[cq.Shape] = [cq.Shape.importBrep(BytesIO(b)) for b in breps]
+    return cq.Workplane("XY").add(join_chunks(solids, seams))
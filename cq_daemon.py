@@ -0,0 +1,307 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import traceback
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from cq_args import DFLT_socket_path
+from cq_cache import StlCache
+from cq_params import DFLT_directory, JobResult, PartParams
+from cq_watchdog import Limits
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+# cadquery isn't imported by this module so clients start quickly,
+# create_server imports it, via cq_batch, before the workers are forked.
+
+# Bump when the requests or replies change
+DAEMON_PROTOCOL: int = 2
+
+# Seconds a client waits to connect and for a reply to a ping
+DFLT_ping_timeout: float = 1
+
+
+def _request(
+    msg: Dict[str, Any], socket_path: str, timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Send msg as one line of json to the daemon and return its reply.
+
+    :raises OSError: If the daemon isn't running or doesn't reply
+    :raises RuntimeError: If the daemon reports an error
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path)
+        s.sendall((json.dumps(msg) + "\n").encode("utf-8"))
+        with s.makefile("rb") as f:
+            line: bytes = f.readline()
+    if not line:
+        raise ConnectionError(f"{socket_path} closed without a reply")
+    reply: Dict[str, Any] = json.loads(line)
+    if not reply.get("ok"):
+        raise RuntimeError(reply.get("error"))
+    return reply
+
+
+def ping(
+    socket_path: str = DFLT_socket_path, timeout: float = DFLT_ping_timeout
+) -> Optional[Dict[str, Any]]:
+    """
+    Return the status of the daemon listening on socket_path, its pid,
+    workers and the number of jobs run, or None if it isn't running.
+    """
+    try:
+        return _request({"op": "ping"}, socket_path, timeout)
+    except (OSError, ValueError, RuntimeError):
+        return None
+
+
+def submit_job(
+    params: PartParams,
+    directory: str = DFLT_directory,
+    cache: Optional[StlCache] = None,
+    socket_path: str = DFLT_socket_path,
+    limits: Optional[Limits] = None,
+) -> JobResult:
+    """
+    Generate the part on a worker of the daemon and wait for it,
+    the same as cq_batch.run_job but cadquery isn't imported.
+
+    :param params: The parameters of the part
+    :param directory: Where the stl file is written, relative paths
+                      are relative to the current directory
+    :param cache: If not None the StlCache used by the job
+    :param socket_path: The socket the daemon is listening on
+    :param limits: If not None the job is run by cq_batch.run_watched
+                   in a process forked by the daemon rather than a worker
+    :returns: JobResult
+    """
+    reply: Dict[str, Any] = _request(
+        {
+            "op": "job",
+            "protocol": DAEMON_PROTOCOL,
+            "params": asdict(params),
+            "directory": os.path.abspath(directory),
+            "cache": (
+                None
+                if cache is None
+                else {"directory": cache.directory, "max_bytes": cache.max_bytes}
+            ),
+            "limits": None if limits is None else asdict(limits),
+        },
+        socket_path,
+    )
+    result: Dict[str, Any] = reply["result"]
+    result["params"] = PartParams(**result["params"])
+    return JobResult(**result)
+
+
+def shutdown(socket_path: str = DFLT_socket_path) -> None:
+    """Ask the daemon listening on socket_path to exit"""
+    _request({"op": "shutdown"}, socket_path, DFLT_ping_timeout)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Reply to the one request of a connection"""
+
+    server: "DaemonServer"
+
+    def handle(self) -> None:
+        msg: Dict[str, Any] = {}
+        reply: Dict[str, Any]
+        try:
+            msg = json.loads(self.rfile.readline())
+            reply = self.server.dispatch(msg)
+        except Exception:
+            reply = {"ok": False, "error": traceback.format_exc()}
+        self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+        if msg.get("op") == "shutdown":
+            # Called from the handler's thread, not serve_forever's
+            self.server.shutdown()
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Accepts requests on a unix domain socket, each connection is one
+    line of json and the reply is one line of json. Jobs are run by
+    executor, a pool of processes which already imported cadquery,
+    and each connection is handled by a thread so the jobs of
+    concurrent clients run in parallel.
+
+    The requests are:
+        {"op": "ping"}
+        {"op": "job", "params": {...}, "directory": "...", "cache": {...}, "limits": {...}}
+        {"op": "shutdown"}
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: str,
+        executor: "Executor",
+        workers: int,
+        thread_cache_dir: Optional[str] = None,
+    ):
+        if os.path.exists(socket_path):
+            if ping(socket_path) is not None:
+                raise RuntimeError(f"A daemon is already listening on {socket_path}")
+            # Left behind by a daemon which didn't exit cleanly
+            os.remove(socket_path)
+        super().__init__(socket_path, _Handler)
+        self.socket_path: str = socket_path
+        self.executor: "Executor" = executor
+        self.workers: int = workers
+        self.thread_cache_dir: Optional[str] = thread_cache_dir
+        self.jobs: int = 0
+        self.failed: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def dispatch(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the reply to msg"""
+        op: Optional[str] = msg.get("op")
+        if op == "ping":
+            return {
+                "ok": True,
+                "protocol": DAEMON_PROTOCOL,
+                "pid": os.getpid(),
+                "workers": self.workers,
+                "jobs": self.jobs,
+                "failed": self.failed,
+            }
+        elif op == "job":
+            return self._job(msg)
+        elif op == "shutdown":
+            return {"ok": True}
+        raise ValueError(f"op:{op} should be one of ping, job or shutdown")
+
+    def _job(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        from cq_batch import run_job, run_watched
+
+        if msg.get("protocol") != DAEMON_PROTOCOL:
+            raise ValueError(
+                f"protocol:{msg.get('protocol')} expected {DAEMON_PROTOCOL}"
+            )
+        params: PartParams = PartParams(**msg["params"])
+        directory: str = msg.get("directory", os.path.abspath(DFLT_directory))
+        os.makedirs(directory, exist_ok=True)
+        cache: Optional[StlCache] = (
+            StlCache(**msg["cache"]) if msg.get("cache") is not None else None
+        )
+
+        limits: Optional[Limits] = (
+            Limits(**msg["limits"]) if msg.get("limits") is not None else None
+        )
+
+        start: float = time.perf_counter()
+        result: JobResult
+        if limits is not None:
+            # A worker of executor can't be killed, fork a process for the job
+            result = run_watched(
+                params, directory, cache, limits, self.thread_cache_dir
+            )
+        else:
+            from concurrent.futures.process import BrokenProcessPool
+
+            executor: "Executor" = self.executor
+            try:
+                result = executor.submit(run_job, params, directory, cache).result()
+            except BrokenProcessPool:
+                # A worker died, i.e. OCC crashed, and the pool can't run any
+                # more jobs so it's replaced, the job isn't retried
+                self._restart_executor(executor)
+                result = JobResult(
+                    params,
+                    params.path(directory),
+                    error=f"A worker exited while building the part\n{traceback.format_exc()}",
+                )
+        with self._lock:
+            self.jobs += 1
+            self.failed += 0 if result.ok else 1
+        return {
+            "ok": True,
+            "result": asdict(result),
+            "seconds": time.perf_counter() - start,
+        }
+
+    def _restart_executor(self, broken: "Executor") -> None:
+        """Replace broken with a new pool unless another job already did"""
+        with self._lock:
+            if self.executor is not broken:
+                return
+            broken.shutdown(wait=False)
+            self.executor = _create_executor(self.workers, self.thread_cache_dir)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.remove(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def _create_executor(workers: int, thread_cache_dir: Optional[str]) -> "Executor":
+    """
+    Return a pool of workers forked after cadquery was imported by cq_batch.
+    A forking pool starts all of its workers on the first submit so no job
+    waits for a worker to start.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    from cq_batch import _init_worker
+
+    executor: "Executor" = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=(thread_cache_dir,),
+    )
+    executor.submit(os.getpid).result()
+    return executor
+
+
+def create_server(
+    socket_path: str = DFLT_socket_path,
+    max_workers: Optional[int] = None,
+    thread_cache_dir: Optional[str] = None,
+) -> DaemonServer:
+    """
+    Import cadquery and start the pool of warm workers, then return
+    the DaemonServer listening on socket_path, call serve_forever
+    to handle requests and server_close, then executor.shutdown,
+    when done.
+
+    :param socket_path: The socket the daemon listens on
+    :param max_workers: Number of processes, None is os.cpu_count()
+    :param thread_cache_dir: If not None the ThreadCache directory shared
+                             by the workers, otherwise the ThreadCache of
+                             each worker is only in memory
+    """
+    workers: int = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    # Fork the workers before the server has any threads
+    executor: "Executor" = _create_executor(workers, thread_cache_dir)
+    try:
+        return DaemonServer(socket_path, executor, workers, thread_cache_dir)
+    except Exception:
+        executor.shutdown()
+        raise
+
+
+def daemon_from_args(args: argparse.Namespace) -> Optional[str]:
+    """
+    Return the socket of the daemon defined by add_daemon_arguments
+    if it's running, None if it isn't or is disabled.
+    """
+    if args.no_daemon or ping(args.socket) is None:
+        return None
+    return args.socket
@@ -0,0 +1,197 @@
+import time
+from typing import List, Sequence, Tuple, Union, cast
+
+import cadquery as cq
+import numpy as np
+from helical_thread import ThreadHelixes
+
+from cq_params import PartParams
+from cq_profile import Stage, stage
+from cq_stl import ExportResult, shape_mesh, tessellate_budget, to_shape
+from cq_threads import ThreadOptions, int_threads
+from mesh import Mesh, write_stl
+from mesh_3mf import Component, write_3mf
+
+# Plates and kits contain many identical parts. Each part is built once
+# and its instances are the same Shape moved to each location, they share
+# its geometry, so nothing is rebuilt. It's also tessellated once and the
+# triangles are transformed to each location when exporting, so the cost
+# is proportional to the number of different parts not instances.
+
+
+def grid_locations(
+    columns: int, rows: int, spacing_x: float, spacing_y: float, z: float = 0
+) -> List[cq.Location]:
+    """
+    Return the locations of a grid of columns by rows, the first is at
+    (0, 0, z) and they're spacing_x and spacing_y apart.
+    """
+    return [
+        cq.Location(cq.Vector(c * spacing_x, r * spacing_y, z))
+        for r in range(rows)
+        for c in range(columns)
+    ]
+
+
+def place(
+    part: Union[cq.Workplane, cq.Shape], locations: Sequence[cq.Location]
+) -> cq.Compound:
+    """
+    Return a Compound of instances of part, one at each of locations,
+    they share the geometry of part rather than copying it.
+    """
+    shape: cq.Shape = to_shape(part)
+    return cq.Compound.makeCompound([shape.moved(loc) for loc in locations])
+
+
+def location_matrix(loc: cq.Location) -> np.ndarray:
+    """Return the (3, 4) matrix of the rotation and translation of loc"""
+    trsf = loc.wrapped.Transformation()
+    return np.array([[trsf.Value(r, c) for c in range(1, 5)] for r in range(1, 4)])
+
+
+def instance_mesh(mesh: Mesh, locations: Sequence[cq.Location]) -> Mesh:
+    """
+    Return a Mesh of the instances of mesh, one at each of locations,
+    the vertices of all of them are transformed at once.
+    """
+    matrices: np.ndarray = np.array([location_matrix(loc) for loc in locations])
+    vertices: np.ndarray = (
+        np.einsum("nij,vj->nvi", matrices[:, :, :3], mesh.vertices)
+        + matrices[:, np.newaxis, :, 3]
+    )
+    offsets: np.ndarray = np.arange(len(locations)) * len(mesh.vertices)
+    faces: np.ndarray = mesh.faces[np.newaxis] + offsets[:, np.newaxis, np.newaxis]
+    return Mesh(vertices.reshape(-1, 3), faces.reshape(-1, 3), mesh.deviation)
+
+
+def part_mesh(part: Union[cq.Workplane, cq.Shape, Mesh], params: PartParams) -> Mesh:
+    """
+    Return the Mesh of part tessellated with the tolerances of params,
+    as cq_batch.export_part does, a Mesh is returned as is.
+    """
+    if isinstance(part, Mesh):
+        return part
+    shape: cq.Shape = to_shape(part)
+    tessellate_budget(
+        shape,
+        params.stl_tolerance,
+        params.angular_tolerance,
+        params.core_tolerance,
+        params.core_angular_tolerance,
+        params.max_triangles,
+        params.jobs,
+    )
+    return shape_mesh(shape)
+
+
+def export_instances(
+    part: Union[cq.Workplane, cq.Shape, Mesh],
+    locations: Sequence[cq.Location],
+    params: PartParams,
+    path: str,
+) -> ExportResult:
+    """
+    Export the instances of part, one at each of locations, as an stl
+    file. part is tessellated once, see part_mesh, and the triangles are
+    transformed to each location.
+
+    :param part: The part, a Mesh if it was built with the mesh engine
+    :param locations: The location of each instance
+    :param params: The parameters of part
+    :param path: The stl file to create
+    :returns: ExportResult, triangles is for all of the instances
+    """
+    start: float = time.perf_counter()
+    mesh: Mesh = part_mesh(part, params)
+
+    s: Stage
+    with stage("export.instances") as s:
+        instances: Mesh = instance_mesh(mesh, locations)
+        s.count(triangles=len(instances.faces))
+    with stage("export.write") as s:
+        size: int = write_stl(instances, path, params.stl_format, params.stl_gzip)
+        s.count(bytes=size)
+    return ExportResult(
+        path,
+        size,
+        time.perf_counter() - start,
+        triangles=len(instances.faces),
+        deviation=mesh.deviation,
+    )
+
+
+def export_kit(
+    parts: Sequence[
+        Tuple[Union[cq.Workplane, cq.Shape, Mesh], PartParams, Sequence[cq.Location]]
+    ],
+    path: str,
+    name: str = "kit",
+) -> ExportResult:
+    """
+    Export a kit of parts, such as a bolt and the nuts that it mates
+    with, as a 3MF file. Each part is tessellated once, see part_mesh,
+    and written once, the kit contains a component for each location.
+
+    :param parts: Each part, its parameters and the location of each instance
+    :param path: The 3MF file to create
+    :param name: The name of the kit
+    :returns: ExportResult, triangles is for all of the instances
+    """
+    start: float = time.perf_counter()
+    components: List[Component] = []
+    deviation: float = 0
+    for i, (part, params, locations) in enumerate(parts, 1):
+        mesh: Mesh = part_mesh(part, params)
+        deviation = max(deviation, mesh.deviation)
+        components.append(
+            Component(
+                f"{params.part}-{i}",
+                mesh,
+                [location_matrix(loc) for loc in locations],
+            )
+        )
+
+    s: Stage
+    with stage("export.write") as s:
+        size: int = write_3mf(path, components, name)
+        s.count(bytes=size)
+    return ExportResult(
+        path,
+        size,
+        time.perf_counter() - start,
+        triangles=sum(len(c.mesh.faces) * len(c.transforms) for c in components),
+        deviation=deviation,
+    )
+
+
+def threaded_holes(
+    plate: Union[cq.Workplane, cq.Shape],
+    ths: ThreadHelixes,
+    locations: Sequence[cq.Location],
+    opts: ThreadOptions = ThreadOptions(),
+) -> cq.Workplane:
+    """
+    Create a threaded hole in plate at each of locations. The internal
+    threads are built once, see int_threads, and the holes are cut and
+    the threads added with one boolean operation each for all of them.
+
+    :param plate: The Solid the holes are cut into
+    :param ths: The helixes of the threads, the holes have a radius of
+                ths.int_helix_radius and are ths.ht.height deep
+    :param locations: The bottom of each hole, its axis is the z axis
+    :param opts: How the threads are constructed
+    :returns: Workplane containing the plate with the threaded holes
+    """
+    threads: cq.Solid = int_threads(ths, opts)
+    hole: cq.Solid = cq.Solid.makeCylinder(ths.int_helix_radius, ths.ht.height)
+    s: Stage
+    with stage("layout.holes") as s:
+        cut: cq.Shape = to_shape(plate).cut(*[hole.moved(loc) for loc in locations])
+        s.count(holes=len(locations))
+    with stage("layout.threads") as s:
+        result: cq.Shape = cut.fuse(*[threads.moved(loc) for loc in locations])
+        result = cast(cq.Shape, result.clean())
+        if s.enabled:
+            s.count(faces=len(result.Faces()))
+    return cq.Workplane("XY").add(result)
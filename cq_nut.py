@@ -2,26 +2,48 @@
 import cadquery as cq
 from helical_thread import ThreadHelixes
 
-from cq_threads import int_threads
+from cq_profile import Stage, stage
+from cq_threads import ThreadOptions, int_threads
 from utils import dbg, setCtx, show
 
 setCtx(globals())
 
 
-def cq_nut(ths: ThreadHelixes, head_size: float) -> cq.Workplane:
-    nut_core: cq.Workplane = (
-        cq.Workplane("XY", origin=(0, 0, 0))
-        .circle(ths.int_helix_radius)
-        .polygon(6, head_size)
-        .extrude(ths.ht.height)
-    )
-    # show(nut_core, "nut_core-0")
+def cq_nut(
+    ths: ThreadHelixes,
+    head_size: float,
+    opts: ThreadOptions = ThreadOptions(),
+    union: bool = True,
+) -> cq.Workplane:
+    """
+    Create a nut, a hexagonal core with internal threads.
 
-    nut_threads: cq.Solid = int_threads(ths)
+    :param union: If True the core and threads are combined with union,
+                  otherwise the Workplane contains the two Solids which
+                  overlap, slicers combine them, and the expensive
+                  union is avoided
+    """
+    s: Stage
+    with stage("nut.core"):
+        nut_core: cq.Workplane = (
+            cq.Workplane("XY", origin=(0, 0, 0))
+            .circle(ths.int_helix_radius)
+            .polygon(6, head_size)
+            .extrude(ths.ht.height)
+        )
+        # show(nut_core, "nut_core-0")
+
+    nut_threads: cq.Solid = int_threads(ths, opts)
     # nut_threads_bb: cq.BoundBox = nut_threads.BoundingBox()
     # dbg(f"nut_threads_bb={vars(nut_threads_bb)}")
     # show(nut_threads, "nut_threads-0")
 
-    nut: cq.Workplane = nut_core.union(nut_threads)
+    if not union:
+        return nut_core.add(nut_threads)
+
+    with stage("nut.union") as s:
+        nut: cq.Workplane = nut_core.union(nut_threads)
+        if s.enabled:
+            s.count(faces=len(nut.faces().vals()))
     # show(nut, "nut-0")
     return nut
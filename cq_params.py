@@ -0,0 +1,651 @@
+import argparse
+import itertools
+import os
+from dataclasses import dataclass, field, fields, replace
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from helical_thread import HelicalThread
+
+# This module is imported by the command line tools before their
+# arguments are parsed, so it only imports the standard library,
+# helical_thread and configparser are imported when they're used.
+
+# Defaults
+
+# Clearance between internal threads and external threads.
+# The external threads are horzitionally moved to create
+# the clearance.
+DFLT_ext_clearance: float = 0.05
+
+# Set to guarantee the thread and core overlap and a manifold is created
+DFLT_thread_overlap: float = 0.001
+
+# Tolerance value for generating STL files
+DFLT_stl_tolerance: float = 1e-3
+
+# Angular tolerance in radians for generating STL files,
+# the same as cq.exporters.export
+DFLT_angular_tolerance: float = 0.1
+
+# Number of times a part is tessellated to fit within max_triangles
+BUDGET_PASSES: int = 4
+
+# The separation between edges of a helix after on revolution.
+DFLT_pitch: float = 2
+
+# The included angle of the "tip" of a thread
+DFLT_angle_degs: float = 90
+
+# Adjust z by inset so threads are inset from the bottom and top
+DFLT_inset: float = DFLT_pitch / 3
+
+# The major diameter of outer most threads of nut,
+# the minor diameter is the diameter of the inner most part of the nut
+DFLT_dia_major: float = 8
+
+# Height of main item
+DFLT_height: float = 10 + (2 * DFLT_inset)
+
+# Size of the head
+DFLT_head_size: float = 12
+
+# Size of the flat at major diameter
+DFLT_major_cutoff: float = DFLT_pitch / 8
+
+# Size of the flat at minor diameter
+DFLT_minor_cutoff: float = DFLT_pitch / 4
+
+# A decimal fraction such that (taper_out_rpos * t_range) defines
+# the t value where tapering out ends. The tapering begins at t: float = first_t.
+DFLT_taper_out_rpos: float = 0.1
+
+# A decimal fraction such that (taper_in_rpos * t_range) defines
+# the t value where tapering in begins. The tapering ends at t: float = last_t.
+DFLT_taper_in_rpos: float = 1 - DFLT_taper_out_rpos
+
+# Height of head
+DFLT_head_height: float = 4
+
+# Amount substracted from bolt radius to hollow out the bolt
+DFLT_wall_thickness: float = 2
+
+# The parts that can be generated
+PARTS: Sequence[str] = ("bolt", "nut")
+
+# The formats of stl files
+STL_FORMATS: Sequence[str] = ("ascii", "binary")
+
+# The engines that can generate a part, "occ" builds the part with
+# cadquery and tessellates it, "mesh" creates the mesh directly
+ENGINES: Sequence[str] = ("occ", "mesh")
+
+# The quality of a part built by the occ engine, "preview" is coarse and
+# the head, core and threads aren't combined so it's quick to rebuild
+QUALITIES: Sequence[str] = ("final", "preview")
+
+# Default directory for generated files
+DFLT_directory: str = "generated"
+
+
+@dataclass
+class PartParams:
+    """
+    All of the parameters needed to generate a bolt or nut.
+
+    The thread fields are passed to HelicalThread, head_height and
+    wall_thickness are only used by bolts.
+    """
+
+    part: str = "bolt"
+    """Either "bolt" or "nut" """
+
+    ext_clearance: float = DFLT_ext_clearance
+    thread_overlap: float = DFLT_thread_overlap
+    stl_tolerance: float = DFLT_stl_tolerance
+    pitch: float = DFLT_pitch
+    angle_degs: float = DFLT_angle_degs
+    inset: float = DFLT_inset
+    dia_major: float = DFLT_dia_major
+    height: float = DFLT_height
+    head_size: float = DFLT_head_size
+    major_cutoff: float = DFLT_major_cutoff
+    minor_cutoff: float = DFLT_minor_cutoff
+    taper_out_rpos: float = DFLT_taper_out_rpos
+    taper_in_rpos: float = DFLT_taper_in_rpos
+    head_height: float = DFLT_head_height
+    wall_thickness: float = DFLT_wall_thickness
+    angular_tolerance: float = DFLT_angular_tolerance
+
+    core_tolerance: float = 0
+    """Tolerance of the head and core, 0 is stl_tolerance"""
+
+    core_angular_tolerance: float = 0
+    """Angular tolerance of the head and core, 0 is angular_tolerance"""
+
+    max_triangles: int = 0
+    """
+    If > 0 the tolerances are increased until the part has no more
+    than max_triangles, 0 is no limit
+    """
+
+    engine: str = "occ"
+    """How the part is generated, one of ENGINES"""
+
+    quality: str = "final"
+    """The quality of the part, one of QUALITIES"""
+
+    replicate: bool = False
+    """Construct the threads by replicating one turn, see ThreadOptions"""
+
+    native_helix: bool = False
+    """Construct the untapered threads from exact helixes, see ThreadOptions"""
+
+    chunks: int = 1
+    """
+    If > 1 the part is built in this many axial chunks in parallel,
+    see cq_chunks, so long parts are built faster
+    """
+
+    union: bool = True
+    """
+    Combine the head, core and threads with union, if False they are
+    overlapping Solids in the stl file which slicers combine
+    """
+
+    stl_format: str = "ascii"
+    """The format of the stl file, "ascii" or "binary" """
+
+    stl_gzip: bool = False
+    """Compress the stl file with gzip"""
+
+    jobs: int = 1
+    """
+    Threads tessellating the faces of each Solid in parallel, 0 is one
+    per cpu, see cq_stl.tessellate. It doesn't change the stl file.
+    """
+
+    def helical_thread(self) -> "HelicalThread":
+        """Return the HelicalThread defined by these parameters"""
+        from helical_thread import HelicalThread
+
+        return HelicalThread(
+            height=self.height,
+            pitch=self.pitch,
+            radius=self.dia_major / 2,
+            angle_degs=self.angle_degs,
+            inset_offset=self.inset,
+            ext_clearance=self.ext_clearance,
+            taper_out_rpos=self.taper_out_rpos,
+            taper_in_rpos=self.taper_in_rpos,
+            major_cutoff=self.major_cutoff,
+            minor_cutoff=self.minor_cutoff,
+            thread_overlap=self.thread_overlap,
+        )
+
+    def fname(self) -> str:
+        """
+        Return the name of the stl file. The dimensions and stl_tolerance
+        are always encoded in it, the options which change the file, see
+        options, are only encoded when they aren't the default so the
+        variants of a part don't replace each other.
+        """
+        fname: str = self._fname()
+        opts: str = "".join(f"-{o}" for o in self.options())
+        if self.quality != "final":
+            # So previews don't replace the final parts
+            opts += f"-{self.quality}"
+        fname = fname.replace(".stl", f"{opts}.stl")
+        return fname + (".gz" if self.stl_gzip else "")
+
+    def options(self) -> List[str]:
+        """
+        Return the names of the options, other than the dimensions,
+        stl_tolerance and quality, which aren't the default and change
+        the stl file. jobs and stl_gzip don't change the triangles.
+        """
+        opts: List[str] = []
+        if self.engine != "occ":
+            opts.append(self.engine)
+        if self.replicate:
+            opts.append("replicate")
+        if self.native_helix:
+            opts.append("nh")
+        if self.chunks > 1:
+            opts.append(f"ch_{self.chunks}")
+        if not self.union:
+            opts.append("no_union")
+        if self.angular_tolerance != DFLT_angular_tolerance:
+            opts.append(f"at_{self.angular_tolerance:g}")
+        if self.core_tolerance > 0:
+            opts.append(f"ct_{self.core_tolerance:g}")
+        if self.core_angular_tolerance > 0:
+            opts.append(f"cat_{self.core_angular_tolerance:g}")
+        if self.max_triangles > 0:
+            opts.append(f"mt_{self.max_triangles}")
+        if self.stl_format != "ascii":
+            opts.append(self.stl_format)
+        return opts
+
+    def _fname(self) -> str:
+        if self.part == "bolt":
+            return f"bolt-dia_{self.dia_major:.3f}-p_{self.pitch:.3f}-a_{self.angle_degs:.3f}-h_{self.height:.3f}-hs_{self.head_size:.3f}-mj_{self.major_cutoff:.3f}-mi_{self.minor_cutoff:.3f}-ec_{self.ext_clearance:.3f}-to_{self.thread_overlap:.4f}-tol_{self.stl_tolerance:.3f}.stl"
+        else:
+            return f"nut-dia_{self.dia_major:.3f}-p_{self.pitch:.3f}-a_{self.angle_degs:.3f}-h_{self.height:.3f}-hs_{self.head_size:.3f}-mj_{self.major_cutoff:.3f}-mi_{self.minor_cutoff:.3f}-ec_{self.ext_clearance:.3f}-to_{self.thread_overlap:.4f}-tol_{self.stl_tolerance:.3f}.stl"
+
+    def path(self, directory: str = DFLT_directory) -> str:
+        return os.path.join(directory, self.fname())
+
+
+@dataclass
+class JobResult:
+    """The result of generating one part"""
+
+    params: PartParams
+    """The parameters of the part"""
+
+    path: str
+    """The stl file"""
+
+    ok: bool = False
+    """True if the stl file was created"""
+
+    seconds: float = 0
+    """Wall time of the job"""
+
+    error: Optional[str] = None
+    """The error if not ok"""
+
+    cached: bool = False
+    """True if the stl file came from the StlCache"""
+
+    bytes: int = 0
+    """The size of the stl file"""
+
+    export_seconds: float = 0
+    """Wall time of the export"""
+
+    triangles: int = 0
+    """Number of triangles in the stl file, 0 if it was cached"""
+
+    deviation: float = 0
+    """Maximum deviation of the triangles from the part, 0 if it was cached"""
+
+    skipped: bool = False
+    """True if the parameters are invalid so nothing was built, see error"""
+
+    warnings: List[str] = field(default_factory=list)
+    """Warnings about the parameters, see cq_validate"""
+
+    fallback: Optional[str] = None
+    """
+    The name of the cq_watchdog.FALLBACKS entry the part was built with
+    because it failed with params, None if it was built with params
+    """
+
+    attempts: int = 1
+    """The number of times the part was built, see cq_watchdog"""
+
+
+# The float fields of PartParams in the order they are read from threads.ini,
+# later values may be expressions using earlier ones, i.e. "pitch / 8"
+FLOAT_FIELDS: List[str] = [f.name for f in fields(PartParams) if f.type is float]
+
+# The fields of PartParams set by the command line arguments
+ARG_FIELDS: List[str] = [f.name for f in fields(PartParams) if f.name != "part"]
+
+
+def load_params(part: str, fname: str = "threads.ini") -> PartParams:
+    """
+    Return the PartParams for part using the [part] section of the
+    config file, missing values use the DFLT_xxx values.
+
+    Each value is a python expression which is evaluated with the
+    previously read values available as variables. The file is only
+    read and evaluated again when it changes, see compile_config.
+
+    :param part: "bolt" or "nut", the section to read
+    :param fname: name of the config file
+    :returns: PartParams
+    """
+    if part not in PARTS:
+        raise ValueError(f"part:{part} should be one of {PARTS}")
+
+    # A copy so the cached PartParams can't be changed
+    return replace(compile_config(fname)[part])
+
+
+def compile_config(fname: str = "threads.ini") -> Dict[str, PartParams]:
+    """
+    Return the PartParams of each of PARTS defined by the config file.
+
+    The sections are parsed and their expressions evaluated once and the
+    result is cached until the size or modification time of the file
+    changes, so tools which load many parameters only read it once.
+
+    :param fname: name of the config file, if it doesn't exist
+                  every value is the DFLT_xxx value
+    :returns: Dict of part to its PartParams, which must not be modified
+    """
+    try:
+        st: os.stat_result = os.stat(fname)
+        return _compile_config(os.path.abspath(fname), st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return _compile_config(os.path.abspath(fname), 0, -1)
+
+
+@lru_cache(maxsize=16)
+def _compile_config(fname: str, mtime_ns: int, size: int) -> Dict[str, PartParams]:
+    """compile_config of fname, its modification time and size are the cache key"""
+    import configparser as cp
+
+    config = cp.ConfigParser()
+    if size >= 0:
+        config.read(fname)
+
+    result: Dict[str, PartParams] = {}
+    for part in PARTS:
+        dflts: PartParams = PartParams(part=part)
+        values: Dict[str, Any] = {}
+        for name in FLOAT_FIELDS:
+            v: Union[str, None] = config.get(part, name, fallback=None)
+            values[name] = (
+                float(eval(v, {}, dict(values)))
+                if v is not None
+                else getattr(dflts, name)
+            )
+        result[part] = replace(dflts, **values)
+    return result
+
+
+def add_arguments(parser: argparse.ArgumentParser, params: PartParams) -> None:
+    """
+    Add the command line arguments for params to parser,
+    the current values of params are the defaults.
+    """
+    # Ignored for nuts
+    parser.add_argument(
+        "-c",
+        "--ext_clearance",
+        help="Clearance between internal and external threads",
+        nargs="?",
+        type=float,
+        default=params.ext_clearance,
+    )
+    parser.add_argument(
+        "-to",
+        "--thread_overlap",
+        help="Thread overlap with core",
+        nargs="?",
+        type=float,
+        default=params.thread_overlap,
+    )
+    parser.add_argument(
+        "-st",
+        "--stl_tolerance",
+        help="stl file tollerance",
+        nargs="?",
+        type=float,
+        default=params.stl_tolerance,
+    )
+    parser.add_argument(
+        "-p",
+        "--pitch",
+        help="thread pitch",
+        nargs="?",
+        type=float,
+        default=params.pitch,
+    )
+    parser.add_argument(
+        "-a",
+        "--angle_degs",
+        help="Angle of thread in degrees",
+        nargs="?",
+        type=float,
+        default=params.angle_degs,
+    )
+    parser.add_argument(
+        "-in",
+        "--inset",
+        help="Top and bottom inset of threads",
+        nargs="?",
+        type=float,
+        default=params.inset,
+    )
+    parser.add_argument(
+        "-d",
+        "--diameter",
+        dest="dia_major",
+        metavar="DIAMETER",
+        help="Diameter",
+        nargs="?",
+        type=float,
+        default=params.dia_major,
+    )
+    parser.add_argument(
+        "-he",
+        "--height",
+        help="Height of threads including inset",
+        nargs="?",
+        type=float,
+        default=params.height,
+    )
+    parser.add_argument(
+        "-hs",
+        "--head_size",
+        help="Size of head",
+        nargs="?",
+        type=float,
+        default=params.head_size,
+    )
+    parser.add_argument(
+        "-mj",
+        "--major_cutoff",
+        help="Thread cutoff at outside diameter (major_diameter)",
+        nargs="?",
+        type=float,
+        default=params.major_cutoff,
+    )
+    parser.add_argument(
+        "-mi",
+        "--minor_cutoff",
+        help="Thread cutoff at inside diameter (minor_diameter)",
+        nargs="?",
+        type=float,
+        default=params.minor_cutoff,
+    )
+    parser.add_argument(
+        "-tir",
+        "--taper_in_rpos",
+        help="Taper in relative position, so 0.1 is 10%% of the initial thread will be tapered",
+        nargs="?",
+        type=float,
+        default=params.taper_in_rpos,
+    )
+    parser.add_argument(
+        "-tor",
+        "--taper_out_rpos",
+        help="Taper out relative position, so 0.9 means so 10%% of the ending portion of thread will be tapered",
+        nargs="?",
+        type=float,
+        default=params.taper_out_rpos,
+    )
+    if params.part == "bolt":
+        parser.add_argument(
+            "-hh",
+            "--head_height",
+            help="Head height",
+            nargs="?",
+            type=float,
+            default=params.head_height,
+        )
+        parser.add_argument(
+            "-wt",
+            "--wall_thickness",
+            help="wall_thickness",
+            nargs="?",
+            type=float,
+            default=params.wall_thickness,
+        )
+    parser.add_argument(
+        "-at",
+        "--angular_tolerance",
+        help="stl file angular tolerance in radians",
+        nargs="?",
+        type=float,
+        default=params.angular_tolerance,
+    )
+    parser.add_argument(
+        "-ct",
+        "--core_tolerance",
+        help="stl file tolerance of the head and core, 0 is stl_tolerance",
+        nargs="?",
+        type=float,
+        default=params.core_tolerance,
+    )
+    parser.add_argument(
+        "-cat",
+        "--core_angular_tolerance",
+        help="stl file angular tolerance of the head and core, 0 is angular_tolerance",
+        nargs="?",
+        type=float,
+        default=params.core_angular_tolerance,
+    )
+    parser.add_argument(
+        "-mt",
+        "--max_triangles",
+        help="Increase the tolerances until there are no more than max_triangles, 0 is no limit",
+        type=int,
+        default=params.max_triangles,
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        help="occ builds the part with cadquery, mesh creates the mesh directly which is faster",
+        choices=ENGINES,
+        default=params.engine,
+    )
+    parser.add_argument(
+        "-q",
+        "--quality",
+        help="preview is coarse and the head, core and threads are separate solids which is much quicker to build",
+        choices=QUALITIES,
+        default=params.quality,
+    )
+    parser.add_argument(
+        "-r",
+        "--replicate",
+        help="Construct the threads by replicating one turn, faster for long threads",
+        action="store_true",
+        default=params.replicate,
+    )
+    parser.add_argument(
+        "-nh",
+        "--native_helix",
+        help="Construct the untapered section of the threads from exact helixes rather than fitted curves",
+        action="store_true",
+        default=params.native_helix,
+    )
+    parser.add_argument(
+        "-ch",
+        "--chunks",
+        help="Build the part in this many axial chunks in parallel, faster for long parts",
+        type=int,
+        default=params.chunks,
+    )
+    parser.add_argument(
+        "-nu",
+        "--no_union",
+        dest="union",
+        help="Don't union the head, core and threads, they overlap in the stl file which is much faster",
+        action="store_false",
+        default=params.union,
+    )
+    parser.add_argument(
+        "-sf",
+        "--stl_format",
+        help="Format of the stl file",
+        choices=STL_FORMATS,
+        default=params.stl_format,
+    )
+    parser.add_argument(
+        "-z",
+        "--stl_gzip",
+        help="Compress the stl file with gzip",
+        action="store_true",
+        default=params.stl_gzip,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Threads tessellating the faces in parallel, 0 is one per cpu",
+        type=int,
+        default=params.jobs,
+    )
+
+
+def params_from_args(args: argparse.Namespace, params: PartParams) -> PartParams:
+    """Return a copy of params updated with the values parsed by add_arguments"""
+    return replace(
+        params,
+        **{name: getattr(args, name) for name in ARG_FIELDS if hasattr(args, name)},
+    )
+
+
+def pair_params(params: PartParams) -> Tuple[PartParams, PartParams]:
+    """
+    Return the parameters of a bolt and the nut that it mates with, they
+    have the same threads and head, only part differs. So the files are
+    named consistently, bolt-xxx.stl and nut-xxx.stl with the same xxx.
+    """
+    return replace(params, part="bolt"), replace(params, part="nut")
+
+
+def budget_scale(triangles: int, max_triangles: int) -> float:
+    """
+    Return the factor the linear tolerances are multiplied by so that
+    triangles is reduced to max_triangles. The number of segments of a
+    curve is proportional to 1/sqrt(tolerance), or 1/angular_tolerance,
+    so the linear tolerances are multiplied by the returned value and
+    the angular tolerances by its square root. It's slightly larger
+    so the result is usually within the budget.
+    """
+    return ((triangles / max_triangles) ** 2) * 1.1
+
+
+def parse_values(s: str) -> List[float]:
+    """
+    Parse a list of values, either comma separated "1,1.5,2"
+    or an inclusive range "start:stop:step" such as "1:2:0.5".
+    """
+    if ":" in s:
+        start, stop, step = [float(v) for v in s.split(":")]
+        if step <= 0:
+            raise ValueError(f"step:{step} should be > 0")
+        count: int = int(round((stop - start) / step)) + 1
+        return [start + (i * step) for i in range(0, max(count, 0))]
+    else:
+        return [float(v) for v in s.split(",")]
+
+
+def expand_grid(base: PartParams, grid: Dict[str, Sequence[float]]) -> List[PartParams]:
+    """
+    Return the cartesian product of the values in grid applied to base.
+
+    :param base: the values of fields not in grid
+    :param grid: field name to a sequence of values for that field
+    :returns: List of PartParams, one per combination
+    """
+    for name in grid:
+        if name not in FLOAT_FIELDS:
+            raise ValueError(
+                f"{name} is not a parameter, expecting one of {FLOAT_FIELDS}"
+            )
+
+    names: List[str] = list(grid.keys())
+    result: List[PartParams] = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        overrides: Dict[str, Any] = dict(zip(names, values))
+        result.append(replace(base, **overrides))
+    return result
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from cq_args import PSTATS_EXTENSIONS
+
+if TYPE_CHECKING:
+    import cProfile
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process in MB"""
+    rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KB elsewhere
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def rss_mb() -> float:
+    """
+    Return the current resident set size of this process in MB, or the
+    peak if it can't be read, /proc/self/statm is linux only
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages: int = int(f.read().split()[1])
+    except OSError:
+        return peak_rss_mb()
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+@dataclass
+class StageRecord:
+    """The measurements of one stage"""
+
+    name: str
+    """The name of the stage, such as "threads.wires" """
+
+    depth: int = 0
+    """The number of enclosing stages"""
+
+    seconds: float = 0
+    """Wall time of the stage"""
+
+    rss_mb: float = 0
+    """
+    Change of the resident set size of the process during the stage,
+    the memory it kept, negative if it freed more than it allocated
+    """
+
+    counts: Dict[str, int] = field(default_factory=dict)
+    """Counts of what the stage created, such as faces, edges or triangles"""
+
+
+class Stage:
+    """
+    A stage of the pipeline used as a context manager. This is the
+    disabled stage, it does nothing, so instrumentation costs nothing
+    when there is no Profiler. Check enabled before computing counts
+    that are expensive.
+    """
+
+    enabled: bool = False
+
+    def __enter__(self) -> "Stage":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+    def count(self, **counts: int) -> None:
+        """Add counts to the stage"""
+        pass
+
+
+class _TimedStage(Stage):
+    enabled: bool = True
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler: "Profiler" = profiler
+        self.record: StageRecord = StageRecord(name=name)
+        self.start: float = 0
+        self.start_rss_mb: float = 0
+
+    def __enter__(self) -> "Stage":
+        self.record.depth = self.profiler._depth
+        self.profiler._depth += 1
+        self.start_rss_mb = rss_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.record.seconds = time.perf_counter() - self.start
+        self.record.rss_mb = rss_mb() - self.start_rss_mb
+        self.profiler._depth -= 1
+        self.profiler.records.append(self.record)
+
+    def count(self, **counts: int) -> None:
+        for k, v in counts.items():
+            self.record.counts[k] = self.record.counts.get(k, 0) + v
+
+
+class Profiler:
+    """
+    Records a StageRecord for each stage and optionally
+    profiles everything between start and stop with cProfile.
+    """
+
+    def __init__(self, cprofile: bool = False):
+        self.records: List[StageRecord] = []
+        self.seconds: float = 0
+        self._depth: int = 0
+        self._start: float = 0
+        self._cprofile: Optional["cProfile.Profile"] = None
+        if cprofile:
+            # Imported here so the command line tools start quickly
+            from cProfile import Profile
+
+            self._cprofile = Profile()
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stop(self) -> None:
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.seconds = time.perf_counter() - self._start
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the records combined by name, the calls, total seconds,
+        total rss_mb and summed counts of each stage.
+        """
+        result: Dict[str, Dict[str, Any]] = {}
+        for r in self.records:
+            s: Dict[str, Any] = result.setdefault(
+                r.name, {"calls": 0, "seconds": 0.0, "rss_mb": 0.0, "counts": {}}
+            )
+            s["calls"] += 1
+            s["seconds"] += r.seconds
+            s["rss_mb"] += r.rss_mb
+            for k, v in r.counts.items():
+                s["counts"][k] = s["counts"].get(k, 0) + v
+        return result
+
+    def report(self) -> Dict[str, Any]:
+        """Return the json serializable report"""
+        return {
+            "seconds": self.seconds,
+            "peak_rss_mb": peak_rss_mb(),
+            "summary": self.summary(),
+            "stages": [asdict(r) for r in self.records],
+        }
+
+    def dump(self, path: str) -> None:
+        """
+        Write the cProfile stats if path ends with one of
+        PSTATS_EXTENSIONS otherwise the json report.
+        """
+        if path.endswith(PSTATS_EXTENSIONS):
+            if self._cprofile is None:
+                raise ValueError(f"{path} requires Profiler(cprofile=True)")
+            self._cprofile.dump_stats(path)
+        else:
+            with open(path, "w") as f:
+                json.dump(self.report(), f, indent=2)
+
+    def format_summary(self) -> str:
+        """Return the summary as a table, one line per stage"""
+        lines: List[str] = []
+        for name, s in self.summary().items():
+            counts: str = " ".join(f"{k}={v}" for k, v in s["counts"].items())
+            lines.append(
+                f"{name:24} calls={s['calls']:<4} {s['seconds']:8.3f}s rss={s['rss_mb']:+.1f}MB {counts}"
+            )
+        lines.append(
+            f"{'total':24} {self.seconds:19.3f}s peak_rss={peak_rss_mb():.1f}MB"
+        )
+        return "\n".join(lines)
+
+
+# The disabled stage returned by stage when there is no Profiler
+_disabled_stage: Stage = Stage()
+
+# The Profiler used by stage, None disables profiling
+_profiler: Optional[Profiler] = None
+
+
+def set_profiler(profiler: Optional[Profiler]) -> Optional[Profiler]:
+    """
+    Set the Profiler which records the stages.
+
+    :param profiler: The profiler or None to disable profiling
+    :returns: The previous profiler
+    """
+    global _profiler
+    prev: Optional[Profiler] = _profiler
+    _profiler = profiler
+    return prev
+
+
+def stage(name: str) -> Stage:
+    """
+    Return a context manager which records the stage name in the
+    Profiler set by set_profiler, if there isn't one it does nothing.
+
+        with stage("threads.faces") as s:
+            faces = ...
+            s.count(faces=len(faces))
+    """
+    if _profiler is None:
+        return _disabled_stage
+    return _TimedStage(_profiler, name)
+
+
+def profiler_from_args(args: argparse.Namespace) -> Optional[Profiler]:
+    """Return the Profiler defined by add_profile_arguments or None if disabled"""
+    if args.profile is None:
+        return None
+    return Profiler(cprofile=args.profile.endswith(PSTATS_EXTENSIONS))
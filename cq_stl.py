@@ -0,0 +1,294 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from math import sqrt
+from typing import List, Tuple, Union, cast
+
+import cadquery as cq
+import numpy as np
+from OCP.BRep import BRep_Tool
+from OCP.BRepMesh import BRepMesh_IncrementalMesh
+from OCP.BRepTools import BRepTools
+from OCP.OSD import OSD_Parallel, OSD_ThreadPool
+from OCP.StlAPI import StlAPI_Writer
+from OCP.TopLoc import TopLoc_Location
+
+from cq_params import BUDGET_PASSES, STL_FORMATS, DFLT_angular_tolerance, budget_scale
+from cq_profile import Stage, stage
+from mesh import Mesh, read_stl
+
+# Size of the chunks copied when compressing
+_CHUNK_SIZE: int = 1024 * 1024
+
+# The types of the faces of the head and core, a Solid whose faces are
+# all these types is tessellated with the core tolerances
+CORE_GEOM_TYPES = ("PLANE", "CYLINDER")
+
+
+@dataclass
+class ExportResult:
+    """The result of exporting a shape"""
+
+    path: str
+    """The file written"""
+
+    bytes: int = 0
+    """The size of the file"""
+
+    seconds: float = 0
+    """Wall time of the export including tessellation"""
+
+    triangles: int = 0
+    """Number of triangles in the file"""
+
+    deviation: float = 0
+    """Maximum deviation of the triangles from the surfaces"""
+
+
+def to_shape(obj: Union[cq.Workplane, cq.Shape]) -> cq.Shape:
+    """Return the Shape of a Workplane as a Compound, a Shape is returned as is"""
+    if isinstance(obj, cq.Workplane):
+        return cq.Compound.makeCompound(
+            [cast(cq.Shape, v) for v in obj.vals() if isinstance(v, cq.Shape)]
+        )
+    return obj
+
+
+def triangle_count(shape: cq.Shape) -> int:
+    """Return the number of triangles of the tessellation of shape"""
+    count: int = 0
+    for face in shape.Faces():
+        triangulation = BRep_Tool.Triangulation_s(face.wrapped, TopLoc_Location())
+        if triangulation is not None:
+            count += triangulation.NbTriangles()
+    return count
+
+
+def max_deviation(shape: cq.Shape) -> float:
+    """Return the maximum deflection of the tessellation of the faces of shape"""
+    deviation: float = 0
+    for face in shape.Faces():
+        triangulation = BRep_Tool.Triangulation_s(face.wrapped, TopLoc_Location())
+        if triangulation is not None:
+            deviation = max(deviation, triangulation.Deflection())
+    return deviation
+
+
+def is_core(solid: cq.Shape) -> bool:
+    """Return True if all of the faces of solid are one of CORE_GEOM_TYPES"""
+    return all(face.geomType() in CORE_GEOM_TYPES for face in solid.Faces())
+
+
+def set_mesh_jobs(jobs: int) -> bool:
+    """
+    Size OCC's thread pool so faces are tessellated by jobs threads and
+    return True if they're tessellated in parallel.
+
+    :param jobs: The number of threads, 0 is one per cpu
+    """
+    if jobs == 0:
+        jobs = OSD_Parallel.NbLogicalProcessors_s()
+    if jobs <= 1:
+        return False
+    # OCC's own threads rather than TBB's, whose number can't be limited
+    OSD_Parallel.SetUseOcctThreads_s(True)
+    pool: OSD_ThreadPool = OSD_ThreadPool.DefaultPool_s()
+    if pool.NbThreads() < jobs:
+        pool.Init(jobs)
+    pool.SetNbDefaultThreadsToLaunch(jobs)
+    return True
+
+
+def tessellate(
+    shape: cq.Shape,
+    tolerance: float,
+    angular_tolerance: float = DFLT_angular_tolerance,
+    core_tolerance: float = 0,
+    core_angular_tolerance: float = 0,
+    jobs: int = 1,
+) -> None:
+    """
+    Tessellate the Solids of shape which are the head or core, see
+    is_core, using the core tolerances and the others, which contain
+    threads, using tolerance and angular_tolerance.
+
+    When the head, core and threads are one Solid, the default union,
+    it's tessellated with the thread tolerances then the triangulations
+    of its core faces, see CORE_GEOM_TYPES, are discarded and they're
+    tessellated again with the core tolerances. The edges they share
+    with the thread faces keep the thread faces' discretization so the
+    tessellation stays watertight, only the core faces are coarser.
+
+    The faces of each Solid are tessellated by jobs threads, see
+    set_mesh_jobs, the tessellation is the same as with one thread.
+    Most of the time is the few long helical faces of the threads so
+    the time is at least the time of the largest face.
+
+    :param core_tolerance: If 0 tolerance is used
+    :param core_angular_tolerance: If 0 angular_tolerance is used
+    :param jobs: The number of threads, 0 is one per cpu
+    """
+    parallel: bool = set_mesh_jobs(jobs)
+    core: Tuple[float, float] = (
+        core_tolerance if core_tolerance > 0 else tolerance,
+        core_angular_tolerance if core_angular_tolerance > 0 else angular_tolerance,
+    )
+    threads: Tuple[float, float] = (tolerance, angular_tolerance)
+    # Always tessellate each Solid on its own, the relative tolerances
+    # of a Solid differ when it's tessellated as part of a Compound
+    solids: List[cq.Shape] = list(shape.Solids()) or [shape]
+    for solid in solids:
+        tols: Tuple[float, float] = core if is_core(solid) else threads
+        BRepMesh_IncrementalMesh(solid.wrapped, tols[0], True, tols[1], parallel)
+        if tols == core:
+            continue
+        faces: List[cq.Face] = [
+            f for f in solid.Faces() if f.geomType() in CORE_GEOM_TYPES
+        ]
+        if faces:
+            for face in faces:
+                BRepTools.Clean_s(face.wrapped)
+            BRepMesh_IncrementalMesh(solid.wrapped, core[0], True, core[1], parallel)
+
+
+def tessellate_budget(
+    shape: cq.Shape,
+    tolerance: float,
+    angular_tolerance: float = DFLT_angular_tolerance,
+    core_tolerance: float = 0,
+    core_angular_tolerance: float = 0,
+    max_triangles: int = 0,
+    jobs: int = 1,
+) -> int:
+    """
+    Tessellate shape, see tessellate. If max_triangles > 0 and there are
+    more triangles all of the tolerances are increased and shape is
+    tessellated again, up to BUDGET_PASSES times.
+
+    :returns: The number of triangles
+    """
+    s: Stage
+    triangles: int = 0
+    with stage("export.tessellate") as s:
+        scale: float = 1
+        for i in range(BUDGET_PASSES):
+            # Discard any previous tessellation, it may be finer than is needed
+            BRepTools.Clean_s(shape.wrapped)
+            tessellate(
+                shape,
+                tolerance * scale,
+                angular_tolerance * sqrt(scale),
+                core_tolerance * scale,
+                core_angular_tolerance * sqrt(scale),
+                jobs,
+            )
+            triangles = triangle_count(shape)
+            if (max_triangles <= 0) or (triangles <= max_triangles):
+                break
+            if i < BUDGET_PASSES - 1:
+                scale *= budget_scale(triangles, max_triangles)
+        s.count(triangles=triangles)
+    return triangles
+
+
+def shape_mesh(shape: cq.Shape) -> Mesh:
+    """
+    Return the Mesh of the tessellation of shape, see tessellate_budget,
+    faces which aren't tessellated are skipped.
+
+    OCC writes the triangles as a binary stl file to a temporary
+    directory and it's read into arrays with read_stl, the triangles
+    aren't copied one at a time in python so this takes milliseconds
+    for tens of thousands of triangles. Every triangle has its own 3
+    vertices, which are rounded to floats, see merge_vertices.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path: str = os.path.join(directory, "shape.stl")
+        writer = StlAPI_Writer()
+        writer.ASCIIMode = False
+        if not writer.Write(shape.wrapped, path):
+            return Mesh(np.zeros((0, 3)), np.zeros((0, 3), dtype=int))
+        mesh: Mesh = read_stl(path)
+    mesh.deviation = max_deviation(shape)
+    return mesh
+
+
+def export_stl(
+    obj: Union[cq.Workplane, cq.Shape],
+    path: str,
+    tolerance: float,
+    angular_tolerance: float = DFLT_angular_tolerance,
+    stl_format: str = "ascii",
+    compress: bool = False,
+    core_tolerance: float = 0,
+    core_angular_tolerance: float = 0,
+    max_triangles: int = 0,
+    jobs: int = 1,
+) -> ExportResult:
+    """
+    Tessellate obj and write it as an ascii or binary stl file.
+
+    If max_triangles > 0 and there are more triangles all of the
+    tolerances are increased and obj is tessellated again, up to
+    BUDGET_PASSES times.
+
+    The file is written by OCC directly from the tessellation, one
+    facet at a time, so there is no intermediate representation of
+    the file in memory. If compress is True the file is written
+    and then compressed with gzip in chunks to path.
+
+    :param obj: The Workplane or Shape to export
+    :param path: The file to create
+    :param tolerance: Linear deflection of the tessellation
+    :param angular_tolerance: Angular deflection of the tessellation
+    :param stl_format: "ascii" or "binary"
+    :param compress: If True path is a gzip compressed file
+    :param core_tolerance: Linear deflection of the head and core, see tessellate
+    :param core_angular_tolerance: Angular deflection of the head and core
+    :param max_triangles: If > 0 the maximum number of triangles
+    :param jobs: The number of threads tessellating the faces, see tessellate
+    :returns: ExportResult
+    """
+    if stl_format not in STL_FORMATS:
+        raise ValueError(f"stl_format:{stl_format} should be one of {STL_FORMATS}")
+
+    start: float = time.perf_counter()
+    shape: cq.Shape = to_shape(obj)
+    s: Stage
+    triangles: int = tessellate_budget(
+        shape,
+        tolerance,
+        angular_tolerance,
+        core_tolerance,
+        core_angular_tolerance,
+        max_triangles,
+        jobs,
+    )
+
+    with stage("export.write") as s:
+        writer = StlAPI_Writer()
+        writer.ASCIIMode = stl_format == "ascii"
+        stl_path: str = f"{path}.{os.getpid()}.tmp" if compress else path
+        if not writer.Write(shape.wrapped, stl_path):
+            raise IOError(f"Unable to write {stl_path}")
+        s.count(bytes=os.path.getsize(stl_path))
+
+    if compress:
+        with stage("export.compress") as s:
+            try:
+                with open(stl_path, "rb") as src, gzip.open(path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+            finally:
+                os.remove(stl_path)
+            s.count(bytes=os.path.getsize(path))
+
+    return ExportResult(
+        path=path,
+        bytes=os.path.getsize(path),
+        seconds=time.perf_counter() - start,
+        triangles=triangles,
+        deviation=max_deviation(shape),
+    )
@@ -1,113 +1,466 @@
-from typing import Callable, List, Tuple, cast
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from math import isclose, pi
+from typing import Callable, List, Optional, Tuple, cast
 
 import cadquery as cq
-from helical_thread import ThreadHelixes
+from helical_thread import HelicalThread, ThreadHelixes
+from OCP.BRepBuilderAPI import BRepBuilderAPI_MakeEdge
+from OCP.BRepLib import BRepLib
+from OCP.GCE2d import GCE2d_MakeSegment
+from OCP.Geom import Geom_CylindricalSurface
+from OCP.gp import gp_Ax3, gp_Dir, gp_Pnt, gp_Pnt2d
 from taperable_helix import HelixLocation
 
+from cq_profile import Stage, stage
 from utils import dbg, setCtx, show
 
 setCtx(globals())
 
+# Bump when _make_threads changes the Solid it creates
+THREAD_CACHE_FORMAT: int = 1
 
-def _threads(external_threads: bool, ths: ThreadHelixes) -> cq.Solid:
+# Default maximum size of the Solids kept in memory by ThreadCache
+DFLT_thread_cache_max_mb: float = 256
+
+
+@dataclass(frozen=True)
+class ThreadOptions:
+    """
+    Options which control how the threads are constructed
+    but not their dimensions.
+    """
+
+    replicate: bool = False
+    """
+    If True the untapered section is constructed from one turn which
+    is replicated, so the time to construct long threads is reduced.
+    """
+
+    native_helix: bool = False
+    """
+    If True the untapered section is constructed from OCC's exact
+    helixes, lines on cylinders, and only the tapered ends are fitted
+    curves, so less time is spent fitting and the faces are lighter.
+    """
+
+    samples: int = 400
+    """
+    Number of points of each helix a curve is fitted to, for each
+    section if the threads are sectioned. The default is that of
+    cq.Workplane.parametricCurve, fewer is faster but coarser.
+    """
+
+
+# Coarse but valid threads which are quick to construct, the fitted
+# tapered ends are too short to need many points
+PREVIEW_OPTIONS: ThreadOptions = ThreadOptions(native_helix=True, samples=20)
+
+
+class ThreadCache:
+    """
+    A cache of the Solids created by _threads so parts which only
+    differ in their head or core, such as head_size, head_height or
+    wall_thickness, reuse the same threads.
+
+    The Solids are kept in memory, limited to max_bytes of their BREP
+    serialization, and if directory isn't None also written to
+    directory as BREP files so they can be shared between processes
+    and runs. When the memory limit is exceeded the least recently
+    used Solids are dropped from memory, the files are kept.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: int = int(DFLT_thread_cache_max_mb * 1024 * 1024),
+    ):
+        self.directory: Optional[str] = directory
+        self.max_bytes: int = max_bytes
+        self.bytes: int = 0
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self._solids: "OrderedDict[str, Tuple[cq.Solid, int]]" = OrderedDict()
+
+    @staticmethod
+    def key(external_threads: bool, ths: ThreadHelixes, opts: ThreadOptions) -> str:
+        """Return a stable hash of the parameters used to create the threads"""
+        d = {
+            "format": THREAD_CACHE_FORMAT,
+            "external_threads": external_threads,
+            "ths": asdict(ths),
+            "opts": asdict(opts),
+        }
+        return hashlib.sha256(json.dumps(d, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(cast(str, self.directory), f"{key}.brep")
+
+    def _add(self, key: str, solid: cq.Solid, size: int) -> None:
+        self._solids[key] = (solid, size)
+        self.bytes += size
+        while (self.bytes > self.max_bytes) and (len(self._solids) > 1):
+            _, (_, evicted_size) = self._solids.popitem(last=False)
+            self.bytes -= evicted_size
+
+    def get(self, key: str) -> Optional[cq.Solid]:
+        """Return a copy of the cached Solid or None if it's not cached"""
+        entry: Optional[Tuple[cq.Solid, int]] = self._solids.get(key)
+        if entry is not None:
+            self._solids.move_to_end(key)
+            self.hits += 1
+            return entry[0].copy()
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            solid: cq.Solid = cast(cq.Solid, cq.Shape.importBrep(self._path(key)))
+            self._add(key, solid, os.path.getsize(self._path(key)))
+            self.disk_hits += 1
+            return solid.copy()
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, solid: cq.Solid) -> None:
+        """Add a copy of solid to the cache"""
+        buf: BytesIO = BytesIO()
+        solid.exportBrep(buf)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp: str = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(buf.getbuffer())
+            os.replace(tmp, self._path(key))
+        self._add(key, solid.copy(), buf.tell())
+
+
+# The ThreadCache used by _threads, None disables caching
+_thread_cache: Optional[ThreadCache] = None
+
+
+def set_thread_cache(cache: Optional[ThreadCache]) -> Optional[ThreadCache]:
+    """
+    Set the ThreadCache used by int_threads and ext_threads.
+
+    :param cache: The cache or None to disable caching
+    :returns: The previous cache
+    """
+    global _thread_cache
+    prev: Optional[ThreadCache] = _thread_cache
+    _thread_cache = cache
+    return prev
+
+
+def _threads(
+    external_threads: bool, ths: ThreadHelixes, opts: ThreadOptions = ThreadOptions()
+) -> cq.Solid:
+    """
+    Return the Solid created by _make_threads, using the
+    ThreadCache set by set_thread_cache if there is one.
+    """
+    if _thread_cache is None:
+        return _make_threads(external_threads, ths, opts)
+
+    key: str = ThreadCache.key(external_threads, ths, opts)
+    s: Stage
+    with stage("threads.cache") as s:
+        rv: Optional[cq.Solid] = _thread_cache.get(key)
+        s.count(hits=0 if rv is None else 1)
+    if rv is None:
+        rv = _make_threads(external_threads, ths, opts)
+        _thread_cache.put(key, rv)
+    return rv
+
+
+def _helix_wires(
+    helix_funcs: List[Callable[[float], Tuple[float, float, float]]],
+    start: float,
+    stop: float,
+    samples: int = ThreadOptions.samples,
+) -> List[cq.Wire]:
+    """
+    Create a wire for each helix function from t == start to t == stop
+    by fitting a curve to samples points
+    """
+    s: Stage
+    with stage("threads.wires") as s:
+        wires: List[cq.Wire] = [
+            cast(
+                cq.Wire,
+                cq.Workplane("XY")
+                .parametricCurve(hf, N=samples, start=start, stop=stop)
+                .val(),
+            )
+            for hf in helix_funcs
+        ]
+        if s.enabled:
+            s.count(wires=len(wires), edges=sum(len(w.Edges()) for w in wires))
+
+    lenWires = len(wires)
+    assert (lenWires == 3) or (lenWires == 4)
+    # dbg(f"threads: wires.len={len(wires)}")
+
+    return wires
+
+
+def _ruled_faces(wires: List[cq.Wire]) -> List[cq.Face]:
+    """
+    Create the faces of the thread between each pair of adjacent wires
+    """
+    s: Stage
+    with stage("threads.faces") as s:
+        # faces: cq.Faces = []
+        faces: List[cq.Face] = []
+        faces.append(cq.Face.makeRuledSurface(wires[0], wires[1]))
+        faces.append(cq.Face.makeRuledSurface(wires[1], wires[2]))
+        if len(wires) == 4:
+            faces.append(cq.Face.makeRuledSurface(wires[2], wires[3]))
+        faces.append(cq.Face.makeRuledSurface(wires[-1], wires[0]))
+        s.count(faces=len(faces))
+    return faces
+
+
+def _native_helix_wires(
+    ht: HelicalThread, helixes: List[HelixLocation], start: float, stop: float
+) -> List[cq.Wire]:
+    """
+    Create a wire for each helix from t == start to t == stop, which
+    must be within the untapered section, as a line on the cylinder of
+    the helix's radius, as cq.Wire.makeHelix does. The cylinder's u == 0
+    is the y axis so the points are the same as those of Helix.helix.
+    """
+    s: Stage
+    with stage("threads.wires") as s:
+        helix_height: float = ht.height - (2 * ht.inset_offset)
+        t_range: float = ht.last_t - ht.first_t
+        # The angle and z of a point on an untapered helix are linear in t
+        angle_per_t: float = 2 * pi * helix_height / (ht.pitch * t_range)
+        z_per_t: float = helix_height / t_range
+
+        wires: List[cq.Wire] = []
+        for hl in helixes:
+            radius: float = hl.radius if hl.radius is not None else ht.radius
+            surface = Geom_CylindricalSurface(
+                gp_Ax3(gp_Pnt(0, 0, 0), gp_Dir(0, 0, 1), gp_Dir(0, 1, 0)),
+                radius + hl.horz_offset,
+            )
+            z: float = hl.vert_offset + ht.inset_offset
+            segment = GCE2d_MakeSegment(
+                gp_Pnt2d(
+                    angle_per_t * (start - ht.first_t),
+                    z + (z_per_t * (start - ht.first_t)),
+                ),
+                gp_Pnt2d(
+                    angle_per_t * (stop - ht.first_t),
+                    z + (z_per_t * (stop - ht.first_t)),
+                ),
+            ).Value()
+            edge = BRepBuilderAPI_MakeEdge(segment, surface).Edge()
+            # The same as cq.Wire.makeHelix
+            BRepLib.BuildCurves3d_s(edge, 1e-6, MaxSegment=2000)
+            wires.append(cq.Wire.assembleEdges([cq.Edge(edge)]))
+        s.count(wires=len(wires), edges=len(wires))
+    return wires
+
+
+def _sectioned_faces(
+    ths: ThreadHelixes,
+    helixes: List[HelixLocation],
+    helix_funcs: List[Callable[[float], Tuple[float, float, float]]],
+    opts: ThreadOptions,
+    start: Optional[float] = None,
+    stop: Optional[float] = None,
+) -> List[cq.Face]:
+    """
+    Create the faces of the thread from the tapered start, the untapered
+    section and the tapered end, each is constructed separately.
+
+    If opts.replicate the untapered section is one full turn, the other
+    full turns are identical except for being pitch higher so the one
+    turn is translated to create them, and the remaining partial turn.
+    So the number of curves fitted doesn't depend on the height.
+
+    If opts.native_helix the helixes of the untapered section are
+    created by _native_helix_wires rather than fitted.
+
+    :param start: If not None only the faces from t == start are created
+    :param stop: If not None only the faces to t == stop are created
+    """
+    ht = ths.ht
+    t_range: float = ht.last_t - ht.first_t
+    helix_height: float = ht.height - (2 * ht.inset_offset)
+    first_t: float = ht.first_t if start is None else start
+    last_t: float = ht.last_t if stop is None else stop
+    taper_out_ends: float = max(
+        first_t, min(last_t, ht.first_t + (t_range * ht.taper_out_rpos))
+    )
+    taper_in_starts: float = max(
+        taper_out_ends, min(last_t, ht.last_t - (t_range * (1 - ht.taper_in_rpos)))
+    )
+    native: bool = opts.native_helix and (ht.pitch != 0) and (helix_height != 0)
+
+    def untapered_wires(start: float, stop: float) -> List[cq.Wire]:
+        if native:
+            return _native_helix_wires(ht, helixes, start, stop)
+        return _helix_wires(helix_funcs, start, stop, opts.samples)
+
+    faces: List[cq.Face] = []
+    if taper_out_ends > first_t:
+        faces.extend(
+            _ruled_faces(
+                _helix_wires(helix_funcs, first_t, taper_out_ends, opts.samples)
+            )
+        )
+
+    turns: int = 0
+    turns_end: float = taper_out_ends
+    if opts.replicate:
+        # The change of t for one turn of the helix
+        t_turn: float = (t_range * ht.pitch / helix_height) if helix_height != 0 else 0
+        turns = int((taper_in_starts - taper_out_ends) / t_turn) if t_turn > 0 else 0
+        turns_end = taper_out_ends + (turns * t_turn)
+        # dbg(f"_sectioned_faces: t_turn={t_turn} turns={turns}")
+
+    if turns > 0:
+        turn_faces: List[cq.Face] = _ruled_faces(
+            untapered_wires(taper_out_ends, taper_out_ends + t_turn)
+        )
+        faces.extend(turn_faces)
+        for i in range(1, turns):
+            offset: cq.Vector = cq.Vector(0, 0, i * ht.pitch)
+            faces.extend([cast(cq.Face, f.translate(offset)) for f in turn_faces])
+
+    # Avoid a sliver when the untapered section is a whole number of turns
+    if not isclose(turns_end, taper_in_starts, abs_tol=t_range * 1e-9):
+        faces.extend(_ruled_faces(untapered_wires(turns_end, taper_in_starts)))
+
+    if last_t > taper_in_starts:
+        faces.extend(
+            _ruled_faces(
+                _helix_wires(helix_funcs, taper_in_starts, last_t, opts.samples)
+            )
+        )
+
+    return faces
+
+
+def _end_cap(
+    helix_funcs: List[Callable[[float], Tuple[float, float, float]]], t: float
+) -> cq.Face:
+    """
+    Create the planar face which closes the end of the thread at t,
+    the polygon of the points of the helixes at t
+    """
+    locs: List[cq.Vector] = [cq.Vector(hf(t)) for hf in helix_funcs]
+    edges: List[cq.Edge] = [
+        cq.Edge.makeLine(locs[i], locs[(i + 1) if (i < len(locs) - 1) else 0])
+        for i in range(0, len(locs))
+    ]
+    return cq.Face.makeFromWires(cq.Wire.assembleEdges(edges))
+
+
+def _make_solid(faces: List[cq.Face]) -> cq.Solid:
+    """Create the Solid enclosed by faces"""
+    s: Stage
+    # Create the shell
+    with stage("threads.shell") as s:
+        sh: cq.Shell = cq.Shell.makeShell(faces)
+        s.count(faces=len(faces))
+
+    # Create the solid
+    with stage("threads.solid") as s:
+        rv: cq.Solid = cq.Solid.makeSolid(sh)
+        if s.enabled:
+            s.count(faces=len(rv.Faces()), edges=len(rv.Edges()))
+    return rv
+
+
+def _make_threads(
+    external_threads: bool, ths: ThreadHelixes, opts: ThreadOptions = ThreadOptions()
+) -> cq.Solid:
     """
     Create a thread helix which may be triangular or trapizodal.
 
     You can control the size and spacing of the threads using
     the various parameters when construction ThreadHelixes.
 
+    :param opts: How the threads are constructed
     :returns: Solid representing the threads
     """
 
     # dbg(f"_threads: external_threads={external_threads} ht={vars(ht)}")
 
-    helixes: List[HelixLocation] = ths.int_helixes if (
-        not external_threads
-    ) else ths.ext_helixes
+    helixes: List[HelixLocation] = (
+        ths.int_helixes if (not external_threads) else ths.ext_helixes
+    )
 
     # Create the helix functions
     helix_funcs: List[Callable[[float], Tuple[float, float, float]]] = [
         ths.ht.helix(hl) for hl in helixes
     ]
 
-    # Create the wires
-    wires: List[cq.Wire] = [
-        (cast(cq.Wire, cq.Workplane("XY").parametricCurve(helix_funcs[i]).val(),))
-        for i, hl in enumerate(helixes)
-    ]
+    faces: List[cq.Face]
+    if opts.replicate or opts.native_helix:
+        faces = _sectioned_faces(ths, helixes, helix_funcs, opts)
+    else:
+        # Create the wires
+        wires: List[cq.Wire] = _helix_wires(
+            helix_funcs, ths.ht.first_t, ths.ht.last_t, opts.samples
+        )
 
-    lenWires = len(wires)
-    assert (lenWires == 3) or (lenWires == 4)
-    # dbg(f"threads: wires.len={len(wires)}")
-
-    # Create the faces of the thread
-    # faces: cq.Faces = []
-    faces: List[cq.Face] = []
-    faces.append(cq.Face.makeRuledSurface(wires[0], wires[1]))
-    faces.append(cq.Face.makeRuledSurface(wires[1], wires[2]))
-    if lenWires == 4:
-        faces.append(cq.Face.makeRuledSurface(wires[2], wires[3]))
-    faces.append(cq.Face.makeRuledSurface(wires[-1], wires[0]))
+        # Create the faces of the thread
+        faces = _ruled_faces(wires)
 
     # Add end caps if either taper_{in|out}_rpos is 0
-    out_face_locs: List[cq.Vector] = []
-    out_face_edges: List[cq.Edge] = []
-    out_face_wire: cq.Wire
-    out_face: cq.Face
     if ths.ht.taper_out_rpos == 0:
-        out_face_locs = [cq.Vector(hf(ths.ht.first_t)) for hf in helix_funcs]
-        # print(f"out_face_locs={out_face_locs}")
-        out_face_edges = [
-            cq.Edge.makeLine(
-                out_face_locs[i],
-                out_face_locs[(i + 1) if (i < len(out_face_locs) - 1) else 0],
-            )
-            for i in range(0, len(out_face_locs))
-        ]
-        # print(f"out_face_edges={out_face_edges}")
-        out_face_wire = cq.Wire.assembleEdges(out_face_edges)
-        # print(f"out_face_wire={out_face_wire}")
-        out_face = cq.Face.makeFromWires(out_face_wire)
-        # print(f"out_face={out_face}")
-        faces.insert(0, out_face)
-
-    in_face_locs: List[cq.Vector] = []
-    in_face_edges: List[cq.Edge] = []
-    in_face_wire: cq.Wire
-    in_face: cq.Face
+        faces.insert(0, _end_cap(helix_funcs, ths.ht.first_t))
     if ths.ht.taper_in_rpos == 1:
-        in_face_locs = [cq.Vector(hf(ths.ht.last_t)) for hf in helix_funcs]
-        # print(f"in_face_locs={in_face_locs}")
-        in_face_edges = [
-            cq.Edge.makeLine(
-                in_face_locs[i],
-                in_face_locs[(i + 1) if (i < len(in_face_locs) - 1) else 0],
-            )
-            for i in range(0, len(in_face_locs))
-        ]
-        # print(f"in_face_edges={in_face_edges}")
-        in_face_wire = cq.Wire.assembleEdges(in_face_edges)
-        # print(f"in_face_wire={in_face_wire}")
-        in_face = cq.Face.makeFromWires(in_face_wire)
-        # print(f"in_face={in_face}")
-        faces.insert(0, in_face)
+        faces.insert(0, _end_cap(helix_funcs, ths.ht.last_t))
 
-    # print(f"faces={faces}")
+    return _make_solid(faces)
 
-    # Create the shell
-    sh: cq.Shell = cq.Shell.makeShell(faces)
 
-    # Create the solid
-    rv: cq.Solid = cq.Solid.makeSolid(sh)
-
-    # show(rv, "rv")
+def thread_chunk(
+    external_threads: bool,
+    ths: ThreadHelixes,
+    start: float,
+    stop: float,
+    opts: ThreadOptions = ThreadOptions(),
+) -> cq.Solid:
+    """
+    Create the part of the threads from t == start to t == stop, the
+    ends are closed by end caps unless they're the tapered ends. Used
+    by cq_chunks to build long parts in chunks.
 
-    # print("done")
-    # print("")
-    return rv
+    :param external_threads: True for external threads
+    :param ths: ThreadHelixes
+    :param start: The start of the chunk, >= ths.ht.first_t
+    :param stop: The end of the chunk, <= ths.ht.last_t
+    :param opts: How the threads are constructed, they're always sectioned
+    :returns: Solid representing the chunk of the threads
+    """
+    ht: HelicalThread = ths.ht
+    helixes: List[HelixLocation] = (
+        ths.int_helixes if (not external_threads) else ths.ext_helixes
+    )
+    helix_funcs: List[Callable[[float], Tuple[float, float, float]]] = [
+        ht.helix(hl) for hl in helixes
+    ]
+    faces: List[cq.Face] = _sectioned_faces(
+        ths, helixes, helix_funcs, opts, start, stop
+    )
+    if (start > ht.first_t) or (ht.taper_out_rpos == 0):
+        faces.insert(0, _end_cap(helix_funcs, start))
+    if (stop < ht.last_t) or (ht.taper_in_rpos == 1):
+        faces.insert(0, _end_cap(helix_funcs, stop))
+    return _make_solid(faces)
 
 
-def int_threads(ths: ThreadHelixes) -> cq.Solid:
+def int_threads(ths: ThreadHelixes, opts: ThreadOptions = ThreadOptions()) -> cq.Solid:
     """
     Create internal threads which may be triangular or trapizodal.
 
@@ -115,12 +468,13 @@ def int_threads(ths: ThreadHelixes) -> cq.Solid:
     the various parameters when construction ThreadHelixes.
 
     :param ht: ThreadHelixes
+    :param opts: How the threads are constructed
     :returns: Solid representing the threads
     """
-    return _threads(False, ths)
+    return _threads(False, ths, opts)
 
 
-def ext_threads(ths: ThreadHelixes) -> cq.Solid:
+def ext_threads(ths: ThreadHelixes, opts: ThreadOptions = ThreadOptions()) -> cq.Solid:
     """
     Create external threads which may be triangular or trapizodal.
 
@@ -128,6 +482,7 @@ def ext_threads(ths: ThreadHelixes) -> cq.Solid:
     the various parameters when construction ThreadHelixes.
 
     :param ht: ThreadHelixes
+    :param opts: How the threads are constructed
     :returns: Solid representing the threads
     """
-    return _threads(True, ths)
+    return _threads(True, ths, opts)
@@ -0,0 +1,236 @@
+from dataclasses import dataclass
+from math import cos, pi
+from typing import List, Sequence, Tuple
+
+from helical_thread import ThreadHelixes, helical_thread
+from taperable_helix import HelixLocation
+
+from cq_params import PartParams
+from thread_clearance import verify_thread_clearances
+from utils import Y, lineToPtDirection_2d
+
+# Parameters are checked before anything is built so a bad combination
+# fails in microseconds rather than after OCC has spent seconds building
+# wires and then makeSolid or union fails.
+
+
+@dataclass
+class ParamProblem:
+    """A problem with the parameters of a part"""
+
+    field: str
+    """The field of PartParams which is the problem"""
+
+    message: str
+    """What's wrong"""
+
+    error: bool = True
+    """True if the part can't be built, False if it's only a warning"""
+
+    def __str__(self) -> str:
+        return f"{'error' if self.error else 'warning'}: {self.field}: {self.message}"
+
+
+def _profile(helixes: Sequence[HelixLocation]) -> List[Tuple[float, float]]:
+    """Return the (x, z) points of the profile of a thread"""
+    return [(hl.radius + hl.horz_offset, hl.vert_offset) for hl in helixes]
+
+
+def _collapsed(pts: Sequence[Tuple[float, float]], tip_sign: float) -> bool:
+    """
+    Return True if the closed profile isn't a convex polygon whose first
+    edge, the base on the helix radius, goes up and whose tip is on the
+    side of the base given by tip_sign, 1 is toward the axis (internal
+    threads) and -1 away from it (external threads).
+    """
+    if pts[1][Y] <= pts[0][Y]:
+        return True
+    return not all(
+        tip_sign
+        * lineToPtDirection_2d(pts[i], pts[(i + 1) % len(pts)], pts[(i + 2) % len(pts)])
+        > 0
+        for i in range(len(pts))
+    )
+
+
+def _check_values(params: PartParams) -> List[ParamProblem]:
+    """Return the errors in the ranges of the values of params"""
+    problems: List[ParamProblem] = []
+    for name in (
+        "pitch",
+        "dia_major",
+        "head_size",
+        "head_height",
+        "stl_tolerance",
+        "angular_tolerance",
+    ):
+        if getattr(params, name) <= 0:
+            problems.append(ParamProblem(name, f"{getattr(params, name)} must be > 0"))
+    for name in (
+        "inset",
+        "major_cutoff",
+        "minor_cutoff",
+        "ext_clearance",
+        "core_tolerance",
+        "core_angular_tolerance",
+        "max_triangles",
+        "jobs",
+    ):
+        if getattr(params, name) < 0:
+            problems.append(ParamProblem(name, f"{getattr(params, name)} must be >= 0"))
+    if params.thread_overlap < 0:
+        problems.append(
+            ParamProblem(
+                "thread_overlap",
+                f"{params.thread_overlap} must be >= 0 or the threads don't touch the core",
+            )
+        )
+    if not (0 < params.angle_degs < 180):
+        problems.append(
+            ParamProblem("angle_degs", f"{params.angle_degs} must be > 0 and < 180")
+        )
+    if params.height - (2 * params.inset) <= 0:
+        problems.append(
+            ParamProblem(
+                "height", f"{params.height} must be > 2 * inset, {2 * params.inset}"
+            )
+        )
+    if not (0 <= params.taper_out_rpos < params.taper_in_rpos <= 1):
+        problems.append(
+            ParamProblem(
+                "taper_in_rpos",
+                f"0 <= taper_out_rpos, {params.taper_out_rpos}, < taper_in_rpos, {params.taper_in_rpos}, <= 1 is required",
+            )
+        )
+    turns: float = (
+        (params.height - (2 * params.inset)) / params.pitch if params.pitch > 0 else 1
+    )
+    if not (1 <= params.chunks <= max(turns, 1)):
+        problems.append(
+            ParamProblem(
+                "chunks",
+                f"{params.chunks} must be >= 1 and <= the number of turns, {turns:.6g}",
+            )
+        )
+    if params.major_cutoff + params.minor_cutoff >= params.pitch:
+        problems.append(
+            ParamProblem(
+                "major_cutoff",
+                f"major_cutoff + minor_cutoff, {params.major_cutoff + params.minor_cutoff}, must be < pitch, {params.pitch}",
+            )
+        )
+    return problems
+
+
+def _check_profiles(params: PartParams, ths: ThreadHelixes) -> List[ParamProblem]:
+    """Return the errors in the thread profiles of ths"""
+    problems: List[ParamProblem] = []
+    if _collapsed(_profile(ths.int_helixes), 1):
+        problems.append(
+            ParamProblem(
+                "ext_clearance", "the profile of the internal threads collapses"
+            )
+        )
+    if _collapsed(_profile(ths.ext_helixes), -1):
+        problems.append(
+            ParamProblem(
+                "ext_clearance", "the profile of the external threads collapses"
+            )
+        )
+    if ths.ext_helix_radius - params.thread_overlap <= 0:
+        problems.append(
+            ParamProblem(
+                "ext_clearance",
+                f"the core of the bolt has no radius, {ths.ext_helix_radius:.6g}",
+            )
+        )
+    if problems:
+        # The clearances of collapsed profiles aren't meaningful
+        return problems
+
+    return [
+        ParamProblem(
+            "ext_clearance", f"{v.metric} is {v.value:.6g} expected {v.expected:.6g}"
+        )
+        for v in verify_thread_clearances(ths)
+    ]
+
+
+def _check_part(params: PartParams, ths: ThreadHelixes) -> List[ParamProblem]:
+    """Return the errors and warnings of the head and core of the part"""
+    problems: List[ParamProblem] = []
+    # The inscribed radius of the hexagonal head
+    head_radius: float = (params.head_size / 2) * cos(pi / 6)
+    if params.part == "bolt":
+        core_radius: float = ths.ext_helix_radius
+        if not (0 < params.wall_thickness < core_radius):
+            problems.append(
+                ParamProblem(
+                    "wall_thickness",
+                    f"{params.wall_thickness} must be > 0 and < the radius of the core, {core_radius:.6g}",
+                )
+            )
+        # A head_size <= 0 is an error of _check_values
+        if 0 < head_radius <= params.dia_major / 2:
+            problems.append(
+                ParamProblem(
+                    "head_size",
+                    f"{params.head_size} the head is smaller than the threads",
+                    error=False,
+                )
+            )
+    elif 0 < head_radius <= ths.int_helix_radius + params.thread_overlap:
+        problems.append(
+            ParamProblem(
+                "head_size",
+                f"{params.head_size} the head must be larger than the threads, {2 * (ths.int_helix_radius + params.thread_overlap) / cos(pi / 6):.6g}",
+            )
+        )
+
+    separate: bool = (not params.union) or (params.engine == "mesh")
+    if separate and (params.core_tolerance > params.thread_overlap):
+        problems.append(
+            ParamProblem(
+                "core_tolerance",
+                f"{params.core_tolerance} is larger than thread_overlap, {params.thread_overlap}, there may be gaps between the core and threads",
+                error=False,
+            )
+        )
+    return problems
+
+
+def validate_params(params: PartParams) -> List[ParamProblem]:
+    """
+    Return the problems with params, empty if there are none. The thread
+    profiles are those computed by helical_thread and only pure Python
+    is used so it takes microseconds.
+
+    :param params: The parameters of the part
+    :returns: The errors and warnings
+    """
+    problems: List[ParamProblem] = _check_values(params)
+    if problems:
+        # The profiles can't be computed
+        return problems
+
+    ths: ThreadHelixes = helical_thread(params.helical_thread())
+    problems = _check_profiles(params, ths)
+    if problems:
+        return problems
+    return _check_part(params, ths)
+
+
+def check_params(params: PartParams) -> List[ParamProblem]:
+    """
+    Check params before the part is built
+
+    :raises ValueError: If params has errors, the message lists them
+    :returns: The warnings
+    """
+    problems: List[ParamProblem] = validate_params(params)
+    errors: List[str] = [str(p) for p in problems if p.error]
+    if errors:
+        raise ValueError(
+            f"invalid parameters for {params.fname()}\n" + "\n".join(errors)
+        )
+    return problems
@@ -0,0 +1,148 @@
+import argparse
+import os
+import resource
+import signal
+import time
+import traceback
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple, cast
+
+from cq_args import DFLT_max_memory_mb, DFLT_timeout
+from cq_params import PartParams
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+# Some parameters make OCC's ruled surfaces, shells or booleans run for
+# minutes or never finish and they can't be interrupted, so a watched
+# job runs in a process forked for it which is killed if it takes too
+# long. cadquery isn't imported by this module, the process is forked
+# from one which has already imported it so it starts in milliseconds.
+
+
+def _coarse(params: PartParams) -> PartParams:
+    """
+    10 times the stl tolerance and the threads are constructed from exact
+    helixes and one replicated turn rather than curves fitted to points
+    """
+    return replace(
+        params,
+        stl_tolerance=params.stl_tolerance * 10,
+        angular_tolerance=params.angular_tolerance * 2,
+        native_helix=True,
+        replicate=True,
+    )
+
+
+def _no_union(params: PartParams) -> PartParams:
+    """Coarse and the head, core and threads aren't combined with union"""
+    return replace(_coarse(params), union=False)
+
+
+# The parameters a failed job is retried with, in order, each is
+# coarser and quicker to build than the previous one
+FALLBACKS: Dict[str, Callable[[PartParams], PartParams]] = {
+    "coarse": _coarse,
+    "no_union": _no_union,
+}
+
+
+@dataclass(frozen=True)
+class Limits:
+    """The limits of a watched job"""
+
+    timeout: float = DFLT_timeout
+    """Seconds each attempt may take, 0 is no limit"""
+
+    max_memory_mb: float = DFLT_max_memory_mb
+    """
+    MB each attempt may allocate beyond the memory of the process it's
+    forked from, 0 is no limit
+    """
+
+    retry: bool = True
+    """If True a job that fails is retried with each of FALLBACKS"""
+
+
+def _limit_memory(max_memory_mb: float) -> None:
+    """Limit the address space of this process to its size plus max_memory_mb"""
+    try:
+        with open("/proc/self/statm") as f:
+            size: int = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Not linux, the limit isn't enforced
+        return
+    limit: int = size + int(max_memory_mb * 1024 * 1024)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _child(
+    conn: "Connection", fn: Callable[..., Any], args: Tuple[Any, ...], limits: Limits
+) -> None:
+    """Send the result of fn(*args), or the traceback of its exception, to conn"""
+    # Its own process group so any processes it starts are also killed
+    os.setpgid(0, 0)
+    try:
+        if limits.max_memory_mb > 0:
+            _limit_memory(limits.max_memory_mb)
+        conn.send((True, fn(*args)))
+    except BaseException:
+        conn.send((False, traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def run_limited(
+    fn: Callable[..., Any], args: Tuple[Any, ...], limits: Limits
+) -> Tuple[Any, Optional[str]]:
+    """
+    Call fn(*args) in a forked process within limits.
+
+    :param fn: The function, its result must be picklable
+    :param args: The arguments of fn
+    :param limits: If the process takes longer than limits.timeout
+                   it's killed, its memory is limited to
+                   limits.max_memory_mb and limits.retry is ignored
+    :returns: (result, None) if fn returned result or (None, error) if it
+              raised an exception, which error is the traceback of, was
+              killed or exited
+    """
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("fork")
+    recv_conn, send_conn = ctx.Pipe(duplex=False)
+    # Not a daemon so fn may start processes, i.e. PartParams.chunks
+    p = ctx.Process(target=_child, args=(send_conn, fn, args, limits))
+    start: float = time.perf_counter()
+    p.start()
+    pid: int = cast(int, p.pid)
+    try:
+        # Also set here so it's set before it could be killed
+        os.setpgid(pid, pid)
+    except OSError:
+        # The child already set it
+        pass
+    send_conn.close()
+    try:
+        if not recv_conn.poll(limits.timeout if limits.timeout > 0 else None):
+            os.killpg(pid, signal.SIGKILL)
+            return None, f"timed out after {time.perf_counter() - start:.1f}s"
+        try:
+            ok, value = recv_conn.recv()
+        except EOFError:
+            p.join()
+            return None, f"exited with code {p.exitcode}"
+        return (value, None) if ok else (None, value)
+    finally:
+        recv_conn.close()
+        p.join()
+
+
+def limits_from_args(args: argparse.Namespace) -> Optional[Limits]:
+    """
+    Return the Limits defined by add_watchdog_arguments, None if there
+    are no limits so jobs aren't watched.
+    """
+    if (args.timeout <= 0) and (args.max_memory_mb <= 0):
+        return None
+    return Limits(args.timeout, args.max_memory_mb, not args.no_retry)
@@ -0,0 +1,262 @@
+import gzip
+import mmap
+import os
+from dataclasses import dataclass
+from typing import IO, Optional, Sequence, cast
+
+import numpy as np
+
+from cq_params import STL_FORMATS
+
+# Number of facets formatted at a time when writing ascii stl files
+_ASCII_CHUNK: int = 65536
+
+_ASCII_FACET: str = (
+    " facet normal %e %e %e\n"
+    "  outer loop\n"
+    "   vertex %e %e %e\n"
+    "   vertex %e %e %e\n"
+    "   vertex %e %e %e\n"
+    "  endloop\n"
+    " endfacet\n"
+)
+
+# The record of a binary stl facet
+_BINARY_FACET = np.dtype(
+    [("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attr", "<u2")]
+)
+
+
+@dataclass(repr=False)
+class Mesh:
+    """
+    A triangle mesh, faces are indices into vertices and are
+    ordered counter clockwise when viewed from outside.
+    """
+
+    vertices: np.ndarray
+    """(V, 3) float array of the vertices"""
+
+    faces: np.ndarray
+    """(F, 3) int array of the vertex indices of each triangle"""
+
+    deviation: float = 0
+    """Maximum deviation from the surfaces the mesh approximates, 0 if unknown"""
+
+    def __repr__(self) -> str:
+        return f"Mesh(vertices={len(self.vertices)}, faces={len(self.faces)})"
+
+    def triangles(self) -> np.ndarray:
+        """Return the (F, 3, 3) array of the vertices of each face"""
+        return self.vertices[self.faces]
+
+    def translate(self, offset: Sequence[float]) -> "Mesh":
+        """Return a copy of the mesh moved by offset"""
+        return Mesh(self.vertices + np.asarray(offset, dtype=float), self.faces)
+
+
+def concatenate(meshes: Sequence[Mesh]) -> Mesh:
+    """
+    Return a Mesh containing all of meshes, the vertices are not
+    merged so each mesh remains a separate shell.
+    """
+    offsets: np.ndarray = np.cumsum([0] + [len(m.vertices) for m in meshes])
+    return Mesh(
+        np.concatenate([m.vertices for m in meshes]).reshape(-1, 3),
+        np.concatenate([m.faces + o for m, o in zip(meshes, offsets)]).reshape(-1, 3),
+    )
+
+
+def merge_vertices(mesh: Mesh, decimals: Optional[int] = None) -> Mesh:
+    """
+    Merge identical vertices and remove the faces which become
+    degenerate, i.e. two of their vertices are the same.
+
+    :param decimals: If not None vertices are identical if they're
+                     the same when rounded to decimals places
+    """
+    keys: np.ndarray = (
+        mesh.vertices if decimals is None else np.round(mesh.vertices, decimals)
+    )
+    # Adding 0.0 converts -0.0 to 0.0 so they're identical
+    _, first, inverse = np.unique(
+        keys + 0.0, axis=0, return_index=True, return_inverse=True
+    )
+    faces: np.ndarray = inverse.reshape(-1)[mesh.faces]
+    valid: np.ndarray = (
+        (faces[:, 0] != faces[:, 1])
+        & (faces[:, 1] != faces[:, 2])
+        & (faces[:, 2] != faces[:, 0])
+    )
+    return Mesh(mesh.vertices[first], faces[valid])
+
+
+def is_closed(mesh: Mesh) -> bool:
+    """
+    Return True if mesh is closed and consistently oriented, i.e. every
+    edge is used once in each direction by the faces.
+    """
+    n: int = len(mesh.vertices)
+    a: np.ndarray = mesh.faces.ravel().astype(np.int64)
+    b: np.ndarray = np.roll(mesh.faces, -1, axis=1).ravel().astype(np.int64)
+    edges: np.ndarray = (a * n) + b
+    reversed_edges: np.ndarray = (b * n) + a
+    return bool(
+        (len(np.unique(edges)) == len(edges)) and np.isin(reversed_edges, edges).all()
+    )
+
+
+def normals(mesh: Mesh) -> np.ndarray:
+    """Return the (F, 3) array of unit normals, degenerate faces are 0"""
+    tris: np.ndarray = mesh.triangles()
+    n: np.ndarray = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    lengths: np.ndarray = np.linalg.norm(n, axis=1, keepdims=True)
+    return np.divide(n, lengths, out=np.zeros_like(n), where=lengths > 0)
+
+
+def volume(mesh: Mesh) -> float:
+    """
+    Return the signed volume of a closed mesh, it's negative if
+    the faces are ordered clockwise when viewed from outside.
+    """
+    tris: np.ndarray = mesh.triangles()
+    return float(
+        np.einsum("ij,ij->i", tris[:, 0], np.cross(tris[:, 1], tris[:, 2])).sum() / 6
+    )
+
+
+def area(mesh: Mesh) -> float:
+    """Return the surface area of mesh"""
+    tris: np.ndarray = mesh.triangles()
+    n: np.ndarray = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    return float(np.linalg.norm(n, axis=1).sum() / 2)
+
+
+def orient_outward(mesh: Mesh) -> Mesh:
+    """Return the closed mesh with its faces reversed if its volume is negative"""
+    if volume(mesh) < 0:
+        return Mesh(mesh.vertices, mesh.faces[:, ::-1])
+    return mesh
+
+
+def _write_ascii(f: IO[bytes], mesh: Mesh, name: str) -> None:
+    f.write(f"solid {name}\n".encode("ascii"))
+    for start in range(0, len(mesh.faces), _ASCII_CHUNK):
+        chunk: Mesh = Mesh(mesh.vertices, mesh.faces[start : start + _ASCII_CHUNK])
+        values: np.ndarray = np.concatenate(
+            [normals(chunk), chunk.triangles().reshape(-1, 9)], axis=1
+        )
+        f.write(((_ASCII_FACET * len(values)) % tuple(values.ravel())).encode("ascii"))
+    f.write(f"endsolid {name}\n".encode("ascii"))
+
+
+def _write_binary(f: IO[bytes], mesh: Mesh, name: str) -> None:
+    facets: np.ndarray = np.zeros(len(mesh.faces), dtype=_BINARY_FACET)
+    facets["normal"] = normals(mesh)
+    facets["vertices"] = mesh.triangles()
+    f.write(name.encode("ascii")[:80].ljust(80, b" "))
+    f.write(np.uint32(len(facets)).tobytes())
+    f.write(facets.tobytes())
+
+
+def write_stl(
+    mesh: Mesh,
+    path: str,
+    stl_format: str = "ascii",
+    compress: bool = False,
+    name: str = "mesh",
+) -> int:
+    """
+    Write mesh as an ascii or binary stl file.
+
+    :param mesh: The Mesh to write
+    :param path: The file to create
+    :param stl_format: "ascii" or "binary"
+    :param compress: If True path is a gzip compressed file
+    :param name: The name of the solid in the file
+    :returns: The size of the file
+    """
+    if stl_format not in STL_FORMATS:
+        raise ValueError(f"stl_format:{stl_format} should be one of {STL_FORMATS}")
+
+    tmp: str = f"{path}.{os.getpid()}.tmp"
+    f: IO[bytes]
+    with cast(IO[bytes], gzip.open(tmp, "wb") if compress else open(tmp, "wb")) as f:
+        if stl_format == "ascii":
+            _write_ascii(f, mesh, name)
+        else:
+            _write_binary(f, mesh, name)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def _read_ascii(data: bytes) -> np.ndarray:
+    """Return the (F, 3, 3) vertices of the facets of an ascii stl file"""
+    text: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+    # The start of each "vertex" keyword, there is no loop over the lines
+    starts: np.ndarray = np.flatnonzero(text[: len(text) - 6] == ord("v"))
+    for i, c in enumerate(b"ertex", 1):
+        starts = starts[text[starts + i] == c]
+    # The end of the line of each vertex
+    newlines: np.ndarray = np.append(np.flatnonzero(text == ord("\n")), len(text))
+    ends: np.ndarray = newlines[np.searchsorted(newlines, starts)]
+    # Only the coordinates after each vertex keyword are kept
+    marks: np.ndarray = np.zeros(len(text) + 1, dtype=np.int64)
+    marks[starts + 6] = 1
+    marks[ends] = -1
+    keep: np.ndarray = np.cumsum(marks[:-1]) > 0
+    numbers: bytes = np.where(keep, text, ord(" ")).astype(np.uint8).tobytes()
+    coords: np.ndarray = np.fromstring(numbers, sep=" ")
+    if (len(starts) % 3 != 0) or (len(coords) != 3 * len(starts)):
+        raise ValueError(
+            f"{len(starts)} vertices with {len(coords)} coordinates isn't a list of facets"
+        )
+    return coords.reshape(-1, 3, 3)
+
+
+def _binary_count(data: bytes) -> Optional[int]:
+    """Return the number of facets if data is a binary stl file otherwise None"""
+    if len(data) < 84:
+        return None
+    count: int = int(np.frombuffer(data, dtype="<u4", count=1, offset=80)[0])
+    return count if len(data) == 84 + (count * _BINARY_FACET.itemsize) else None
+
+
+def read_stl(path: str) -> Mesh:
+    """
+    Read an ascii or binary stl file, or one compressed with gzip.
+
+    The file is memory mapped and the facets are converted to arrays
+    without parsing each line in python, a 70k triangle ascii file is
+    read in a fraction of a second and a binary file in milliseconds.
+    Every facet has its own 3 vertices, see merge_vertices.
+
+    :param path: The stl file, if it ends with .gz it's decompressed
+    :returns: Mesh of the facets
+    :raises ValueError: If it isn't an stl file
+    """
+    tris: np.ndarray
+    with open(path, "rb") as f:
+        if path.endswith(".gz"):
+            data: bytes = gzip.decompress(f.read())
+            tris = _read_triangles(data)
+        elif os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                tris = _read_triangles(cast(bytes, mm))
+    return Mesh(tris.reshape(-1, 3), np.arange(len(tris) * 3).reshape(-1, 3))
+
+
+def _read_triangles(data: bytes) -> np.ndarray:
+    """Return the (F, 3, 3) vertices of the facets of the stl file data"""
+    # A binary file may also start with "solid" so its size is checked first
+    count: Optional[int] = _binary_count(data)
+    if count is not None:
+        facets: np.ndarray = np.frombuffer(
+            data, dtype=_BINARY_FACET, count=count, offset=84
+        )
+        return facets["vertices"].astype(float)
+    if data[:5] != b"solid":
+        raise ValueError("not an ascii or binary stl file")
+    return _read_ascii(data)
@@ -0,0 +1,194 @@
+import os
+import zipfile
+from dataclasses import dataclass, field
+from typing import IO, Dict, List, Optional, Sequence
+from xml.etree import ElementTree
+
+import numpy as np
+
+from mesh import Mesh, concatenate, merge_vertices
+
+# 3MF files are zip archives containing an XML model. Unlike an stl file
+# each mesh is a resource, written once with each vertex once, and a
+# kit of parts is an object whose components reference the meshes with
+# a transform for each instance. So a bolt and several nuts contain the
+# triangles of one nut, and slicers load the shared mesh once.
+
+# Number of vertices or triangles formatted at a time
+_XML_CHUNK: int = 65536
+
+_VERTEX: str = '<vertex x="%.9g" y="%.9g" z="%.9g"/>\n'
+
+_TRIANGLE: str = '<triangle v1="%d" v2="%d" v3="%d"/>\n'
+
+_NAMESPACE: str = "http://schemas.microsoft.com/3dmanufacturing/core/2015/02"
+
+# The namespace of the tags of the model as found by ElementTree
+_NS: str = f"{{{_NAMESPACE}}}"
+
+_MODEL: str = "3D/3dmodel.model"
+
+_CONTENT_TYPES: str = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">\n'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>\n'
+    '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>\n'
+    "</Types>\n"
+)
+
+_RELS: str = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\n'
+    f'<Relationship Target="/{_MODEL}" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>\n'
+    "</Relationships>\n"
+)
+
+
+@dataclass
+class Component:
+    """A mesh and where each instance of it is in the kit"""
+
+    name: str
+    """The name of the object in the 3MF file"""
+
+    mesh: Mesh
+
+    transforms: List[np.ndarray] = field(default_factory=list)
+    """
+    The (3, 4) matrix, rotation and translation, of each instance,
+    see cq_layout.location_matrix
+    """
+
+
+def translation(x: float, y: float, z: float = 0) -> np.ndarray:
+    """Return the (3, 4) matrix of a translation by x, y and z"""
+    return np.hstack([np.eye(3), [[x], [y], [z]]])
+
+
+def _transform(matrix: np.ndarray) -> str:
+    """
+    Return the 3MF transform attribute of matrix, the rows of a 4 by 3
+    matrix which a row vector of the point is multiplied by
+    """
+    values: np.ndarray = np.concatenate([matrix[:, :3].T.ravel(), matrix[:, 3]])
+    return " ".join(f"{v:.9g}" for v in values)
+
+
+def _write_rows(f: IO[bytes], template: str, rows: np.ndarray) -> None:
+    """Write template formatted with each of rows"""
+    for start in range(0, len(rows), _XML_CHUNK):
+        chunk: np.ndarray = rows[start : start + _XML_CHUNK]
+        f.write(((template * len(chunk)) % tuple(chunk.ravel())).encode("ascii"))
+
+
+def _write_model(f: IO[bytes], components: Sequence[Component], name: str) -> None:
+    f.write(
+        (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<model unit="millimeter" xml:lang="en-US" xmlns="{_NAMESPACE}">\n'
+            "<resources>\n"
+        ).encode("ascii")
+    )
+    for i, c in enumerate(components, 1):
+        # Each vertex once rather than once per triangle
+        mesh: Mesh = merge_vertices(c.mesh)
+        f.write(f'<object id="{i}" type="model" name="{c.name}">\n'.encode("ascii"))
+        f.write(b"<mesh>\n<vertices>\n")
+        _write_rows(f, _VERTEX, mesh.vertices)
+        f.write(b"</vertices>\n<triangles>\n")
+        _write_rows(f, _TRIANGLE, mesh.faces)
+        f.write(b"</triangles>\n</mesh>\n</object>\n")
+
+    kit: int = len(components) + 1
+    f.write(f'<object id="{kit}" type="model" name="{name}">\n'.encode("ascii"))
+    f.write(b"<components>\n")
+    for i, c in enumerate(components, 1):
+        for matrix in c.transforms:
+            f.write(
+                f'<component objectid="{i}" transform="{_transform(matrix)}"/>\n'.encode(
+                    "ascii"
+                )
+            )
+    f.write(b"</components>\n</object>\n</resources>\n")
+    f.write(f'<build>\n<item objectid="{kit}"/>\n</build>\n</model>\n'.encode("ascii"))
+
+
+def write_3mf(path: str, components: Sequence[Component], name: str = "kit") -> int:
+    """
+    Write a kit of parts as a 3MF file, each component's mesh is
+    written once and referenced by the kit once per transform.
+
+    :param path: The file to create
+    :param components: The meshes and their instances
+    :param name: The name of the kit object
+    :returns: The size of the file
+    """
+    tmp: str = f"{path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as zf:
+        # The entries have no time so the same kit is the same file
+        for entry, data in (
+            ("[Content_Types].xml", _CONTENT_TYPES),
+            ("_rels/.rels", _RELS),
+        ):
+            info: zipfile.ZipInfo = zipfile.ZipInfo(entry)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zf.writestr(info, data)
+        with zf.open(_MODEL, "w") as f:
+            _write_model(f, components, name)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def _matrix(transform: str) -> np.ndarray:
+    """Return the (3, 4) matrix of a 3MF transform attribute, see _transform"""
+    if not transform:
+        return translation(0, 0, 0)
+    values: np.ndarray = np.array(transform.split(), dtype=float)
+    return np.hstack([values[:9].reshape(3, 3).T, values[9:, np.newaxis]])
+
+
+def _object_meshes(
+    objects: Dict[str, ElementTree.Element], object_id: str, matrix: np.ndarray
+) -> List[Mesh]:
+    """Return the meshes of object_id and of its components transformed by matrix"""
+    obj: ElementTree.Element = objects[object_id]
+    mesh: Optional[ElementTree.Element] = obj.find(f"{_NS}mesh")
+    if mesh is None:
+        result: List[Mesh] = []
+        for c in obj.iter(f"{_NS}component"):
+            m: np.ndarray = _matrix(c.get("transform", ""))
+            combined: np.ndarray = np.hstack(
+                [matrix[:, :3] @ m[:, :3], (matrix[:, :3] @ m[:, 3:]) + matrix[:, 3:]]
+            )
+            result.extend(_object_meshes(objects, c.get("objectid", ""), combined))
+        return result
+    vertices: np.ndarray = np.array(
+        [[v.get(a) for a in "xyz"] for v in mesh.iter(f"{_NS}vertex")], dtype=float
+    )
+    faces: np.ndarray = np.array(
+        [[t.get(a) for a in ("v1", "v2", "v3")] for t in mesh.iter(f"{_NS}triangle")],
+        dtype=int,
+    )
+    return [Mesh((vertices @ matrix[:, :3].T) + matrix[:, 3], faces)]
+
+
+def read_3mf(path: str) -> Mesh:
+    """
+    Return the Mesh of all of the instances of the objects built by the
+    3MF file path, each is a separate shell. Only meshes, components and
+    transforms of the core specification are read.
+    """
+    with zipfile.ZipFile(path) as zf:
+        root: ElementTree.Element = ElementTree.fromstring(zf.read(_MODEL))
+    objects: Dict[str, ElementTree.Element] = {
+        o.get("id", ""): o for o in root.iter(f"{_NS}object")
+    }
+    return concatenate(
+        [
+            mesh
+            for item in root.iter(f"{_NS}item")
+            for mesh in _object_meshes(
+                objects, item.get("objectid", ""), _matrix(item.get("transform", ""))
+            )
+        ]
+    )
@@ -0,0 +1,278 @@
+from dataclasses import dataclass
+from math import isclose
+from typing import List, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from mesh import Mesh, area, merge_vertices, read_stl, volume
+
+# Compares generated stl files with golden ones. The facets of two
+# builds of the same part may be in a different order, formatted
+# differently or tessellated differently by another version of OCC, so
+# files are compared by their volume, area, bounding box and how far the
+# surface of each is from the other, not by their text.
+
+# Default number of the nearest points sampled from the other mesh whose
+# triangles' distances from each point are computed
+DFLT_candidates: int = 8
+
+# Number of points whose distances from every triangle are computed at once
+_EXACT_BATCH: int = 16
+
+
+@dataclass
+class MeshStats:
+    """The measurements of a mesh"""
+
+    triangles: int
+    volume: float
+    area: float
+
+    bbox_min: Tuple[float, float, float]
+    """The minimum x, y and z of the vertices"""
+
+    bbox_max: Tuple[float, float, float]
+    """The maximum x, y and z of the vertices"""
+
+
+def mesh_stats(mesh: Mesh) -> MeshStats:
+    """Return the MeshStats of mesh"""
+    lo: np.ndarray = mesh.vertices.min(axis=0)
+    hi: np.ndarray = mesh.vertices.max(axis=0)
+    return MeshStats(
+        len(mesh.faces),
+        volume(mesh),
+        area(mesh),
+        (float(lo[0]), float(lo[1]), float(lo[2])),
+        (float(hi[0]), float(hi[1]), float(hi[2])),
+    )
+
+
+def _segment_distances(p: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Return the distance of each of the points p from the segment a to b"""
+    ab: np.ndarray = b - a
+    length2: np.ndarray = np.einsum("...i,...i->...", ab, ab)
+    t: np.ndarray = np.divide(
+        np.einsum("...i,...i->...", p - a, ab),
+        length2,
+        out=np.zeros_like(length2),
+        where=length2 > 0,
+    )
+    closest: np.ndarray = a + (np.clip(t, 0, 1)[..., np.newaxis] * ab)
+    return np.linalg.norm(p - closest, axis=-1)
+
+
+def triangle_distances(points: np.ndarray, tris: np.ndarray) -> np.ndarray:
+    """
+    Return the distance of each point from its triangle.
+
+    :param points: (..., 3) array of points
+    :param tris: (..., 3, 3) array of the vertices of the triangle of each point
+    :returns: (...) array of distances, points and tris are broadcast
+    """
+    shape: Tuple[int, ...] = np.broadcast_shapes(points.shape[:-1], tris.shape[:-2])
+    points = np.broadcast_to(points, shape + (3,))
+    tris = np.broadcast_to(tris, shape + (3, 3))
+    a: np.ndarray = tris[..., 0, :]
+    b: np.ndarray = tris[..., 1, :]
+    c: np.ndarray = tris[..., 2, :]
+    n: np.ndarray = np.cross(b - a, c - a)
+    n_len: np.ndarray = np.linalg.norm(n, axis=-1)
+
+    # The point projects inside the triangle if it's on the inner side
+    # of all three edges, the distance is then its distance from the plane
+    inside: np.ndarray = n_len > 0
+    for v0, v1 in ((a, b), (b, c), (c, a)):
+        side: np.ndarray = np.einsum(
+            "...i,...i->...", np.cross(v1 - v0, points - v0), n
+        )
+        inside = inside & (side >= 0)
+    plane: np.ndarray = np.abs(
+        np.divide(
+            np.einsum("...i,...i->...", points - a, n),
+            n_len,
+            out=np.zeros_like(n_len),
+            where=n_len > 0,
+        )
+    )
+    edges: np.ndarray = np.minimum(
+        np.minimum(_segment_distances(points, a, b), _segment_distances(points, b, c)),
+        _segment_distances(points, c, a),
+    )
+    return np.where(inside, plane, edges)
+
+
+def _samples(tris: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the points sampled from the triangles and the index of the
+    triangle of each. They're the vertices, the centroids and points on
+    the edges no further apart than the median length of the edges, so
+    long thin triangles, like those of threads, are sampled along them.
+    """
+    starts: np.ndarray = tris.reshape(-1, 3)
+    ends: np.ndarray = np.roll(tris, -1, axis=1).reshape(-1, 3)
+    lengths: np.ndarray = np.linalg.norm(ends - starts, axis=1)
+    spacing: float = float(np.median(lengths)) or 1.0
+    # The number of segments of each edge, a sample at the start of each
+    segments: np.ndarray = np.maximum(np.ceil(lengths / spacing), 1).astype(int)
+    edges: np.ndarray = np.repeat(np.arange(len(starts)), segments)
+    offsets: np.ndarray = np.arange(len(edges)) - np.repeat(
+        np.cumsum(segments) - segments, segments
+    )
+    t: np.ndarray = (offsets / segments[edges])[:, np.newaxis]
+    points: np.ndarray = starts[edges] + (t * (ends[edges] - starts[edges]))
+    return (
+        np.concatenate([points, tris.mean(axis=1)]),
+        np.concatenate([edges // 3, np.arange(len(tris))]),
+    )
+
+
+class SurfaceIndex:
+    """
+    A kd-tree of points sampled from the triangles of a mesh, it's built
+    once for the distances of many sets of points from the mesh.
+    """
+
+    def __init__(self, mesh: Mesh) -> None:
+        self.tris: np.ndarray = mesh.triangles()
+        self.samples: np.ndarray
+        self.owners: np.ndarray
+        self.samples, self.owners = _samples(self.tris)
+        self.tree: cKDTree = cKDTree(self.samples)
+
+    def distances(
+        self,
+        points: np.ndarray,
+        candidates: int = DFLT_candidates,
+        max_distance: float = np.inf,
+    ) -> np.ndarray:
+        """
+        Return the distance of each of points from the mesh, see
+        surface_distances. Points whose nearest samples are further than
+        max_distance aren't measured, their distance is inf.
+        """
+        k: int = min(candidates, len(self.samples))
+        sample_distances, nearest = self.tree.query(
+            points, k=k, distance_upper_bound=max_distance
+        )
+        sample_distances = np.asarray(sample_distances).reshape(len(points), k)
+        nearest = np.asarray(nearest).reshape(len(points), k)
+        result: np.ndarray = np.full(len(points), np.inf)
+        near: np.ndarray = np.isfinite(sample_distances[:, 0])
+        # Samples beyond max_distance are len(samples), use the nearest instead
+        candidates_near: np.ndarray = np.where(
+            np.isfinite(sample_distances[near]), nearest[near], nearest[near, :1]
+        )
+        distances: np.ndarray = triangle_distances(
+            points[near][:, np.newaxis, :], self.tris[self.owners[candidates_near]]
+        )
+        result[near] = distances.min(axis=1)
+        return result
+
+
+def surface_distances(
+    points: np.ndarray, mesh: Mesh, candidates: int = DFLT_candidates
+) -> np.ndarray:
+    """
+    Return the distance of each of points from the surface of mesh.
+
+    Points sampled from the triangles of mesh are in a kd-tree and the
+    distance is the minimum distance from the triangles of the candidates
+    nearest samples. It's the exact distance unless none of them are on
+    the nearest triangle, it's then slightly larger.
+
+    :param points: (N, 3) array of points
+    :param mesh: The mesh
+    :param candidates: The number of nearest samples
+    :returns: (N,) array of distances
+    """
+    return SurfaceIndex(mesh).distances(points, candidates)
+
+
+def max_surface_distance(
+    points: np.ndarray, mesh: Mesh, candidates: int = DFLT_candidates
+) -> float:
+    """
+    Return the maximum distance of points from the surface of mesh.
+
+    surface_distances is never less than the exact distance, so the exact
+    distances of the points with the largest are computed from every
+    triangle until the next largest is no more than the maximum so far.
+    Usually only a few points are checked.
+    """
+    approx: np.ndarray = surface_distances(points, mesh, candidates)
+    order: np.ndarray = np.argsort(approx)[::-1]
+    tris: np.ndarray = mesh.triangles()[np.newaxis]
+    result: float = 0
+    for start in range(0, len(order), _EXACT_BATCH):
+        batch: np.ndarray = order[start : start + _EXACT_BATCH]
+        if approx[batch[0]] <= result:
+            break
+        exact: np.ndarray = triangle_distances(points[batch][:, np.newaxis], tris)
+        result = max(result, float(exact.min(axis=1).max()))
+    return result
+
+
+def deviation(mesh: Mesh, other: Mesh, candidates: int = DFLT_candidates) -> float:
+    """
+    Return the Hausdorff-style distance between mesh and other, the
+    maximum distance of the vertices and centroids of each from the
+    surface of the other, see max_surface_distance.
+    """
+    result: float = 0
+    for m, o in ((mesh, other), (other, mesh)):
+        points: np.ndarray = np.concatenate(
+            [merge_vertices(m).vertices, m.triangles().mean(axis=1)], axis=0
+        )
+        result = max(result, max_surface_distance(points, o, candidates))
+    return result
+
+
+@dataclass
+class MeshDiff:
+    """The differences between a mesh and a golden mesh"""
+
+    stats: MeshStats
+    golden: MeshStats
+
+    deviation: float
+    """The distance between their surfaces, see deviation"""
+
+    def problems(self, tolerance: float, rel_tol: float = 1e-3) -> List[str]:
+        """
+        Return the differences which are too large, an empty list if
+        the meshes are the same part.
+
+        :param tolerance: The maximum deviation and difference of the
+                          bounding boxes, usually the stl tolerance
+        :param rel_tol: The maximum relative difference of the volumes and areas
+        """
+        problems: List[str] = []
+        for name in ("volume", "area"):
+            v: float = getattr(self.stats, name)
+            g: float = getattr(self.golden, name)
+            if not isclose(v, g, rel_tol=rel_tol):
+                problems.append(f"{name}:{v:.6g} golden:{g:.6g}")
+        for name in ("bbox_min", "bbox_max"):
+            v3: Tuple[float, float, float] = getattr(self.stats, name)
+            g3: Tuple[float, float, float] = getattr(self.golden, name)
+            if max(abs(a - b) for a, b in zip(v3, g3)) > tolerance:
+                problems.append(f"{name}:{v3} golden:{g3}")
+        if self.deviation > tolerance:
+            problems.append(f"deviation:{self.deviation:.3g} > {tolerance:.3g}")
+        return problems
+
+
+def diff_meshes(
+    mesh: Mesh, golden: Mesh, candidates: int = DFLT_candidates
+) -> MeshDiff:
+    """Return the MeshDiff of mesh and golden"""
+    return MeshDiff(
+        mesh_stats(mesh), mesh_stats(golden), deviation(mesh, golden, candidates)
+    )
+
+
+def diff_stl(path: str, golden: str, candidates: int = DFLT_candidates) -> MeshDiff:
+    """Return the MeshDiff of the stl files path and golden, see read_stl"""
+    return diff_meshes(read_stl(path), read_stl(golden), candidates)
@@ -0,0 +1,300 @@
+from dataclasses import dataclass
+from math import pi
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from cq_params import PartParams
+from mesh import Mesh, merge_vertices, read_stl
+from mesh_diff import DFLT_candidates, SurfaceIndex
+
+# Checks that a bolt screws into a nut by placing the bolt's mesh at
+# a sweep of depths in the nut and measuring the clearance between the
+# surfaces and whether either is inside the other. An intersection of
+# the Solids of the M8 pair takes about 3.5s per pose and doesn't measure
+# the clearance, this takes about 0.3s, so it can be run on the stl files
+# of every pair, not only on the thread profiles, see thread_clearance.
+#
+# The bolt is moved down, head first, so its tip is depth into the
+# bottom of the nut and it's rotated by the angle at which its threads
+# follow the nut's. The profiles of the internal and external threads
+# are centred on the same helix, so that's where the bolt's ridges are
+# half a pitch from the nut's.
+
+# Default number of depths the bolt is checked at
+DFLT_depths: int = 8
+
+# Direction of the rays which count how many times the surface is
+# crossed, it isn't parallel to the axis, faces or edges of the parts
+# so rays rarely pass through an edge or vertex
+_RAY: np.ndarray = np.array([1, 0.3183, 0.1459]) / np.linalg.norm([1, 0.3183, 0.1459])
+
+# Number of points whose rays are tested at once
+_RAY_BATCH: int = 4096
+
+
+@dataclass
+class FitResult:
+    """The fit of the bolt in the nut at one pose"""
+
+    depth: float
+    """How far the tip of the bolt is into the nut"""
+
+    rotation: float
+    """Radians the bolt is rotated about the z axis"""
+
+    clearance: float
+    """
+    The minimum distance between the surfaces of the bolt and nut, of
+    the points which aren't inside the other part, inf if none are
+    within a pitch of it
+    """
+
+    interference: int
+    """The number of points of the surface of each part inside the other"""
+
+    penetration: float
+    """
+    The maximum distance of those points from the surface, 0 if there
+    are none, inf if one is more than a pitch inside
+    """
+
+
+class InsideIndex:
+    """
+    A grid of the triangles of a closed mesh projected along _RAY, the
+    points inside the mesh are those whose rays cross its surface an odd
+    number of times. The mesh may be several overlapping closed shells,
+    as made by the mesh engine, a point is inside if it's inside any.
+    """
+
+    def __init__(self, mesh: Mesh) -> None:
+        merged: Mesh = merge_vertices(mesh)
+        tris: np.ndarray = merged.triangles()
+        self.shell: np.ndarray
+        self.shells: int
+        self.shells, self.shell = _shells(merged)
+
+        # Precomputed for the Moller-Trumbore intersections
+        self.a: np.ndarray = tris[:, 0]
+        self.e1: np.ndarray = tris[:, 1] - self.a
+        self.e2: np.ndarray = tris[:, 2] - self.a
+        self.p: np.ndarray = np.cross(_RAY, self.e2)
+        self.det: np.ndarray = np.einsum("ij,ij->i", self.e1, self.p)
+
+        # The coordinates of the vertices perpendicular to _RAY
+        self.axes: np.ndarray = np.linalg.svd(_RAY[np.newaxis])[2][1:].T
+        uv: np.ndarray = tris @ self.axes
+        lo: np.ndarray = uv.min(axis=1)
+        hi: np.ndarray = uv.max(axis=1)
+        self.origin: np.ndarray = lo.min(axis=0)
+        extent: np.ndarray = hi.max(axis=0) - self.origin
+        # About as many cells as triangles
+        self.cell: float = float(np.sqrt(np.prod(extent) / len(tris))) or 1.0
+        self.size: np.ndarray = np.floor(extent / self.cell).astype(int) + 1
+
+        # The triangles whose bounding box overlaps each cell
+        first: np.ndarray = np.floor((lo - self.origin) / self.cell).astype(int)
+        last: np.ndarray = np.floor((hi - self.origin) / self.cell).astype(int)
+        counts: np.ndarray = last - first + 1
+        spans: np.ndarray = counts[:, 0] * counts[:, 1]
+        owner: np.ndarray = np.repeat(np.arange(len(tris)), spans)
+        offset: np.ndarray = np.arange(len(owner)) - np.repeat(
+            np.cumsum(spans) - spans, spans
+        )
+        i: np.ndarray = first[owner, 0] + (offset // counts[owner, 1])
+        j: np.ndarray = first[owner, 1] + (offset % counts[owner, 1])
+        cells: np.ndarray = (i * self.size[1]) + j
+        order: np.ndarray = np.argsort(cells, kind="stable")
+        self.tris: np.ndarray = owner[order]
+        self.starts: np.ndarray = np.concatenate(
+            [[0], np.cumsum(np.bincount(cells, minlength=int(np.prod(self.size))))]
+        )
+
+    def inside(self, points: np.ndarray) -> np.ndarray:
+        """Return the (N,) boolean array of which points are inside the mesh"""
+        result: np.ndarray = np.zeros(len(points), dtype=bool)
+        for start in range(0, len(points), _RAY_BATCH):
+            batch: np.ndarray = points[start : start + _RAY_BATCH]
+            result[start : start + len(batch)] = self._inside(batch)
+        return result
+
+    def _inside(self, points: np.ndarray) -> np.ndarray:
+        ij: np.ndarray = np.floor(
+            ((points @ self.axes) - self.origin) / self.cell
+        ).astype(int)
+        valid: np.ndarray = np.all((ij >= 0) & (ij < self.size), axis=1)
+        cells: np.ndarray = (ij[:, 0] * self.size[1]) + ij[:, 1]
+        cells[~valid] = 0
+        counts: np.ndarray = np.where(
+            valid, self.starts[cells + 1] - self.starts[cells], 0
+        )
+
+        # Each point and the triangles of its cell
+        point: np.ndarray = np.repeat(np.arange(len(points)), counts)
+        offset: np.ndarray = np.arange(len(point)) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        tri: np.ndarray = self.tris[self.starts[cells[point]] + offset]
+
+        det: np.ndarray = self.det[tri]
+        ok: np.ndarray = det != 0
+        inv: np.ndarray = np.divide(1, det, out=np.zeros_like(det), where=ok)
+        t: np.ndarray = points[point] - self.a[tri]
+        u: np.ndarray = np.einsum("ij,ij->i", t, self.p[tri]) * inv
+        q: np.ndarray = np.cross(t, self.e1[tri])
+        v: np.ndarray = (q @ _RAY) * inv
+        dist: np.ndarray = np.einsum("ij,ij->i", q, self.e2[tri]) * inv
+        hit: np.ndarray = ok & (u >= 0) & (v >= 0) & (u + v <= 1) & (dist > 0)
+
+        # Inside a shell if its surface is crossed an odd number of times
+        keys, crossings = np.unique(
+            (point[hit] * self.shells) + self.shell[tri[hit]], return_counts=True
+        )
+        result: np.ndarray = np.zeros(len(points), dtype=bool)
+        result[keys[(crossings % 2) == 1] // self.shells] = True
+        return result
+
+
+def _shells(mesh: Mesh) -> Tuple[int, np.ndarray]:
+    """
+    Return the number of connected shells of mesh, whose vertices are
+    merged, and the shell of each triangle
+    """
+    faces: int = len(mesh.faces)
+    rows: np.ndarray = np.repeat(np.arange(faces), 3)
+    graph = coo_matrix(
+        (np.ones(len(rows)), (rows, mesh.faces.ravel() + faces)),
+        shape=(faces + len(mesh.vertices),) * 2,
+    )
+    _, labels = connected_components(graph, directed=False)
+    # Renumber the shells of the faces, unused vertices are components too
+    shells, shell = np.unique(labels[:faces], return_inverse=True)
+    return len(shells), shell
+
+
+def fit_depths(params: PartParams, steps: int = DFLT_depths) -> List[float]:
+    """
+    Return steps depths evenly spaced between the tip of the bolt at the
+    bottom of the nut and its head touching the nut, excluding both
+    """
+    return [params.height * (i + 1) / (steps + 1) for i in range(steps)]
+
+
+def _pose(params: PartParams, depth: float, phase: float) -> Tuple[np.ndarray, float]:
+    """Return the rotation matrix and z translation of the bolt at depth"""
+    dz: float = depth - (params.head_height + params.height)
+    rotation: float = (
+        2 * pi * (((dz + params.head_height) / params.pitch) + 0.5)
+    ) + phase
+    c: float = np.cos(rotation)
+    s: float = np.sin(rotation)
+    return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]]), dz
+
+
+def check_fit(
+    bolt: Mesh,
+    nut: Mesh,
+    params: PartParams,
+    depths: Optional[Sequence[float]] = None,
+    phases: Sequence[float] = (0,),
+    candidates: int = DFLT_candidates,
+) -> List[FitResult]:
+    """
+    Check the fit of the bolt in the nut at each depth and phase. The
+    bolt and nut are indexed once and each pose is a few vectorized
+    queries of the points sampled from their surfaces, see SurfaceIndex.
+
+    The clearance is measured between the points sampled from each
+    surface and the triangles of the other, so it's approximate, usually
+    within a small fraction of the stl tolerance. The meshes must be
+    closed for the points inside the other part to be found.
+
+    :param bolt: The mesh of the bolt, as built from params
+    :param nut: The mesh of the nut which mates with it, see pair_params
+    :param params: The parameters of the pair
+    :param depths: How far the tip of the bolt is into the nut,
+                   if None see fit_depths
+    :param phases: Radians added to the rotation at which the threads
+                   mate, other than 0 the threads usually interfere
+    :param candidates: See surface_distances
+    :returns: The FitResult of each pose, depth by depth
+    """
+    if depths is None:
+        depths = fit_depths(params)
+    meshes: Tuple[Mesh, Mesh] = (bolt, nut)
+    indexes: List[SurfaceIndex] = [SurfaceIndex(m) for m in meshes]
+    insides: List[InsideIndex] = [InsideIndex(m) for m in meshes]
+    # The vertices and centroids of each, as for mesh_diff.deviation
+    samples: List[np.ndarray] = [
+        np.concatenate([merge_vertices(m).vertices, m.triangles().mean(axis=1)])
+        for m in meshes
+    ]
+    # Points further than a pitch from the other part are ignored
+    margin: float = params.pitch
+    bounds: List[Tuple[np.ndarray, np.ndarray]] = [
+        (m.vertices.min(axis=0) - margin, m.vertices.max(axis=0) + margin)
+        for m in meshes
+    ]
+
+    results: List[FitResult] = []
+    for depth in depths:
+        for phase in phases:
+            rotation, dz = _pose(params, depth, phase)
+            offset: np.ndarray = np.array([0, 0, dz])
+            # The bolt's points where the nut is and the nut's where the bolt is
+            points: List[np.ndarray] = [
+                (samples[0] @ rotation.T) + offset,
+                (samples[1] - offset) @ rotation,
+            ]
+            distances: List[np.ndarray] = []
+            inside: List[np.ndarray] = []
+            for p, other in zip(points, (1, 0)):
+                lo, hi = bounds[other]
+                p = p[np.all((p >= lo) & (p <= hi), axis=1)]
+                distances.append(indexes[other].distances(p, candidates, margin))
+                inside.append(insides[other].inside(p))
+            d: np.ndarray = np.concatenate(distances)
+            i: np.ndarray = np.concatenate(inside)
+            results.append(
+                FitResult(
+                    depth,
+                    float(np.arctan2(rotation[1, 0], rotation[0, 0])),
+                    float(d[~i].min(initial=np.inf)),
+                    int(i.sum()),
+                    float(d[i].max(initial=0)),
+                )
+            )
+    return results
+
+
+def check_fit_stl(
+    bolt: str,
+    nut: str,
+    params: PartParams,
+    depths: Optional[Sequence[float]] = None,
+    phases: Sequence[float] = (0,),
+    candidates: int = DFLT_candidates,
+) -> List[FitResult]:
+    """Check the fit of the stl files bolt and nut, see check_fit and read_stl"""
+    return check_fit(read_stl(bolt), read_stl(nut), params, depths, phases, candidates)
+
+
+def fit_problems(results: Sequence[FitResult], min_clearance: float = 0) -> List[str]:
+    """
+    Return the poses where the bolt and nut interfere or the clearance
+    is less than min_clearance, an empty list if the bolt fits.
+    """
+    problems: List[str] = []
+    for r in results:
+        if r.interference > 0:
+            problems.append(
+                f"depth:{r.depth:.3f} rotation:{r.rotation:.3f} {r.interference} points interfere, penetration:{r.penetration:.3g}"
+            )
+        elif r.clearance < min_clearance:
+            problems.append(
+                f"depth:{r.depth:.3f} rotation:{r.rotation:.3f} clearance:{r.clearance:.3g} < {min_clearance:.3g}"
+            )
+    return problems
@@ -0,0 +1,172 @@
+from math import ceil, cos, pi
+from typing import Optional
+
+import numpy as np
+from helical_thread import ThreadHelixes
+
+from cq_profile import Stage, stage
+from mesh import Mesh, concatenate, orient_outward
+from mesh_threads import ext_threads_mesh, int_threads_mesh, segment_angle
+
+
+def ring_segments(radius: float, tolerance: float, angular_tolerance: float) -> int:
+    """
+    Return the number of segments of a circle of radius, it's a multiple
+    of 6 so the segments include the corners of a hexagon.
+    """
+    step: float = segment_angle(radius, tolerance, angular_tolerance)
+    return 6 * max(1, ceil(2 * pi / step / 6))
+
+
+def circle_points(radius: float, segments: int) -> np.ndarray:
+    """Return the (segments, 2) array of points on a circle"""
+    a: np.ndarray = np.linspace(0, 2 * pi, segments, endpoint=False)
+    return np.stack([radius * np.cos(a), radius * np.sin(a)], axis=1)
+
+
+def hexagon_points(diameter: float, segments: int) -> np.ndarray:
+    """
+    Return the (segments, 2) array of points on the hexagon inscribed in
+    a circle of diameter, with a corner on the x axis as cq.Workplane.polygon
+    creates. The points are at the same angles as circle_points.
+    """
+    a: np.ndarray = np.linspace(0, 2 * pi, segments, endpoint=False)
+    sector: float = pi / 3
+    r: np.ndarray = (
+        (diameter / 2) * cos(sector / 2) / np.cos(np.mod(a, sector) - (sector / 2))
+    )
+    return np.stack([r * np.cos(a), r * np.sin(a)], axis=1)
+
+
+def prism(outer: np.ndarray, inner: Optional[np.ndarray], z0: float, z1: float) -> Mesh:
+    """
+    Create a closed mesh by extruding the region between the outer and inner
+    polygons from z0 to z1. The polygons are counter clockwise with the same
+    number of points and each inner point is joined to the outer point at
+    the same index. If inner is None the region is the outer polygon,
+    which must be star shaped about the origin.
+
+    :param outer: (N, 2) array of the outer polygon
+    :param inner: (N, 2) array of the inner polygon or None
+    :param z0: The bottom of the prism
+    :param z1: The top of the prism
+    """
+    n: int = len(outer)
+    rings: np.ndarray = outer[np.newaxis] if inner is None else np.stack([outer, inner])
+    loops: np.ndarray = np.concatenate(
+        [
+            np.concatenate([r, np.full((n, 1), z)], axis=1)
+            for z in (z0, z1)
+            for r in rings
+        ]
+    )
+    # Index of point i of ring j at the bottom and top
+    count: int = len(rings)
+    i: np.ndarray = np.arange(n)
+    j: np.ndarray = (i + 1) % n
+    bottom = [(r * n) + i for r in range(count)]
+    bottom_j = [(r * n) + j for r in range(count)]
+    top = [((count + r) * n) + i for r in range(count)]
+    top_j = [((count + r) * n) + j for r in range(count)]
+
+    faces = [
+        # Outer wall
+        np.stack([bottom[0], bottom_j[0], top_j[0]], axis=1),
+        np.stack([bottom[0], top_j[0], top[0]], axis=1),
+    ]
+    if inner is None:
+        centers: np.ndarray = np.array([[0.0, 0.0, z0], [0.0, 0.0, z1]])
+        c0: np.ndarray = np.full(n, len(loops))
+        c1: np.ndarray = c0 + 1
+        loops = np.concatenate([loops, centers])
+        faces += [
+            np.stack([c0, bottom_j[0], bottom[0]], axis=1),
+            np.stack([c1, top[0], top_j[0]], axis=1),
+        ]
+    else:
+        faces += [
+            # Inner wall
+            np.stack([bottom[1], top_j[1], bottom_j[1]], axis=1),
+            np.stack([bottom[1], top[1], top_j[1]], axis=1),
+            # Bottom and top between the rings
+            np.stack([bottom[0], bottom[1], bottom_j[1]], axis=1),
+            np.stack([bottom[0], bottom_j[1], bottom_j[0]], axis=1),
+            np.stack([top[0], top_j[0], top_j[1]], axis=1),
+            np.stack([top[0], top_j[1], top[1]], axis=1),
+        ]
+    return orient_outward(Mesh(loops, np.concatenate(faces)))
+
+
+def mesh_bolt(
+    ths: ThreadHelixes,
+    head_size: float,
+    head_height: float,
+    wall_thickness: float,
+    tolerance: float,
+    angular_tolerance: float,
+    core_tolerance: float = 0,
+    core_angular_tolerance: float = 0,
+) -> Mesh:
+    """
+    Create a mesh of the bolt created by cq_bolt. The head, core and threads
+    are separate closed shells which overlap, slicers combine them.
+
+    :param core_tolerance: Tolerance of the core, if 0 tolerance is used
+    :param core_angular_tolerance: If 0 angular_tolerance is used
+    """
+    s: Stage
+    with stage("mesh.core") as s:
+        core_radius: float = ths.ext_helix_radius
+        segments: int = ring_segments(
+            core_radius,
+            core_tolerance if core_tolerance > 0 else tolerance,
+            core_angular_tolerance if core_angular_tolerance > 0 else angular_tolerance,
+        )
+        head: Mesh = prism(hexagon_points(head_size, 6), None, 0, head_height)
+
+        inner_radius: float = core_radius - wall_thickness
+        core: Mesh = prism(
+            circle_points(core_radius, segments),
+            circle_points(inner_radius, segments) if inner_radius > 0 else None,
+            head_height,
+            head_height + ths.ht.height,
+        )
+        s.count(triangles=len(head.faces) + len(core.faces))
+
+    threads: Mesh = ext_threads_mesh(ths, tolerance, angular_tolerance).translate(
+        (0, 0, head_height)
+    )
+    return concatenate([head, core, threads])
+
+
+def mesh_nut(
+    ths: ThreadHelixes,
+    head_size: float,
+    tolerance: float,
+    angular_tolerance: float,
+    core_tolerance: float = 0,
+    core_angular_tolerance: float = 0,
+) -> Mesh:
+    """
+    Create a mesh of the nut created by cq_nut. The core and threads
+    are separate closed shells which overlap, slicers combine them.
+
+    :param core_tolerance: Tolerance of the core, if 0 tolerance is used
+    :param core_angular_tolerance: If 0 angular_tolerance is used
+    """
+    s: Stage
+    with stage("mesh.core") as s:
+        segments: int = ring_segments(
+            head_size / 2,
+            core_tolerance if core_tolerance > 0 else tolerance,
+            core_angular_tolerance if core_angular_tolerance > 0 else angular_tolerance,
+        )
+        core: Mesh = prism(
+            hexagon_points(head_size, segments),
+            circle_points(ths.int_helix_radius, segments),
+            0,
+            ths.ht.height,
+        )
+        s.count(triangles=len(core.faces))
+    threads: Mesh = int_threads_mesh(ths, tolerance, angular_tolerance)
+    return concatenate([core, threads])
@@ -0,0 +1,195 @@
+from math import acos, ceil, pi
+from typing import List
+
+import numpy as np
+from helical_thread import HelicalThread, ThreadHelixes
+from taperable_helix import HelixLocation
+
+from cq_profile import Stage, stage
+from mesh import Mesh, merge_vertices, orient_outward
+
+# Smallest number of segments of any part of a helix
+_MIN_SEGMENTS: int = 1
+
+
+def segment_angle(radius: float, tolerance: float, angular_tolerance: float) -> float:
+    """
+    Return the largest angle, in radians, of a chord of a circle of radius
+    such that the chord deviates from the circle by no more than tolerance
+    and the angle is no more than angular_tolerance.
+    """
+    if radius <= tolerance:
+        return angular_tolerance
+    return min(angular_tolerance, 2 * acos(1 - (tolerance / radius)))
+
+
+def helix_points(ht: HelicalThread, hl: HelixLocation, t: np.ndarray) -> np.ndarray:
+    """
+    Return the (N, 3) array of points of the helix defined by ht and hl at
+    each value of t. This is a vectorized version of the function returned
+    by Helix.helix(hl) and the points are the same.
+    """
+    radius: float = hl.radius if hl.radius is not None else ht.radius
+    helix_height: float = ht.height - (2 * ht.inset_offset)
+    turns: float = ht.pitch / helix_height if ht.pitch != 0 and helix_height != 0 else 1
+    t_range: float = ht.last_t - ht.first_t
+    taper_out_range: float = t_range * ht.taper_out_rpos
+    taper_out_ends: float = (
+        ht.first_t + taper_out_range
+        if taper_out_range > 0
+        else min(ht.first_t, ht.last_t)
+    )
+    taper_in_range: float = t_range * (1 - ht.taper_in_rpos)
+    taper_in_starts: float = (
+        ht.last_t - taper_in_range if taper_in_range > 0 else max(ht.first_t, ht.last_t)
+    )
+
+    t = np.asarray(t, dtype=float)
+    rel_height: np.ndarray = (
+        (t - ht.first_t) / t_range if t_range != 0 else np.zeros_like(t)
+    )
+    taper_angle: np.ndarray = np.full_like(t, pi / 2)
+    out: np.ndarray = t < taper_out_ends
+    taper_angle[out] = pi / 2 * (t[out] - ht.first_t) / taper_out_range
+    into: np.ndarray = ~out & (t > taper_in_starts)
+    taper_angle[into] = pi / 2 * (ht.last_t - t[into]) / taper_in_range
+    taper_scale: np.ndarray = np.sin(taper_angle)
+
+    r: np.ndarray = radius + (hl.horz_offset * taper_scale)
+    a: np.ndarray = (2 * pi / turns) * rel_height
+    x: np.ndarray = r * np.sin(-a)
+    y: np.ndarray = r * np.cos(a)
+    z: np.ndarray = (
+        (helix_height * (rel_height if ht.pitch != 0 else 1))
+        + (hl.vert_offset * taper_scale)
+        + ht.inset_offset
+    )
+    return np.stack([x, y, z], axis=-1)
+
+
+def thread_samples(
+    ht: HelicalThread, max_radius: float, tolerance: float, angular_tolerance: float
+) -> np.ndarray:
+    """
+    Return the values of t at which the helixes are sampled. The tapered
+    and untapered sections are sampled separately so the points where
+    the tapering starts and ends are always samples.
+    """
+    t_range: float = ht.last_t - ht.first_t
+    helix_height: float = ht.height - (2 * ht.inset_offset)
+    total_angle: float = (
+        2 * pi * helix_height / ht.pitch if ht.pitch != 0 and helix_height != 0 else 0
+    )
+    step: float = segment_angle(max_radius, tolerance, angular_tolerance)
+
+    bounds: List[float] = [
+        ht.first_t,
+        ht.first_t + (t_range * ht.taper_out_rpos),
+        ht.last_t - (t_range * (1 - ht.taper_in_rpos)),
+        ht.last_t,
+    ]
+    sections: List[np.ndarray] = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if stop <= start:
+            continue
+        angle: float = total_angle * (stop - start) / t_range
+        segments: int = max(_MIN_SEGMENTS, ceil(angle / step))
+        sections.append(np.linspace(start, stop, segments + 1)[:-1])
+    sections.append(np.array([ht.last_t]))
+    return np.concatenate(sections)
+
+
+def _make_threads_mesh(
+    external_threads: bool,
+    ths: ThreadHelixes,
+    tolerance: float,
+    angular_tolerance: float,
+) -> Mesh:
+    """
+    Create a watertight mesh of the threads, the same shape as
+    the Solid created by cq_threads._make_threads.
+
+    Each helix is sampled at the same values of t giving a grid of
+    points, adjacent helixes are joined by strips of triangles and
+    the ends are closed by the polygon of the first and last points.
+    If an end is tapered its polygon collapses so the coincident
+    points are merged and the degenerate triangles removed.
+    """
+    helixes: List[HelixLocation] = (
+        ths.ext_helixes if external_threads else ths.int_helixes
+    )
+    ht: HelicalThread = ths.ht
+    max_radius: float = max(
+        (hl.radius if hl.radius is not None else ht.radius) + abs(hl.horz_offset)
+        for hl in helixes
+    )
+    t: np.ndarray = thread_samples(ht, max_radius, tolerance, angular_tolerance)
+
+    k: int = len(helixes)
+    n: int = len(t)
+    vertices: np.ndarray = np.concatenate([helix_points(ht, hl, t) for hl in helixes])
+
+    # The quads between helix i and helix i + 1, wrapping to 0
+    grid: np.ndarray = np.arange(k * n).reshape(k, n)
+    nxt: np.ndarray = np.roll(grid, -1, axis=0)
+    a: np.ndarray = grid[:, :-1].ravel()
+    b: np.ndarray = nxt[:, :-1].ravel()
+    c: np.ndarray = nxt[:, 1:].ravel()
+    d: np.ndarray = grid[:, 1:].ravel()
+    sides: np.ndarray = np.concatenate(
+        [np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)]
+    )
+
+    # The end caps as a fan of triangles
+    fan: np.ndarray = np.stack(
+        [np.zeros(k - 2, dtype=int), np.arange(1, k - 1), np.arange(2, k)], axis=1
+    )
+    first_cap: np.ndarray = grid[:, 0][fan][:, ::-1]
+    last_cap: np.ndarray = grid[:, -1][fan]
+
+    mesh: Mesh = Mesh(vertices, np.concatenate([sides, first_cap, last_cap]))
+    return orient_outward(merge_vertices(mesh))
+
+
+def _threads_mesh(
+    external_threads: bool,
+    ths: ThreadHelixes,
+    tolerance: float,
+    angular_tolerance: float,
+) -> Mesh:
+    """Return the Mesh created by _make_threads_mesh recording it as a stage"""
+    s: Stage
+    with stage("mesh.threads") as s:
+        rv: Mesh = _make_threads_mesh(
+            external_threads, ths, tolerance, angular_tolerance
+        )
+        s.count(triangles=len(rv.faces))
+    return rv
+
+
+def int_threads_mesh(
+    ths: ThreadHelixes, tolerance: float, angular_tolerance: float
+) -> Mesh:
+    """
+    Create a mesh of internal threads which may be triangular or trapizodal.
+
+    :param ths: ThreadHelixes
+    :param tolerance: Maximum deviation of the mesh from the helixes
+    :param angular_tolerance: Maximum angle of a segment of a helix in radians
+    :returns: Mesh representing the threads
+    """
+    return _threads_mesh(False, ths, tolerance, angular_tolerance)
+
+
+def ext_threads_mesh(
+    ths: ThreadHelixes, tolerance: float, angular_tolerance: float
+) -> Mesh:
+    """
+    Create a mesh of external threads which may be triangular or trapizodal.
+
+    :param ths: ThreadHelixes
+    :param tolerance: Maximum deviation of the mesh from the helixes
+    :param angular_tolerance: Maximum angle of a segment of a helix in radians
+    :returns: Mesh representing the threads
+    """
+    return _threads_mesh(True, ths, tolerance, angular_tolerance)
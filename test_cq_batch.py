@@ -0,0 +1,109 @@
+import os
+import time
+from dataclasses import replace
+from typing import Dict, List, cast
+
+import cadquery as cq
+import pytest
+
+import cq_batch
+from cq_batch import build_part, run_batch, run_pair, run_watched
+from cq_cache import StlCache
+from cq_params import JobResult, PartParams, pair_params
+from cq_threads import PREVIEW_OPTIONS
+from cq_watchdog import FALLBACKS, Limits
+
+# build_part before it's patched
+_build_part = build_part
+
+
+def test_pair_params() -> None:
+    bolt, nut = pair_params(PartParams(part="nut", pitch=1.5))
+    assert (bolt.part, nut.part) == ("bolt", "nut")
+    assert bolt.helical_thread() == nut.helical_thread()
+    assert bolt.fname()[len("bolt") :] == nut.fname()[len("nut") :]
+
+
+def test_run_pair(tmp_path) -> None:
+    params: PartParams = PartParams(engine="mesh", stl_format="binary")
+    directory: str = str(tmp_path / "out")
+    cache: StlCache = StlCache(str(tmp_path / "cache"))
+
+    bolt: JobResult
+    nut: JobResult
+    bolt, nut = run_pair(params, directory, cache)
+    for r, part in ((bolt, "bolt"), (nut, "nut")):
+        assert r.ok and not r.cached
+        assert r.params.part == part
+        assert os.path.getsize(r.path) == 84 + (r.triangles * 50)
+
+    assert all(r.cached for r in run_pair(params, directory, cache))
+
+
+def test_run_batch_skips_invalid(tmp_path) -> None:
+    params: PartParams = PartParams(engine="mesh", stl_format="binary")
+    jobs: List[PartParams] = [params, replace(params, pitch=-1)]
+    results: Dict[float, JobResult] = {
+        r.params.pitch: r for r in run_batch(jobs, str(tmp_path), max_workers=1)
+    }
+    assert results[params.pitch].ok
+    skipped: JobResult = results[-1]
+    assert skipped.skipped and not skipped.ok
+    assert skipped.error is not None and "pitch" in skipped.error
+    assert not os.path.exists(skipped.path)
+
+
+@pytest.mark.parametrize("part,solids", [("bolt", 3), ("nut", 2)])
+def test_build_part_preview(part, solids, monkeypatch) -> None:
+    params: PartParams = PartParams(part=part, quality="preview")
+    assert params.fname().endswith("-preview.stl")
+
+    # The ThreadOptions and union passed to cq_bolt or cq_nut
+    calls: List[tuple] = []
+    build = getattr(cq_batch, f"cq_{part}")
+
+    def spy(*args):
+        calls.append(args[-2:])
+        return build(*args)
+
+    monkeypatch.setattr(cq_batch, f"cq_{part}", spy)
+    preview = build_part(params)
+    assert calls == [(PREVIEW_OPTIONS, False)]
+    assert isinstance(preview, cq.Workplane)
+    assert len(preview.vals()) == solids
+    assert all(cast(cq.Solid, v).isValid() for v in preview.vals())
+
+
+def _slow_unless_native(params: PartParams, ths=None):
+    """A build_part which never finishes unless the helixes are native"""
+    if not params.native_helix:
+        time.sleep(60)
+    return _build_part(params, ths)
+
+
+def test_run_watched_fallback(tmp_path, monkeypatch) -> None:
+    # The forked process uses the patched build_part
+    monkeypatch.setattr(cq_batch, "build_part", _slow_unless_native)
+    params: PartParams = PartParams(engine="mesh", stl_format="binary")
+
+    r: JobResult = run_watched(params, str(tmp_path), limits=Limits(timeout=2))
+    assert r.ok and (r.fallback == "coarse") and (r.attempts == 2)
+    assert r.params == params
+    # The coarse fallback's own file, not the requested part's
+    assert r.path == FALLBACKS["coarse"](params).path(str(tmp_path))
+    assert r.path != params.path(str(tmp_path))
+    assert os.path.exists(r.path) and not os.path.exists(params.path(str(tmp_path)))
+
+    r = run_watched(params, str(tmp_path), limits=Limits(timeout=1, retry=False))
+    assert not r.ok and (r.attempts == 1)
+    assert r.error is not None and "timed out" in r.error
+
+
+def test_run_batch_limits(tmp_path) -> None:
+    params: PartParams = PartParams(engine="mesh", stl_format="binary")
+    jobs: List[PartParams] = [params, replace(params, part="nut")]
+    results: List[JobResult] = list(
+        run_batch(jobs, str(tmp_path), max_workers=2, limits=Limits(timeout=60))
+    )
+    assert len(results) == 2
+    assert all(r.ok and (r.fallback is None) and (r.attempts == 1) for r in results)
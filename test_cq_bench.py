@@ -0,0 +1,84 @@
+from dataclasses import replace
+from typing import List
+
+import pytest
+
+from cq_bench import (
+    MATRICES,
+    SUBJECTS,
+    BenchCase,
+    BenchResult,
+    bench_cases,
+    compare_results,
+    load_results,
+    run_bench,
+    save_results,
+)
+from cq_params import PartParams
+
+
+def test_bench_cases() -> None:
+    cases: List[BenchCase] = bench_cases(MATRICES["default"])
+    assert len(cases) == 3 * 2 * 2 * len(SUBJECTS)
+    assert len({c.key() for c in cases}) == len(cases)
+    for c in cases:
+        if c.profile == "trapezoid":
+            assert c.params.major_cutoff == c.params.pitch / 8
+            assert c.params.minor_cutoff == c.params.pitch / 4
+        if c.subject in ("bolt", "nut"):
+            assert c.params.part == c.subject
+
+    with pytest.raises(ValueError):
+        bench_cases({"profile": ["not_a_profile"]})
+
+
+def test_compare_results() -> None:
+    base: List[BenchResult] = [
+        BenchResult("a", "bolt", seconds=1, export_seconds=1, bytes=100),
+        BenchResult("b", "nut", seconds=1),
+        BenchResult("c", "nut", seconds=0.001),
+    ]
+    current: List[BenchResult] = [
+        replace(base[0], seconds=1.1, bytes=300),
+        replace(base[1], seconds=2),
+        replace(base[2], seconds=0.005),
+        BenchResult("d", "nut", seconds=10),
+    ]
+    regressions = compare_results(base, current, threshold=0.2)
+    assert [(r.key, r.metric) for r in regressions] == [
+        ("a", "bytes"),
+        ("b", "seconds"),
+    ]
+    assert regressions[1].ratio == 2
+    assert compare_results(base, current, threshold=1.5) == [regressions[0]]
+
+
+def test_run_bench(tmp_path) -> None:
+    base: PartParams = PartParams(engine="mesh")
+    cases: List[BenchCase] = bench_cases(MATRICES["quick"], base=base)
+    results: List[BenchResult] = list(run_bench(cases, 2, str(tmp_path)))
+    assert [r.key for r in results] == [c.key() for c in cases]
+    for r in results:
+        assert r.error is None
+        assert r.seconds > 0
+        assert r.peak_rss_mb > 0
+        assert (r.bytes > 0) == (r.subject in ("bolt", "nut"))
+    assert not list(tmp_path.glob("*.stl"))
+
+    path: str = str(tmp_path / "baseline.json")
+    save_results(path, results)
+    assert load_results(path) == results
+    assert compare_results(results, results) == []
+
+
+def test_run_bench_chunks(tmp_path) -> None:
+    # Each case's process may start the processes of the chunks
+    base: PartParams = PartParams(native_helix=True)
+    cases: List[BenchCase] = bench_cases(
+        MATRICES["quick"], subjects=["nut"], base=replace(base, chunks=2)
+    )
+    unchunked: BenchCase = bench_cases(MATRICES["quick"], ["nut"], base)[0]
+    assert cases[0].key() == f"{unchunked.key()} chunks=2"
+    results: List[BenchResult] = list(run_bench(cases, 1, str(tmp_path)))
+    assert results[0].error is None
+    assert results[0].bytes > 0
@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+from dataclasses import replace
+from math import isclose
+from typing import List, cast
+
+import cadquery as cq
+from helical_thread import ThreadHelixes, helical_thread
+
+from cq_batch import build_part, export_part
+from cq_bolt import cq_bolt
+from cq_params import PartParams, load_params
+from mesh_diff import MeshDiff, diff_stl
+
+
+def test_cq_bolt_no_union() -> None:
+    params: PartParams = PartParams(part="bolt")
+    ths: ThreadHelixes = helical_thread(params.helical_thread())
+    args = (ths, params.head_size, params.head_height, params.wall_thickness)
+
+    bolt: cq.Workplane = cq_bolt(*args)
+    assert len(bolt.vals()) == 1
+    union_volume: float = cast(cq.Solid, bolt.val()).Volume()
+
+    # The head, core and threads which overlap by thread_overlap
+    parts: cq.Workplane = cq_bolt(*args, union=False)
+    solids: List[cq.Solid] = [cast(cq.Solid, v) for v in parts.vals()]
+    assert len(solids) == 3
+    assert all(isinstance(s, cq.Solid) for s in parts.vals())
+    assert solids[2].BoundingBox().zmin >= params.head_height
+    volume: float = sum(s.Volume() for s in solids)
+    assert volume > union_volume
+    assert isclose(volume, union_volume, rel_tol=0.01)
+
+
+def test_golden(tmp_path) -> None:
+    # The golden file in generated/ was built from threads.ini with fitted
+    # helixes, the exact helixes are within 0.011 of them
+    golden: PartParams = load_params("bolt")
+    params: PartParams = replace(golden, native_helix=True)
+    path: str = str(tmp_path / params.fname())
+    export_part(build_part(params), params, path)
+    d: MeshDiff = diff_stl(path, golden.path())
+    assert d.problems(tolerance=0.02) == []
+
+
+def test_cli_dry_run_imports() -> None:
+    # Parsing the arguments, threads.ini and the file name don't import
+    # cadquery, or the modules only needed to build or submit a part
+    code: str = (
+        "import runpy, sys\n"
+        "sys.argv = ['cq-bolt', '--dry_run', '--no_cache']\n"
+        "try:\n"
+        "    runpy.run_path('cq-bolt', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "heavy = {'cadquery', 'OCP', 'helical_thread', 'cq_daemon', 'cq_watchdog', 'cq_profile'}\n"
+        "print(sorted(heavy & set(sys.modules)))\n"
+    )
+    out: str = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    lines: List[str] = out.splitlines()
+    assert lines[0] == load_params("bolt").path()
+    assert lines[1] == "[]"
@@ -0,0 +1,69 @@
+import os
+from dataclasses import replace
+
+from cq_cache import StlCache, cache_key, library_versions
+from cq_params import PartParams
+
+
+def _write(path: str, size: int) -> str:
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def test_cache_key() -> None:
+    bolt: PartParams = PartParams(part="bolt")
+    assert cache_key(bolt) == cache_key(PartParams(part="bolt"))
+    assert cache_key(bolt) != cache_key(replace(bolt, pitch=1.5))
+    assert cache_key(bolt) != cache_key(replace(bolt, head_height=5))
+    assert cache_key(bolt) == cache_key(replace(bolt, jobs=4))
+    assert cache_key(bolt) != cache_key(replace(bolt, part="nut"))
+
+    # Nuts don't have a head_height or wall_thickness
+    nut: PartParams = PartParams(part="nut")
+    assert cache_key(nut) == cache_key(replace(nut, head_height=5, wall_thickness=1))
+
+
+def test_cache_get_put(tmp_path) -> None:
+    cache: StlCache = StlCache(str(tmp_path / "cache"))
+    params: PartParams = PartParams(part="nut")
+    out: str = str(tmp_path / params.fname())
+
+    assert not cache.get(params, out)
+    cache.put(params, _write(out, 10))
+    os.remove(out)
+
+    assert cache.get(params, out)
+    assert os.path.getsize(out) == 10
+    assert cache.contains(params)
+    assert not cache.contains(replace(params, pitch=1.5))
+
+
+def test_library_versions_saved(tmp_path) -> None:
+    directory: str = str(tmp_path)
+    assert library_versions(directory) == library_versions()
+    assert "cadquery" in library_versions()
+    assert os.path.exists(os.path.join(directory, "versions.json"))
+    assert cache_key(PartParams(), directory) == cache_key(PartParams())
+
+    # A damaged file is replaced
+    library_versions.cache_clear()
+    _write(os.path.join(directory, "versions.json"), 3)
+    assert library_versions(directory) == library_versions()
+
+
+def test_cache_lru_eviction(tmp_path) -> None:
+    cache: StlCache = StlCache(str(tmp_path / "cache"), max_bytes=25)
+    src: str = _write(str(tmp_path / "src.stl"), 10)
+    out: str = str(tmp_path / "out.stl")
+    p1, p2, p3 = [PartParams(pitch=p) for p in (1, 1.5, 2)]
+
+    cache.put(p1, src)
+    cache.put(p2, src)
+    # Use p1 so p2 is the least recently used
+    assert cache.get(p1, out)
+    cache.put(p3, src)
+
+    assert cache.get(p1, out)
+    assert not cache.get(p2, out)
+    assert cache.get(p3, out)
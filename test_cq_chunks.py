@@ -0,0 +1,53 @@
+from dataclasses import replace
+from math import isclose
+from typing import List, cast
+
+import cadquery as cq
+import numpy as np
+import pytest
+from helical_thread import ThreadHelixes, helical_thread
+
+from conftest import mesh_volume
+from cq_batch import build_part
+from cq_chunks import ChunkBounds, chunk_bounds
+from cq_params import PartParams
+from mesh import Mesh, volume
+
+# A thread with 8 turns
+ROD: PartParams = PartParams(
+    pitch=1,
+    height=9.5,
+    inset=0.75,
+    taper_out_rpos=0.05,
+    taper_in_rpos=0.95,
+    major_cutoff=1 / 8,
+    minor_cutoff=1 / 4,
+    native_helix=True,
+)
+
+
+def test_chunk_bounds() -> None:
+    ths: ThreadHelixes = helical_thread(ROD.helical_thread())
+    bounds: List[ChunkBounds] = chunk_bounds(ths.ht, 4)
+    assert len(bounds) == 4
+    assert (bounds[0].t_start, bounds[-1].t_stop) == (ths.ht.first_t, ths.ht.last_t)
+    assert (bounds[0].z_lo, bounds[-1].z_hi) == (0, ROD.height)
+    for b0, b1 in zip(bounds, bounds[1:]):
+        assert (b0.t_stop, b0.z_hi) == (b1.t_start, b1.z_lo)
+        # Each chunk is 2 turns
+        assert isclose(b1.z_hi - b1.z_lo, 2) or (b1 is bounds[-1])
+
+
+@pytest.mark.parametrize("part", ["bolt", "nut"])
+def test_build_chunked(part: str) -> None:
+    params: PartParams = replace(ROD, part=part)
+    whole: cq.Shape = cast(cq.Shape, cast(cq.Workplane, build_part(params)).val())
+    chunked: cq.Workplane = cast(cq.Workplane, build_part(replace(params, chunks=3)))
+    assert len(chunked.vals()) == 1
+    solid: cq.Shape = cast(cq.Shape, chunked.val())
+    assert isinstance(solid, cq.Solid) and solid.isValid()
+    assert isclose(mesh_volume(solid), mesh_volume(whole), rel_tol=1e-4)
+    bb0: cq.BoundBox = solid.BoundingBox()
+    bb1: cq.BoundBox = whole.BoundingBox()
+    assert isclose(bb0.zmax, bb1.zmax, abs_tol=1e-2)
+    assert isclose(bb0.xmax, bb1.xmax, abs_tol=1e-2)
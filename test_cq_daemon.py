@@ -0,0 +1,89 @@
+import os
+import signal
+import threading
+from dataclasses import replace
+
+import pytest
+
+from cq_cache import StlCache
+from cq_daemon import DaemonServer, create_server, ping, shutdown, submit_job
+from cq_params import JobResult, PartParams
+from cq_watchdog import Limits
+
+
+def test_daemon(tmp_path) -> None:
+    socket_path: str = str(tmp_path / "daemon.sock")
+    assert ping(socket_path) is None
+
+    server: DaemonServer = create_server(socket_path, max_workers=1)
+    thread: threading.Thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with pytest.raises(RuntimeError):
+            create_server(socket_path, max_workers=1)
+
+        params: PartParams = PartParams(part="nut", engine="mesh")
+        directory: str = str(tmp_path / "out")
+        cache: StlCache = StlCache(str(tmp_path / "cache"))
+        r: JobResult = submit_job(params, directory, cache, socket_path)
+        assert r.ok and not r.cached
+        assert r.params == params
+        assert r.path == params.path(directory)
+        assert r.bytes == os.path.getsize(r.path)
+        assert r.seconds > 0
+
+        assert submit_job(params, directory, cache, socket_path).cached
+
+        failed: JobResult = submit_job(
+            replace(params, stl_format="obj"), directory, None, socket_path
+        )
+        assert not failed.ok
+        assert failed.error is not None
+
+        # Run in a process forked by the daemon
+        watched: JobResult = submit_job(
+            replace(params, part="bolt"), directory, None, socket_path, Limits(60)
+        )
+        assert watched.ok and (watched.attempts == 1) and (watched.fallback is None)
+
+        status = ping(socket_path)
+        assert status is not None
+        assert status["workers"] == 1
+        assert (status["jobs"], status["failed"]) == (4, 1)
+    finally:
+        shutdown(socket_path)
+        thread.join()
+        server.server_close()
+        server.executor.shutdown()
+
+    assert not os.path.exists(socket_path)
+    assert ping(socket_path) is None
+
+
+def test_daemon_worker_killed(tmp_path) -> None:
+    socket_path: str = str(tmp_path / "daemon.sock")
+    server: DaemonServer = create_server(socket_path, max_workers=1)
+    thread: threading.Thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        # As if OCC crashed the only worker
+        os.kill(server.executor.submit(os.getpid).result(), signal.SIGKILL)
+
+        params: PartParams = PartParams(part="nut", engine="mesh")
+        directory: str = str(tmp_path / "out")
+        failed: JobResult = submit_job(params, directory, None, socket_path)
+        assert not failed.ok
+        assert failed.error is not None and "worker exited" in failed.error
+
+        # The pool was replaced
+        r: JobResult = submit_job(params, directory, None, socket_path)
+        assert r.ok and os.path.exists(r.path)
+
+        status = ping(socket_path)
+        assert status is not None
+        assert (status["jobs"], status["failed"]) == (2, 1)
+    finally:
+        shutdown(socket_path)
+        thread.join()
+        server.server_close()
+        server.executor.shutdown()
@@ -0,0 +1,106 @@
+from dataclasses import replace
+from math import isclose, pi
+from typing import List, cast
+
+import cadquery as cq
+import numpy as np
+from helical_thread import ThreadHelixes, helical_thread
+
+from conftest import mesh_volume
+from cq_batch import build_part, export_part
+from cq_layout import (
+    export_instances,
+    export_kit,
+    grid_locations,
+    instance_mesh,
+    place,
+    threaded_holes,
+)
+from cq_params import PartParams
+from cq_threads import ThreadOptions, int_threads
+from mesh import Mesh, is_closed, merge_vertices, read_stl, volume
+from mesh_3mf import read_3mf
+
+# Exact helixes so the tessellation is closed
+NUT: PartParams = replace(
+    PartParams(part="nut"), native_helix=True, stl_format="binary"
+)
+
+
+def test_grid_locations() -> None:
+    locations: List[cq.Location] = grid_locations(3, 2, 10, 20, 5)
+    assert len(locations) == 6
+    assert locations[-1].toTuple()[0] == (20, 20, 5)
+
+
+def test_place() -> None:
+    part: cq.Workplane = cast(cq.Workplane, build_part(NUT))
+    compound: cq.Compound = place(part, grid_locations(3, 1, 20, 0))
+    solids: List[cq.Solid] = compound.Solids()
+    assert len(solids) == 3
+    # The instances share the geometry of the part
+    assert solids[0].wrapped.IsPartner(solids[2].wrapped)
+    assert isclose(solids[2].Center().x - solids[0].Center().x, 40)
+
+
+def test_instance_mesh() -> None:
+    mesh: Mesh = Mesh(
+        np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=float),
+        np.array([[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]]),
+    )
+    locations: List[cq.Location] = [
+        cq.Location(cq.Vector(5, 0, 0)),
+        cq.Location(cq.Vector(0, 0, 0), cq.Vector(0, 0, 1), 90),
+    ]
+    instances: Mesh = instance_mesh(mesh, locations)
+    assert instances.faces.shape == (8, 3)
+    assert np.allclose(instances.vertices[1], [6, 0, 0])
+    assert np.allclose(instances.vertices[5], [0, 1, 0])
+    assert isclose(volume(instances), 2 * volume(mesh))
+
+
+def test_export_instances(tmp_path) -> None:
+    part: cq.Workplane = cast(cq.Workplane, build_part(NUT))
+    one: str = str(tmp_path / "one.stl")
+    many: str = str(tmp_path / "many.stl")
+    export_part(part, NUT, one)
+    er = export_instances(part, grid_locations(2, 2, 15, 15), NUT, many)
+    single: Mesh = read_stl(one)
+    instances: Mesh = read_stl(many)
+    assert er.triangles == len(instances.faces) == 4 * len(single.faces)
+    assert isclose(volume(instances), 4 * volume(single), rel_tol=1e-6)
+    assert is_closed(merge_vertices(instances, 6))
+
+
+def test_export_kit(tmp_path) -> None:
+    bolt: cq.Shape = cq.Solid.makeCylinder(2, 10)
+    nut: cq.Shape = cq.Solid.makeBox(4, 4, 2)
+    path: str = str(tmp_path / "kit.3mf")
+    er = export_kit(
+        [
+            (bolt, replace(NUT, part="bolt"), grid_locations(1, 1, 0, 0)),
+            (nut, NUT, grid_locations(3, 1, 10, 0)),
+        ],
+        path,
+    )
+    mesh: Mesh = read_3mf(path)
+    assert er.triangles == len(mesh.faces)
+    assert isclose(volume(mesh), 3 * 32 + bolt.Volume(), rel_tol=1e-3)
+    assert isclose(mesh.vertices[:, 0].max(), 24)
+
+
+def test_threaded_holes() -> None:
+    ths: ThreadHelixes = helical_thread(NUT.helical_thread())
+    plate: cq.Solid = cq.Solid.makeBox(40, 20, ths.ht.height, cq.Vector(-10, -10, 0))
+    result: cq.Workplane = threaded_holes(
+        plate, ths, grid_locations(2, 1, 20, 0), ThreadOptions(native_helix=True)
+    )
+    solid: cq.Shape = cast(cq.Shape, result.val())
+    assert solid.isValid() and len(solid.Solids()) == 1
+    bb: cq.BoundBox = solid.BoundingBox()
+    assert isclose(bb.xlen, 40) and isclose(bb.zlen, ths.ht.height, abs_tol=1e-5)
+    # Two holes were cut and threads added to both
+    threads: float = mesh_volume(int_threads(ths, ThreadOptions(native_helix=True)))
+    hole: float = pi * ths.int_helix_radius**2 * ths.ht.height
+    expected: float = mesh_volume(plate) - 2 * hole + 2 * threads
+    assert isclose(mesh_volume(solid), expected, abs_tol=threads / 100)
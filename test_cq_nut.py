@@ -0,0 +1,40 @@
+from dataclasses import replace
+from math import isclose
+from typing import List, cast
+
+import cadquery as cq
+from helical_thread import ThreadHelixes, helical_thread
+
+from cq_batch import build_part, export_part
+from cq_nut import cq_nut
+from cq_params import PartParams, load_params
+from mesh_diff import MeshDiff, diff_stl
+
+
+def test_cq_nut_no_union() -> None:
+    params: PartParams = PartParams(part="nut")
+    ths: ThreadHelixes = helical_thread(params.helical_thread())
+
+    nut: cq.Workplane = cq_nut(ths, params.head_size)
+    assert len(nut.vals()) == 1
+    union_volume: float = cast(cq.Solid, nut.val()).Volume()
+
+    # The core and threads which overlap by thread_overlap
+    parts: cq.Workplane = cq_nut(ths, params.head_size, union=False)
+    solids: List[cq.Solid] = [cast(cq.Solid, v) for v in parts.vals()]
+    assert len(solids) == 2
+    assert all(isinstance(s, cq.Solid) for s in parts.vals())
+    volume: float = sum(s.Volume() for s in solids)
+    assert volume > union_volume
+    assert isclose(volume, union_volume, rel_tol=0.01)
+
+
+def test_golden(tmp_path) -> None:
+    # The golden file in generated/ was built from threads.ini with fitted
+    # helixes, the exact helixes are within 0.007 of them
+    golden: PartParams = load_params("nut")
+    params: PartParams = replace(golden, native_helix=True)
+    path: str = str(tmp_path / params.fname())
+    export_part(build_part(params), params, path)
+    d: MeshDiff = diff_stl(path, golden.path())
+    assert d.problems(tolerance=0.02) == []
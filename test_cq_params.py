@@ -0,0 +1,116 @@
+import argparse
+import os
+from dataclasses import replace
+from math import isclose
+from typing import List, Set
+
+import pytest
+
+from cq_params import (
+    PartParams,
+    add_arguments,
+    compile_config,
+    expand_grid,
+    load_params,
+    params_from_args,
+    parse_values,
+)
+
+
+@pytest.mark.parametrize("part", ["bolt", "nut"])
+def test_load_params_fname(part) -> None:
+    # The files in generated/ were created using threads.ini
+    params: PartParams = load_params(part)
+    assert os.path.exists(params.path())
+
+
+def test_fname_options() -> None:
+    params: PartParams = PartParams()
+    assert params.options() == []
+    variants: List[PartParams] = [
+        replace(params, stl_format="binary"),
+        replace(params, engine="mesh"),
+        replace(params, union=False),
+        replace(params, replicate=True),
+        replace(params, native_helix=True),
+        replace(params, chunks=2),
+        replace(params, angular_tolerance=0.2),
+        replace(params, core_tolerance=1e-2),
+        replace(params, core_angular_tolerance=0.5),
+        replace(params, max_triangles=1000),
+        replace(params, quality="preview"),
+        replace(params, native_helix=True, quality="preview"),
+    ]
+    names: Set[str] = {p.fname() for p in [params] + variants}
+    assert len(names) == 1 + len(variants)
+    assert (
+        replace(params, native_helix=True, union=False)
+        .fname()
+        .endswith("-tol_0.001-nh-no_union.stl")
+    )
+    # They don't change the triangles
+    assert replace(params, jobs=4).fname() == params.fname()
+    assert replace(params, stl_gzip=True).fname() == f"{params.fname()}.gz"
+
+
+def test_load_params_expressions() -> None:
+    params: PartParams = load_params("bolt")
+    assert params.height == 10 + (2 * params.inset)
+    assert params.major_cutoff == params.pitch / 8
+    assert params.head_height == 4
+
+    nut: PartParams = load_params("nut")
+    assert nut.taper_out_rpos == 0.05
+
+
+def test_compile_config(tmp_path) -> None:
+    fname: str = str(tmp_path / "threads.ini")
+    with open(fname, "w") as f:
+        f.write("[DEFAULT]\npitch = 1.5\n[bolt]\n[nut]\nheight = 4 * pitch\n")
+
+    # Evaluated once until the file changes
+    assert compile_config(fname) is compile_config(fname)
+    assert load_params("nut", fname).height == 6
+    assert load_params("bolt", fname).pitch == 1.5
+
+    # Changing a loaded PartParams doesn't change the cached one
+    load_params("nut", fname).height = 1
+    assert load_params("nut", fname).height == 6
+
+    with open(fname, "w") as f:
+        f.write("[DEFAULT]\npitch = 1.25\n[bolt]\n[nut]\nheight = 4 * pitch\n")
+    assert load_params("nut", fname).height == 5
+
+    # Missing files are the defaults
+    assert load_params("nut", str(tmp_path / "missing.ini")) == PartParams(part="nut")
+
+
+def test_parse_values() -> None:
+    assert parse_values("1,1.5,2") == [1, 1.5, 2]
+    vals = parse_values("6:10:0.5")
+    assert len(vals) == 9
+    assert isclose(vals[-1], 10)
+    with pytest.raises(ValueError):
+        parse_values("1:2:0")
+
+
+def test_expand_grid() -> None:
+    base: PartParams = PartParams(part="nut")
+    jobs = expand_grid(base, {"pitch": [1, 2], "dia_major": [6, 8, 10]})
+    assert len(jobs) == 6
+    assert {(j.pitch, j.dia_major) for j in jobs} == {
+        (p, d) for p in (1, 2) for d in (6, 8, 10)
+    }
+    assert all(j.part == "nut" for j in jobs)
+    assert expand_grid(base, {}) == [base]
+    with pytest.raises(ValueError):
+        expand_grid(base, {"not_a_field": [1]})
+
+
+def test_params_from_args() -> None:
+    params: PartParams = PartParams()
+    parser = argparse.ArgumentParser()
+    add_arguments(parser, params)
+    assert params_from_args(parser.parse_args([]), params) == params
+    result: PartParams = params_from_args(parser.parse_args(["-r", "-p", "1"]), params)
+    assert result.replicate and (result.pitch == 1)
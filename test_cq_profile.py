@@ -0,0 +1,73 @@
+import json
+import pstats
+
+from cq_profile import Profiler, Stage, set_profiler, stage
+
+
+def test_disabled() -> None:
+    assert set_profiler(None) is None
+    s: Stage
+    with stage("a") as s:
+        assert not s.enabled
+        s.count(faces=1)
+    assert stage("b") is stage("c")
+
+
+def test_stages(tmp_path) -> None:
+    profiler: Profiler = Profiler()
+    set_profiler(profiler)
+    try:
+        profiler.start()
+        s: Stage
+        with stage("outer") as s:
+            assert s.enabled
+            for i in range(3):
+                with stage("inner") as s:
+                    s.count(faces=2, edges=i)
+        profiler.stop()
+    finally:
+        assert set_profiler(None) is profiler
+
+    assert [r.name for r in profiler.records] == ["inner"] * 3 + ["outer"]
+    assert [r.depth for r in profiler.records] == [1, 1, 1, 0]
+    assert profiler.records[-1].seconds >= sum(r.seconds for r in profiler.records[:3])
+
+    summary = profiler.summary()
+    assert summary["inner"]["calls"] == 3
+    assert summary["inner"]["counts"] == {"faces": 6, "edges": 3}
+    assert summary["outer"]["counts"] == {}
+
+    path: str = str(tmp_path / "profile.json")
+    profiler.dump(path)
+    with open(path) as f:
+        report = json.load(f)
+    assert report["summary"] == summary
+    assert len(report["stages"]) == 4
+
+
+def test_pstats(tmp_path) -> None:
+    profiler: Profiler = Profiler(cprofile=True)
+    profiler.start()
+    sorted(range(1000), key=lambda v: -v)
+    profiler.stop()
+
+    path: str = str(tmp_path / "profile.prof")
+    profiler.dump(path)
+    assert pstats.Stats(path).get_stats_profile().func_profiles
+
+
+def test_stage_rss() -> None:
+    profiler: Profiler = Profiler()
+    set_profiler(profiler)
+    try:
+        with stage("allocate"):
+            kept: bytes = b"x" * (64 * 1024 * 1024)
+        with stage("after"):
+            pass
+    finally:
+        set_profiler(None)
+    # Each stage records its own change, not the peak of the process
+    allocate, after = profiler.records
+    assert allocate.rss_mb > 32
+    assert abs(after.rss_mb) < 8
+    assert len(kept) > 0
@@ -0,0 +1,129 @@
+import gzip
+import struct
+import time
+from dataclasses import replace
+from typing import cast
+
+import cadquery as cq
+import numpy as np
+
+from cq_batch import build_part
+from cq_params import PartParams, load_params
+from cq_stl import export_stl, is_core, shape_mesh, tessellate, tessellate_budget
+from mesh import is_closed, merge_vertices, volume
+
+
+def test_export_stl(tmp_path) -> None:
+    box: cq.Workplane = cq.Workplane("XY").box(1, 2, 3)
+
+    ascii_path: str = str(tmp_path / "box.stl")
+    r = export_stl(box, ascii_path, 1e-3)
+    with open(ascii_path, "rb") as f:
+        data: bytes = f.read()
+    assert r.bytes == len(data)
+    assert data.startswith(b"solid")
+    assert data.count(b"facet normal") == 12
+
+    binary_path: str = str(tmp_path / "box-binary.stl")
+    r = export_stl(box, binary_path, 1e-3, stl_format="binary")
+    with open(binary_path, "rb") as f:
+        data = f.read()
+    assert r.bytes == len(data) == 84 + (12 * 50)
+    assert struct.unpack("<I", data[80:84])[0] == 12
+
+    gzip_path: str = str(tmp_path / "box-binary.stl.gz")
+    r = export_stl(box, gzip_path, 1e-3, stl_format="binary", compress=True)
+    with gzip.open(gzip_path, "rb") as f:
+        assert f.read() == data
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_export_stl_tolerances(tmp_path) -> None:
+    # The cylinder is a core Solid, the sphere isn't
+    cylinder: cq.Shape = cq.Solid.makeCylinder(5, 10)
+    sphere: cq.Shape = cq.Solid.makeSphere(3, cq.Vector(0, 0, 20))
+    assert is_core(cylinder) and not is_core(sphere)
+    shape: cq.Compound = cq.Compound.makeCompound([cylinder, sphere])
+    path: str = str(tmp_path / "shape.stl")
+
+    fine = export_stl(shape, path, 1e-3, stl_format="binary")
+    assert fine.bytes == 84 + (fine.triangles * 50)
+    assert 0 < fine.deviation
+
+    coarse = export_stl(
+        shape,
+        path,
+        1e-3,
+        stl_format="binary",
+        core_tolerance=0.1,
+        core_angular_tolerance=0.5,
+    )
+    assert coarse.triangles < fine.triangles
+    assert coarse.deviation > fine.deviation
+
+    # The same as fine, the previous tessellation isn't used
+    assert export_stl(shape, path, 1e-3).triangles == fine.triangles
+
+    max_triangles: int = fine.triangles // 4
+    budget = export_stl(shape, path, 1e-3, max_triangles=max_triangles)
+    assert 0 < budget.triangles <= max_triangles
+    assert budget.deviation > fine.deviation
+
+
+def test_tessellate_union_core() -> None:
+    # The default bolt is one Solid, its core faces are tessellated with
+    # the core tolerances and it's still watertight
+    params: PartParams = replace(load_params("bolt"), native_helix=True)
+    shape: cq.Shape = cast(cq.Shape, cast(cq.Workplane, build_part(params)).val())
+    assert not is_core(shape.Solids()[0])
+
+    fine: int = tessellate_budget(shape, 1e-3, 0.1)
+    coarse: int = tessellate_budget(shape, 1e-3, 0.1, 1e-2, 0.5)
+    assert coarse < fine
+    assert is_closed(merge_vertices(shape_mesh(shape)))
+
+
+def test_export_stl_jobs(tmp_path) -> None:
+    shape: cq.Shape = cq.Solid.makeSphere(3).fuse(cq.Solid.makeCylinder(1, 5))
+    paths = [str(tmp_path / f"jobs-{jobs}.stl") for jobs in (1, 4)]
+    results = [
+        export_stl(shape, path, 1e-3, stl_format="binary", jobs=jobs)
+        for path, jobs in zip(paths, (1, 4))
+    ]
+    assert results[0].triangles == results[1].triangles
+    # Tessellating the faces in parallel creates the same file
+    with open(paths[0], "rb") as f0, open(paths[1], "rb") as f1:
+        assert f0.read() == f1.read()
+
+
+def test_shape_mesh() -> None:
+    box: cq.Shape = cq.Solid.makeBox(1, 2, 3, cq.Vector(0.1, 0, 0))
+    tessellate(box, 1e-3)
+    mesh = shape_mesh(box)
+    assert len(mesh.faces) == 12
+    assert np.isclose(volume(mesh), 6)
+    # Rounded to floats by the stl file
+    assert np.allclose(mesh.vertices.min(axis=0), [0.1, 0, 0], rtol=0, atol=1e-6)
+
+    # The location of a moved shape is applied
+    moved: cq.Shape = box.moved(cq.Location(cq.Vector(0, 0, 0.1)))
+    mesh = shape_mesh(moved)
+    assert np.isclose(volume(mesh), 6)
+    assert np.allclose(mesh.vertices.min(axis=0), [0.1, 0, 0.1])
+
+
+def test_shape_mesh_budget(tmp_path) -> None:
+    # The triangles of a finely tessellated part are read in bulk, a small
+    # fraction of the time to export it
+    params: PartParams = replace(load_params("nut"), native_helix=True)
+    shape: cq.Shape = cast(cq.Shape, cast(cq.Workplane, build_part(params)).val())
+    start: float = time.perf_counter()
+    r = export_stl(shape, str(tmp_path / "nut.stl"), 1e-4, stl_format="binary")
+    export_seconds: float = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mesh = shape_mesh(shape)
+    assert time.perf_counter() - start < export_seconds / 10
+    assert len(mesh.faces) == r.triangles > 50000
+    assert mesh.deviation == r.deviation
+    assert is_closed(merge_vertices(mesh))
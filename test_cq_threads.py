@@ -8,6 +8,13 @@ import cadquery as cq
 import pytest
 from helical_thread import HelicalThread, ThreadHelixes, helical_thread
 
+from cq_threads import (
+    ThreadCache,
+    ThreadOptions,
+    ext_threads,
+    int_threads,
+    set_thread_cache,
+)
 from utils import (
     X,
     Y,
@@ -190,6 +197,84 @@ def test_ext_clearance(
         nxipts = [(x, y + pitch) for x, y in nxipts]
 
 
+def test_thread_cache(tmp_path) -> None:
+    ht = HelicalThread(
+        height=height,
+        pitch=pitch,
+        radius=radius,
+        angle_degs=angle_degs,
+        major_cutoff=major_cutoff,
+        minor_cutoff=minor_cutoff,
+        thread_overlap=thread_overlap,
+        inset_offset=inset,
+        taper_out_rpos=0.1,
+        taper_in_rpos=0.9,
+        ext_clearance=ext_clearance,
+    )
+    ths: ThreadHelixes = helical_thread(ht)
+
+    cache = ThreadCache(str(tmp_path))
+    prev = set_thread_cache(cache)
+    try:
+        threads1 = int_threads(ths)
+        threads2 = int_threads(ths)
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert threads1.wrapped.IsSame(threads2.wrapped) is False
+        assert isclose(threads1.Volume(), threads2.Volume())
+
+        # A new cache with the same directory reads the BREP file
+        cache = ThreadCache(str(tmp_path))
+        set_thread_cache(cache)
+        threads3 = int_threads(ths)
+        assert (cache.disk_hits, cache.misses) == (1, 0)
+        assert isclose(threads1.Volume(), threads3.Volume())
+    finally:
+        set_thread_cache(prev)
+
+
+@pytest.mark.parametrize("thread_height", [4.5, 21])
+@pytest.mark.parametrize(
+    "opts",
+    [
+        ThreadOptions(replicate=True),
+        ThreadOptions(native_helix=True),
+        ThreadOptions(replicate=True, native_helix=True),
+    ],
+)
+def test_sectioned(thread_height, opts) -> None:
+    ht = HelicalThread(
+        height=thread_height,
+        pitch=pitch,
+        radius=radius,
+        angle_degs=angle_degs,
+        major_cutoff=major_cutoff,
+        minor_cutoff=minor_cutoff,
+        thread_overlap=thread_overlap,
+        inset_offset=0.25,
+        taper_out_rpos=0.05,
+        taper_in_rpos=0.95,
+        ext_clearance=0.05,
+    )
+    ths: ThreadHelixes = helical_thread(ht)
+    threads: cq.Solid = ext_threads(ths, opts)
+    assert threads.isValid()
+
+    # Volume of the untapered thread from the profile using Pappus's theorem,
+    # the tapered ends are about half the volume of an untapered thread
+    pts = [(hl.radius + hl.horz_offset, hl.vert_offset) for hl in ths.ext_helixes]
+    area2: float = 0
+    moment6: float = 0
+    for (x0, y0), (x1, y1) in zip(pts, pts[1:] + pts[:1]):
+        c = (x0 * y1) - (x1 * y0)
+        area2 += c
+        moment6 += (x0 + x1) * c
+    turns: float = (thread_height - 0.5) / pitch
+    volume: float = abs(area2 / 2) * 2 * pi * (moment6 / (3 * area2)) * turns * 0.95
+    # The default integration is inaccurate for the native helix faces
+    # which are many turns long
+    assert isclose(threads.Volume(1e-6), volume, rel_tol=0.01)
+
+
 if __name__ == "__main__" or "cq_editor" in sys.modules:
     test_ext_clearance(0, 0, 0, 0)
     test_ext_clearance(0, 0, 0, 0.001)
@@ -0,0 +1,57 @@
+from dataclasses import replace
+from typing import List
+
+import pytest
+
+from cq_params import PartParams, load_params
+from cq_validate import ParamProblem, check_params, validate_params
+
+
+@pytest.mark.parametrize("part", ["bolt", "nut"])
+def test_validate_params_valid(part) -> None:
+    assert validate_params(load_params(part)) == []
+    assert validate_params(PartParams(part=part)) == []
+
+
+@pytest.mark.parametrize(
+    "overrides,field",
+    [
+        (dict(pitch=0), "pitch"),
+        (dict(angle_degs=180), "angle_degs"),
+        (dict(height=1, inset=0.5), "height"),
+        (dict(taper_out_rpos=0.5, taper_in_rpos=0.5), "taper_in_rpos"),
+        (dict(major_cutoff=1, minor_cutoff=1), "major_cutoff"),
+        (dict(ext_clearance=-0.05), "ext_clearance"),
+        (dict(thread_overlap=-0.001), "thread_overlap"),
+        # The external profile is turned inside out
+        (dict(ext_clearance=3, wall_thickness=0.1), "ext_clearance"),
+        (dict(wall_thickness=4), "wall_thickness"),
+        (dict(part="nut", head_size=8), "head_size"),
+        (dict(head_size=0), "head_size"),
+        (dict(part="nut", head_size=-1), "head_size"),
+        (dict(head_height=0), "head_height"),
+        (dict(part="nut", head_height=-1), "head_height"),
+        (dict(max_triangles=-1), "max_triangles"),
+        (dict(jobs=-1), "jobs"),
+        (dict(chunks=0), "chunks"),
+        # Only 5 turns
+        (dict(chunks=6), "chunks"),
+    ],
+)
+def test_validate_params_errors(overrides, field) -> None:
+    params: PartParams = replace(PartParams(), **overrides)
+    problems: List[ParamProblem] = validate_params(params)
+    assert all(p.error for p in problems)
+    assert field == problems[0].field
+    with pytest.raises(ValueError, match=field):
+        check_params(params)
+
+
+def test_validate_params_warnings() -> None:
+    params: PartParams = PartParams(union=False, core_tolerance=0.01, head_size=6)
+    problems: List[ParamProblem] = check_params(params)
+    assert [(p.field, p.error) for p in problems] == [
+        ("head_size", False),
+        ("core_tolerance", False),
+    ]
+    assert str(problems[0]).startswith("warning: head_size: ")
@@ -0,0 +1,48 @@
+import time
+from typing import Optional
+
+import pytest
+
+from cq_params import PartParams
+from cq_validate import validate_params
+from cq_watchdog import FALLBACKS, Limits, run_limited
+
+
+def _fail() -> None:
+    raise ValueError("failed")
+
+
+def _allocate(mb: int) -> int:
+    return len(bytearray(mb * 1024 * 1024))
+
+
+def test_run_limited() -> None:
+    assert run_limited(sum, ([1, 2, 3],), Limits()) == (6, None)
+
+    error: Optional[str]
+    _, error = run_limited(_fail, (), Limits())
+    assert error is not None and "ValueError: failed" in error
+
+
+def test_run_limited_timeout() -> None:
+    start: float = time.perf_counter()
+    result, error = run_limited(time.sleep, (60,), Limits(timeout=0.5))
+    assert time.perf_counter() - start < 10
+    assert result is None
+    assert error is not None and error.startswith("timed out")
+
+
+def test_run_limited_memory() -> None:
+    limits: Limits = Limits(max_memory_mb=100)
+    assert run_limited(_allocate, (10,), limits) == (10 * 1024 * 1024, None)
+    _, error = run_limited(_allocate, (1000,), limits)
+    assert error is not None and "MemoryError" in error
+
+
+@pytest.mark.parametrize("name", list(FALLBACKS))
+def test_fallbacks(name: str) -> None:
+    params: PartParams = PartParams()
+    fallback: PartParams = FALLBACKS[name](params)
+    assert validate_params(fallback) == []
+    assert fallback.stl_tolerance > params.stl_tolerance
+    assert fallback.helical_thread() == params.helical_thread()
@@ -0,0 +1,112 @@
+import gzip
+import struct
+from math import isclose
+
+import numpy as np
+import pytest
+
+from mesh import (
+    Mesh,
+    concatenate,
+    is_closed,
+    merge_vertices,
+    read_stl,
+    volume,
+    write_stl,
+)
+
+# A cube with sides of length 1 as 12 triangles
+CUBE_VERTICES: np.ndarray = np.array(
+    [[x, y, z] for z in (0, 1) for y in (0, 1) for x in (0, 1)], dtype=float
+)
+CUBE_FACES: np.ndarray = np.array(
+    [
+        [0, 2, 1],
+        [1, 2, 3],
+        [4, 5, 6],
+        [5, 7, 6],
+        [0, 1, 4],
+        [1, 5, 4],
+        [2, 6, 3],
+        [3, 6, 7],
+        [0, 4, 2],
+        [2, 4, 6],
+        [1, 3, 5],
+        [3, 7, 5],
+    ]
+)
+
+
+def test_volume_closed() -> None:
+    cube: Mesh = Mesh(CUBE_VERTICES, CUBE_FACES)
+    assert is_closed(cube)
+    assert isclose(volume(cube), 1)
+    assert isclose(volume(Mesh(CUBE_VERTICES, CUBE_FACES[:, ::-1])), -1)
+    assert not is_closed(Mesh(CUBE_VERTICES, CUBE_FACES[1:]))
+
+    two: Mesh = concatenate([cube, cube.translate((2, 0, 0))])
+    assert is_closed(two)
+    assert isclose(volume(two), 2)
+    assert np.array_equal(two.faces[12:], CUBE_FACES + 8)
+
+
+def test_merge_vertices() -> None:
+    # Each face has its own vertices as in an stl file
+    cube: Mesh = Mesh(
+        CUBE_VERTICES[CUBE_FACES].reshape(-1, 3), np.arange(36).reshape(-1, 3)
+    )
+    assert not is_closed(cube)
+    merged: Mesh = merge_vertices(cube)
+    assert len(merged.vertices) == 8
+    assert is_closed(merged)
+
+    # A degenerate face is removed
+    degenerate: Mesh = Mesh(CUBE_VERTICES, np.concatenate([CUBE_FACES, [[0, 0, 1]]]))
+    assert len(merge_vertices(degenerate).faces) == 12
+
+
+def test_write_stl(tmp_path) -> None:
+    cube: Mesh = Mesh(CUBE_VERTICES, CUBE_FACES)
+
+    ascii_path: str = str(tmp_path / "cube.stl")
+    size: int = write_stl(cube, ascii_path)
+    with open(ascii_path, "rb") as f:
+        data: bytes = f.read()
+    assert size == len(data)
+    assert data.startswith(b"solid")
+    assert data.count(b"facet normal") == 12
+
+    binary_path: str = str(tmp_path / "cube-binary.stl")
+    size = write_stl(cube, binary_path, "binary")
+    with open(binary_path, "rb") as f:
+        data = f.read()
+    assert size == len(data) == 84 + (12 * 50)
+    assert struct.unpack("<I", data[80:84])[0] == 12
+    first: tuple = struct.unpack("<12f", data[84:132])
+    assert first[:3] == (0, 0, -1)
+    assert first[3:] == tuple(CUBE_VERTICES[CUBE_FACES[0]].ravel())
+
+    gzip_path: str = str(tmp_path / "cube-binary.stl.gz")
+    write_stl(cube, gzip_path, "binary", compress=True)
+    with gzip.open(gzip_path, "rb") as f:
+        assert f.read() == data
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_read_stl(tmp_path) -> None:
+    cube: Mesh = Mesh(CUBE_VERTICES, CUBE_FACES)
+    for stl_format in ("ascii", "binary"):
+        for compress in (False, True):
+            name: str = f"cube-{stl_format}.stl" + (".gz" if compress else "")
+            path: str = str(tmp_path / name)
+            write_stl(cube, path, stl_format, compress)
+            read: Mesh = read_stl(path)
+            assert len(read.faces) == 12
+            assert np.allclose(read.triangles(), cube.triangles())
+            assert is_closed(merge_vertices(read))
+
+    not_stl: str = str(tmp_path / "not.stl")
+    with open(not_stl, "wb") as f:
+        f.write(b"x" * 100)
+    with pytest.raises(ValueError):
+        read_stl(not_stl)
@@ -0,0 +1,42 @@
+import zipfile
+from math import isclose
+
+import numpy as np
+
+from mesh import Mesh, volume
+from mesh_3mf import Component, read_3mf, translation, write_3mf
+from test_mesh import CUBE_FACES, CUBE_VERTICES
+
+
+def test_write_3mf(tmp_path) -> None:
+    # Each vertex of each facet, as read from an stl file
+    cube: Mesh = Mesh(CUBE_VERTICES, CUBE_FACES)
+    facets: Mesh = Mesh(cube.triangles().reshape(-1, 3), np.arange(36).reshape(-1, 3))
+    # A quarter turn about z and moved 5 along x
+    turn: np.ndarray = np.array([[0, -1, 0, 5], [1, 0, 0, 0], [0, 0, 1, 0]], float)
+    components = [
+        Component("cube", facets, [translation(0, 0), turn]),
+        Component("big", Mesh(CUBE_VERTICES * 2, CUBE_FACES), [translation(0, 0, 3)]),
+    ]
+    path: str = str(tmp_path / "kit.3mf")
+    size: int = write_3mf(path, components)
+
+    with zipfile.ZipFile(path) as zf:
+        model: bytes = zf.read("3D/3dmodel.model")
+    assert size > 0
+    # The vertices are merged and the cube is written once
+    assert model.count(b"<vertex ") == 16
+    assert model.count(b"<triangle ") == 24
+    assert model.count(b"<component ") == 3
+
+    mesh: Mesh = read_3mf(path)
+    assert len(mesh.faces) == 36
+    assert isclose(volume(mesh), 1 + 1 + 8)
+    assert np.allclose(mesh.vertices.min(axis=0), [0, 0, 0])
+    assert np.allclose(mesh.vertices.max(axis=0), [5, 2, 5])
+
+    # The same kit is the same file
+    again: str = str(tmp_path / "again.3mf")
+    write_3mf(again, components)
+    with open(path, "rb") as f0, open(again, "rb") as f1:
+        assert f0.read() == f1.read()
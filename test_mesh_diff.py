@@ -0,0 +1,67 @@
+from math import isclose
+
+import numpy as np
+
+from mesh import Mesh, write_stl
+from mesh_diff import (
+    MeshDiff,
+    deviation,
+    diff_meshes,
+    diff_stl,
+    mesh_stats,
+    triangle_distances,
+)
+from test_mesh import CUBE_FACES, CUBE_VERTICES
+
+
+def test_triangle_distances() -> None:
+    tri: np.ndarray = np.array([[0, 0, 0], [2, 0, 0], [0, 2, 0]], dtype=float)
+    points: np.ndarray = np.array(
+        [[0.5, 0.5, 1], [0.5, 0.5, -2], [3, 0, 0], [-1, -1, 0], [1, 1, 0]]
+    )
+    d: np.ndarray = triangle_distances(points, tri)
+    assert np.allclose(d, [1, 2, 1, np.sqrt(2), 0])
+
+
+def test_mesh_stats() -> None:
+    cube: Mesh = Mesh(CUBE_VERTICES * 2, CUBE_FACES)
+    stats = mesh_stats(cube.translate((1, 0, 0)))
+    assert stats.triangles == 12
+    assert isclose(stats.volume, 8)
+    assert isclose(stats.area, 24)
+    assert stats.bbox_min == (1, 0, 0)
+    assert stats.bbox_max == (3, 2, 2)
+
+
+def test_deviation() -> None:
+    cube: Mesh = Mesh(CUBE_VERTICES, CUBE_FACES)
+    # The same surface with the faces in another order and split differently
+    other: Mesh = Mesh(CUBE_VERTICES, np.roll(CUBE_FACES[::-1], 1, axis=1))
+    assert deviation(cube, other) == 0
+    assert isclose(deviation(cube, cube.translate((0, 0, 0.01))), 0.01)
+
+    # A vertex in the middle of a long thin triangle isn't near its vertices
+    sliver: Mesh = Mesh(
+        np.array([[0, 0, 0], [100, 0, 0], [0, 0.1, 0], [50, 0.05, 0.5]]),
+        np.array([[0, 1, 2]]),
+    )
+    bump: Mesh = Mesh(sliver.vertices, np.array([[0, 3, 2], [3, 1, 2]]))
+    assert isclose(deviation(sliver, bump), 0.5)
+
+
+def test_diff_stl(tmp_path) -> None:
+    cube: Mesh = Mesh(CUBE_VERTICES, CUBE_FACES)
+    golden: str = str(tmp_path / "golden.stl")
+    write_stl(cube, golden)
+    binary: str = str(tmp_path / "binary.stl")
+    write_stl(cube, binary, "binary")
+
+    d: MeshDiff = diff_stl(binary, golden)
+    assert d.stats == d.golden
+    assert d.problems(1e-3) == []
+
+    moved: MeshDiff = diff_meshes(cube.translate((0, 0, 0.01)), cube)
+    problems = moved.problems(1e-3)
+    assert len(problems) == 3
+    assert problems[-1].startswith("deviation")
+    assert moved.problems(0.02) == []
@@ -0,0 +1,57 @@
+from dataclasses import replace
+from math import pi
+from typing import List, Tuple
+
+import numpy as np
+
+from cq_batch import build_part, export_part
+from cq_params import PartParams, load_params, pair_params
+from mesh import Mesh, concatenate
+from mesh_fit import FitResult, InsideIndex, check_fit_stl, fit_depths, fit_problems
+from test_mesh import CUBE_FACES, CUBE_VERTICES
+
+
+def test_inside_index() -> None:
+    cube: Mesh = Mesh(CUBE_VERTICES * 2, CUBE_FACES)
+    # Two overlapping shells, as made by the mesh engine
+    index: InsideIndex = InsideIndex(concatenate([cube, cube.translate((1, 0, 0))]))
+    assert index.shells == 2
+    points: np.ndarray = np.array(
+        [[0.5, 1, 1], [1.5, 1, 1], [2.5, 1, 1], [3.5, 1, 1], [1, 1, 3], [-1, 1, 1]]
+    )
+    assert list(index.inside(points)) == [True, True, True, False, False, False]
+
+
+def test_fit_depths() -> None:
+    params: PartParams = load_params("bolt")
+    depths: List[float] = fit_depths(params, 3)
+    assert np.allclose(depths, np.array([1, 2, 3]) * params.height / 4)
+
+
+def test_check_fit(tmp_path) -> None:
+    # Exact helixes so the tessellations are closed
+    params: PartParams = replace(
+        load_params("bolt"), native_helix=True, stl_format="binary"
+    )
+    paths: List[str] = []
+    for p in pair_params(params):
+        paths.append(str(tmp_path / f"{p.part}.stl"))
+        export_part(build_part(p), p, paths[-1])
+
+    results: List[FitResult] = check_fit_stl(
+        paths[0], paths[1], params, [3, 7], phases=(0, pi)
+    )
+    assert [r.depth for r in results] == [3, 3, 7, 7]
+    fits: Tuple[FitResult, FitResult] = (results[0], results[2])
+    for r in fits:
+        assert r.interference == 0
+        # The flanks are closer than the horizontal clearance
+        assert 0.5 * params.ext_clearance < r.clearance < params.ext_clearance
+    assert fit_problems(fits) == []
+    assert fit_problems(fits, params.ext_clearance) != []
+
+    # Half a turn the ridges of the bolt are in the ridges of the nut
+    for r in (results[1], results[3]):
+        assert r.interference > 0
+        assert r.penetration > params.ext_clearance
+    assert len(fit_problems(results)) == 2
@@ -0,0 +1,70 @@
+from math import isclose
+from typing import List
+
+import numpy as np
+import pytest
+from helical_thread import HelicalThread, ThreadHelixes, helical_thread
+
+from cq_threads import ThreadOptions, ext_threads, int_threads
+from mesh import Mesh, is_closed, volume
+from mesh_parts import mesh_bolt, mesh_nut
+from mesh_threads import ext_threads_mesh, helix_points, int_threads_mesh
+
+
+def thread(taper_out_rpos: float, taper_in_rpos: float) -> ThreadHelixes:
+    return helical_thread(
+        HelicalThread(
+            height=11.5,
+            pitch=2,
+            radius=4,
+            angle_degs=90,
+            inset_offset=0.75,
+            ext_clearance=0.1,
+            taper_out_rpos=taper_out_rpos,
+            taper_in_rpos=taper_in_rpos,
+            major_cutoff=0.25,
+            minor_cutoff=0.5,
+            thread_overlap=0.001,
+        )
+    )
+
+
+def test_helix_points() -> None:
+    ths: ThreadHelixes = thread(0.1, 0.9)
+    t: np.ndarray = np.linspace(ths.ht.first_t, ths.ht.last_t, 101)
+    for hl in ths.ext_helixes + ths.int_helixes:
+        f = ths.ht.helix(hl)
+        expected: List = [f(v) for v in t]
+        assert np.allclose(helix_points(ths.ht, hl, t), expected, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("tapers", [(0, 1), (0.1, 0.9), (0, 0.95)])
+def test_threads_mesh(tapers) -> None:
+    # The mesh is compared with the replicated Solid as its volume is
+    # closer to the analytic volume than the Solid fitted to the full length
+    ths: ThreadHelixes = thread(*tapers)
+    opts: ThreadOptions = ThreadOptions(replicate=True)
+
+    ext: Mesh = ext_threads_mesh(ths, 1e-3, 0.1)
+    assert is_closed(ext)
+    assert isclose(volume(ext), ext_threads(ths, opts).Volume(), rel_tol=0.005)
+
+    int_: Mesh = int_threads_mesh(ths, 1e-3, 0.1)
+    assert is_closed(int_)
+    assert isclose(volume(int_), int_threads(ths, opts).Volume(), rel_tol=0.005)
+
+
+def test_mesh_parts() -> None:
+    ths: ThreadHelixes = thread(0.1, 0.9)
+    threads: float = volume(ext_threads_mesh(ths, 1e-3, 0.1))
+
+    bolt: Mesh = mesh_bolt(ths, 12, 4, 2, 1e-3, 0.1)
+    assert is_closed(bolt)
+    head: float = (3 * np.sqrt(3) / 2) * 6 * 6 * 4
+    r: float = ths.ext_helix_radius
+    core: float = np.pi * ((r * r) - ((r - 2) * (r - 2))) * ths.ht.height
+    assert isclose(volume(bolt), head + core + threads, rel_tol=0.001)
+
+    nut: Mesh = mesh_nut(ths, 12, 1e-3, 0.1)
+    assert is_closed(nut)
+    assert volume(nut) > 0
@@ -0,0 +1,124 @@
+from dataclasses import replace
+from math import isnan
+from typing import Dict, List
+
+import numpy as np
+import pytest
+from helical_thread import HelicalThread, ThreadHelixes, helical_thread
+
+from thread_clearance import (
+    CLEARANCE_METRICS,
+    ClearanceViolation,
+    grid_arrays,
+    thread_arrays,
+    thread_profiles,
+    verify_clearances,
+    verify_thread_clearances,
+)
+
+pitch: float = 2
+
+# The parameters of test_cq_threads.test_ext_clearance
+hts: List[HelicalThread] = [
+    HelicalThread(
+        height=4,
+        pitch=pitch,
+        radius=8,
+        angle_degs=90,
+        major_cutoff=major_cutoff,
+        minor_cutoff=minor_cutoff,
+        ext_clearance=ext_clearance,
+        thread_overlap=thread_overlap,
+        taper_in_rpos=0.1,
+        taper_out_rpos=0.9,
+    )
+    for major_cutoff in (0, pitch / 8)
+    for minor_cutoff in (0, pitch / 4)
+    for ext_clearance in (0, 0.05)
+    for thread_overlap in (0, 0.001)
+]
+
+
+def test_thread_profiles() -> None:
+    int_pts, int_n, ext_pts, ext_n = thread_profiles(thread_arrays(hts))
+    assert int_pts.shape == ext_pts.shape == (len(hts), 4, 2)
+    for k, ht in enumerate(hts):
+        ths: ThreadHelixes = helical_thread(ht)
+        for pts, n, helixes in (
+            (int_pts, int_n, ths.int_helixes),
+            (ext_pts, ext_n, ths.ext_helixes),
+        ):
+            assert n[k] == len(helixes)
+            expected = [(hl.radius + hl.horz_offset, hl.vert_offset) for hl in helixes]
+            assert np.array_equal(pts[k, : n[k]], expected)
+            assert np.array_equal(pts[k, -1], expected[-1])
+
+
+def test_verify_clearances() -> None:
+    assert verify_clearances(thread_arrays(hts)) == []
+
+    grid: Dict[str, np.ndarray] = grid_arrays(
+        hts[0],
+        {
+            "pitch": np.arange(0.5, 3, 0.25),
+            "angle_degs": [30, 45, 60, 90],
+            "major_cutoff": [0, 0.05, 0.1],
+            "minor_cutoff": [0, 0.1, 0.2],
+            "ext_clearance": np.arange(0, 0.2, 0.02),
+            "thread_overlap": [0, 1e-3, 1e-2],
+        },
+    )
+    assert len(grid["pitch"]) == 10 * 4 * 3 * 3 * 10 * 3
+    assert verify_clearances(grid) == []
+
+
+def test_verify_clearances_violations() -> None:
+    grid: Dict[str, np.ndarray] = grid_arrays(
+        hts[0], {"ext_clearance": [0.05, -0.05], "minor_cutoff": [0, 2]}
+    )
+    violations: List[ClearanceViolation] = verify_clearances(grid)
+    assert {v.index for v in violations} == {1, 2, 3}
+
+    # The threads interfere, the distances are positive
+    interfere: List[ClearanceViolation] = [v for v in violations if v.index == 2]
+    assert {v.metric for v in interfere} < set(CLEARANCE_METRICS)
+    for v in interfere:
+        assert v.expected < 0 < v.value
+        assert v.params["ext_clearance"] == -0.05
+
+    # The internal threads have no depth
+    assert any(isnan(v.value) for v in violations if v.index == 1)
+
+
+def test_verify_thread_clearances() -> None:
+    grid: Dict[str, np.ndarray] = grid_arrays(
+        hts[0],
+        {
+            "pitch": [1, 2],
+            "angle_degs": [30, 60, 90],
+            "major_cutoff": [0, 0.5],
+            "minor_cutoff": [0, 0.5, 1],
+            "ext_clearance": [-0.05, 0, 0.1],
+        },
+    )
+    expected = [(v.index, v.metric) for v in verify_clearances(grid)]
+    assert expected != []
+
+    violations = []
+    for index in range(len(grid["pitch"])):
+        ht: HelicalThread = replace(
+            hts[0], **{name: float(a[index]) for name, a in grid.items()}
+        )
+        violations += [
+            (index, v.metric) for v in verify_thread_clearances(helical_thread(ht))
+        ]
+    assert sorted(violations) == sorted(expected)
+
+
+def test_grid_arrays() -> None:
+    with pytest.raises(ValueError):
+        grid_arrays(hts[0], {"height": [1, 2]})
+    grid = grid_arrays(hts[0], {"pitch": [1, 2], "radius": [3, 4, 5]})
+    assert list(grid["pitch"]) == [1, 1, 1, 2, 2, 2]
+    assert list(grid["radius"]) == [3, 4, 5, 3, 4, 5]
+    assert list(grid["angle_degs"]) == [90] * 6
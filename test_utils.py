@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from helical_thread import HelicalThread, ThreadHelixes, helical_thread
+
+from utils import (
+    intersectionLines_2d,
+    intersectionLines_2d_np,
+    lineToPtDirection_2d,
+    lineToPtDirection_2d_np,
+    perpendicular_distance_pt_to_line_2d,
+    perpendicular_distance_pt_to_line_2d_np,
+    split_2d,
+    split_2d_np,
+    translate_2d,
+    translate_2d_np,
+)
+
+rng = np.random.default_rng(1234)
+
+
+def _profile(external: bool, **kwargs) -> np.ndarray:
+    ths: ThreadHelixes = helical_thread(
+        HelicalThread(height=4, pitch=2, radius=8, angle_degs=90, **kwargs)
+    )
+    helixes = ths.ext_helixes if external else ths.int_helixes
+    return np.array([(hl.radius + hl.horz_offset, hl.vert_offset) for hl in helixes])
+
+
+def test_translate_and_direction() -> None:
+    pts: np.ndarray = rng.uniform(-10, 10, (100, 2))
+    t = (1.5, -2.25)
+    translated = translate_2d([(p[0], p[1]) for p in pts], t)
+    assert np.array_equal(translate_2d_np(pts, t), np.array(translated))
+
+    l1, l2 = rng.uniform(-10, 10, (2, 2))
+    dirs = [lineToPtDirection_2d(tuple(l1), tuple(l2), tuple(p)) for p in pts]
+    assert np.array_equal(lineToPtDirection_2d_np(l1, l2, pts), np.array(dirs))
+
+
+def test_intersection_and_distance() -> None:
+    lines: np.ndarray = rng.uniform(-10, 10, (100, 4, 2))
+    # Parallel and identical lines
+    lines[0, 2:] = lines[0, :2] + 1
+    lines[1, 2:] = lines[1, :2]
+    expected = [intersectionLines_2d(*[tuple(p) for p in line]) for line in lines]
+    actual = intersectionLines_2d_np(lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3])
+    assert np.array_equal(actual, np.array(expected))
+
+    pts: np.ndarray = lines[:, 0]
+    dists = [
+        perpendicular_distance_pt_to_line_2d(tuple(p), tuple(l[2]), tuple(l[3]))
+        for p, l in zip(pts, lines)
+    ]
+    actual = perpendicular_distance_pt_to_line_2d_np(pts, lines[:, 2], lines[:, 3])
+    assert np.array_equal(actual, np.array(dists))
+
+
+@pytest.mark.parametrize("retAbove", [True, False])
+@pytest.mark.parametrize(
+    "pts",
+    [
+        _profile(False, major_cutoff=0.25, minor_cutoff=0.5),
+        _profile(True, major_cutoff=0.25, minor_cutoff=0.5),
+        _profile(False),
+        np.array([(0, 0), (2, 0), (2, 2), (0, 2)]),
+    ],
+)
+def test_split(pts, retAbove) -> None:
+    center = pts.mean(axis=0)
+    for angle in np.linspace(0, np.pi, 7):
+        l1 = center
+        l2 = center + (np.cos(angle), np.sin(angle))
+        expected = split_2d(
+            tuple(l1), tuple(l2), [tuple(p) for p in pts], retAbove=retAbove
+        )
+        actual = split_2d_np(l1, l2, pts, retAbove=retAbove)
+        assert np.array_equal(actual, np.array(expected).reshape(-1, 2))
+
+    # A batch of the same polygon with different lines
+    l1s = np.repeat(center[np.newaxis, :], 5, axis=0)
+    l2s = l1s + rng.uniform(-1, 1, (5, 2))
+    batch = split_2d_np(l1s, l2s, np.repeat(pts[np.newaxis], 5, axis=0), retAbove)
+    for l1, l2, actual in zip(l1s, l2s, batch):
+        expected = split_2d(
+            tuple(l1), tuple(l2), [tuple(p) for p in pts], retAbove=retAbove
+        )
+        assert np.array_equal(actual, np.array(expected).reshape(-1, 2))
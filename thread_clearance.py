@@ -0,0 +1,310 @@
+import itertools
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from helical_thread import HelicalThread, ThreadHelixes
+
+from utils import (
+    Y,
+    perpendicular_distance_pt_to_line_2d,
+    perpendicular_distance_pt_to_line_2d_np,
+)
+
+# The fields of HelicalThread which define the profiles of the internal
+# and external threads, the others only change where the helixes are
+CLEARANCE_FIELDS: Sequence[str] = (
+    "pitch",
+    "radius",
+    "angle_degs",
+    "major_cutoff",
+    "minor_cutoff",
+    "ext_clearance",
+    "thread_overlap",
+)
+
+# Each metric is the distance from a vertex of one profile to an edge of the
+# other, "int", "ext" or "nxi" (the internal profile one pitch higher), and
+# the index of the vertex or the two vertices of the edge, -1 is the last.
+# The distance is compared with "slope", ext_clearance, or "overlap",
+# ext_clearance + thread_overlap, and must be "==" or ">=" to it.
+CLEARANCE_METRICS: Dict[str, Tuple[str, int, str, int, int, str, str]] = {
+    "ext0_slope": ("ext", 0, "int", 1, 2, "slope", "=="),
+    "extL_slope": ("ext", -1, "int", 1, 2, "slope", "=="),
+    "ext2_major": ("ext", 2, "int", 0, 1, "overlap", ">="),
+    "extL_major": ("ext", -1, "int", 0, 1, "overlap", ">="),
+    "int2_minor": ("int", 2, "ext", 0, 1, "overlap", "=="),
+    "intL_minor": ("int", -1, "ext", 0, 1, "overlap", "=="),
+    "ext1_slope": ("ext", 1, "nxi", 0, -1, "slope", "=="),
+    "ext2_slope": ("ext", 2, "nxi", 0, -1, "slope", "=="),
+}
+
+
+@dataclass
+class ClearanceViolation:
+    """A clearance of one set of parameters which isn't as expected"""
+
+    index: int
+    """Index of the parameter set"""
+
+    metric: str
+    """Name of the metric, a key of CLEARANCE_METRICS"""
+
+    value: float
+    """The distance"""
+
+    expected: float
+    """The distance expected"""
+
+    params: Dict[str, float]
+    """The CLEARANCE_FIELDS of the parameter set"""
+
+
+def thread_arrays(hts: Sequence[HelicalThread]) -> Dict[str, np.ndarray]:
+    """Return the CLEARANCE_FIELDS of hts as arrays"""
+    return {
+        name: np.array([getattr(ht, name) for ht in hts], dtype=float)
+        for name in CLEARANCE_FIELDS
+    }
+
+
+def grid_arrays(
+    base: HelicalThread, grid: Mapping[str, Iterable[float]]
+) -> Dict[str, np.ndarray]:
+    """
+    Return the CLEARANCE_FIELDS of every combination of the values in
+    grid as arrays, the same order as cq_params.expand_grid.
+
+    :param base: the values of fields not in grid
+    :param grid: field name to a sequence of values for that field
+    """
+    for name in grid:
+        if name not in CLEARANCE_FIELDS:
+            raise ValueError(f"{name} is not one of {', '.join(CLEARANCE_FIELDS)}")
+    names: List[str] = list(grid)
+    combos: np.ndarray = np.array(
+        list(itertools.product(*(grid[name] for name in names))), dtype=float
+    ).reshape(-1, len(names))
+    return {
+        name: (
+            combos[:, names.index(name)]
+            if name in grid
+            else np.full(len(combos), getattr(base, name), dtype=float)
+        )
+        for name in CLEARANCE_FIELDS
+    }
+
+
+def _field_arrays(threads: Mapping[str, npt.ArrayLike]) -> Dict[str, np.ndarray]:
+    """Return the CLEARANCE_FIELDS of threads broadcast together and flattened"""
+    arrays: Tuple[np.ndarray, ...] = np.broadcast_arrays(
+        *(np.asarray(threads[name], dtype=float) for name in CLEARANCE_FIELDS)
+    )
+    return {name: a.ravel() for name, a in zip(CLEARANCE_FIELDS, arrays)}
+
+
+def thread_profiles(
+    threads: Mapping[str, npt.ArrayLike],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the profiles of the internal and external threads for every
+    set of parameters. This is a vectorized version of helical_thread,
+    each point is the (radius + horz_offset, vert_offset) of a helix.
+
+    The profiles have 3 or 4 points, they're (K, 4, 2) arrays and the
+    third point is repeated if there are only 3, so the last point is
+    always [:, -1].
+
+    :param threads: The CLEARANCE_FIELDS, arrays which are broadcast together
+    :returns: int_pts, int_n, ext_pts, ext_n, the points and number of points
+    """
+    f: Dict[str, np.ndarray] = _field_arrays(threads)
+    pitch: np.ndarray = f["pitch"]
+    radius: np.ndarray = f["radius"]
+    major: np.ndarray = f["major_cutoff"]
+    minor: np.ndarray = f["minor_cutoff"]
+    clearance: np.ndarray = f["ext_clearance"]
+    overlap: np.ndarray = f["thread_overlap"]
+
+    half_angle: np.ndarray = np.radians(f["angle_degs"]) / 2
+    tan_hangle: np.ndarray = np.tan(half_angle)
+    sin_hangle: np.ndarray = np.sin(half_angle)
+    tip_to_major_cutoff: np.ndarray = ((pitch - major) / 2) / tan_hangle
+    tip_to_minor_cutoff: np.ndarray = (minor / 2) / tan_hangle
+    int_depth: np.ndarray = tip_to_major_cutoff - tip_to_minor_cutoff
+    overlap_vert_adj: np.ndarray = overlap * tan_hangle
+    int_half_height: np.ndarray = ((pitch - major) / 2) + overlap_vert_adj
+    int_opposite_half_height: np.ndarray = minor / 2
+
+    int_x: np.ndarray = radius + overlap
+    int_tip_x: np.ndarray = radius - int_depth
+    int_pts: np.ndarray = np.stack(
+        [
+            np.stack([int_x, -int_half_height], axis=-1),
+            np.stack([int_x, int_half_height], axis=-1),
+            np.stack([int_tip_x, int_opposite_half_height], axis=-1),
+            np.stack([int_tip_x, -int_opposite_half_height], axis=-1),
+        ],
+        axis=1,
+    )
+    int_n: np.ndarray = np.where(minor > 0, 4, 3)
+
+    # See helical_thread for the derivation of the external profile
+    ext_vert_adj: np.ndarray = ((clearance / sin_hangle) - clearance) * tan_hangle
+    ext_radius: np.ndarray = radius - int_depth - clearance
+    ext_half_height: np.ndarray = ((pitch - minor) / 2) - ext_vert_adj
+    ext_opposite_half_height: np.ndarray = (major / 2) - ext_vert_adj
+    ext_depth: np.ndarray = np.where(
+        ext_opposite_half_height < 0, ext_half_height / tan_hangle, int_depth
+    )
+    ext_opposite_half_height = np.maximum(ext_opposite_half_height, 0)
+
+    ext_x: np.ndarray = ext_radius - overlap
+    ext_tip_x: np.ndarray = ext_radius + ext_depth
+    ext_pts: np.ndarray = np.stack(
+        [
+            np.stack([ext_x, -(ext_half_height + overlap_vert_adj)], axis=-1),
+            np.stack([ext_x, ext_half_height + overlap_vert_adj], axis=-1),
+            np.stack([ext_tip_x, ext_opposite_half_height], axis=-1),
+            np.stack([ext_tip_x, -ext_opposite_half_height], axis=-1),
+        ],
+        axis=1,
+    )
+    ext_n: np.ndarray = np.where(ext_opposite_half_height > 0, 4, 3)
+
+    int_pts[int_n == 3, 3] = int_pts[int_n == 3, 2]
+    ext_pts[ext_n == 3, 3] = ext_pts[ext_n == 3, 2]
+    return int_pts, int_n, ext_pts, ext_n
+
+
+def clearance_metrics(
+    threads: Mapping[str, npt.ArrayLike],
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Compute every metric of CLEARANCE_METRICS for every set of parameters
+    in one pass. The external profile is moved up by pitch / 2 so it's
+    between the internal profile and the next internal profile, nxi,
+    which is pitch higher. Every turn of the threads is the same so
+    one turn is enough.
+
+    :param threads: The CLEARANCE_FIELDS, arrays which are broadcast together
+    :returns: The metrics and the distances expected, arrays of shape (K,)
+    """
+    f: Dict[str, np.ndarray] = _field_arrays(threads)
+    int_pts, _, ext_pts, _ = thread_profiles(f)
+    up: np.ndarray = np.zeros((len(int_pts), 1, 2))
+    up[:, 0, Y] = f["pitch"]
+    profiles: Dict[str, np.ndarray] = {
+        "int": int_pts,
+        "ext": ext_pts + (up / 2),
+        "nxi": int_pts + up,
+    }
+    distances: Dict[str, np.ndarray] = {
+        "slope": f["ext_clearance"],
+        "overlap": f["ext_clearance"] + f["thread_overlap"],
+    }
+
+    metrics: Dict[str, np.ndarray] = {}
+    expected: Dict[str, np.ndarray] = {}
+    for name, (pt, i, line, j, k, distance, _) in CLEARANCE_METRICS.items():
+        # The edges of degenerate profiles have no length and the metric is nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            metrics[name] = perpendicular_distance_pt_to_line_2d_np(
+                profiles[pt][:, i], profiles[line][:, j], profiles[line][:, k]
+            )
+        expected[name] = distances[distance]
+    return metrics, expected
+
+
+def verify_clearances(
+    threads: Mapping[str, npt.ArrayLike], abs_tol: float = 1e-9
+) -> List[ClearanceViolation]:
+    """
+    Verify the clearances between the internal and external threads of
+    every set of parameters, see CLEARANCE_METRICS. Tens of thousands of
+    sets take milliseconds so a grid can be verified before it's built.
+
+    :param threads: The CLEARANCE_FIELDS, arrays which are broadcast
+                    together, see thread_arrays and grid_arrays
+    :param abs_tol: The absolute tolerance of the comparisons
+    :returns: The violations ordered by the index of the parameter set,
+              empty if every clearance is as expected, the value of
+              a violation is nan if the profile is degenerate
+    """
+    f: Dict[str, np.ndarray] = _field_arrays(threads)
+    metrics, expected = clearance_metrics(f)
+
+    violations: List[ClearanceViolation] = []
+    for name, (*_, op) in CLEARANCE_METRICS.items():
+        # nan, a degenerate profile, is never ok
+        ok: np.ndarray = np.abs(metrics[name] - expected[name]) <= abs_tol
+        if op == ">=":
+            ok |= metrics[name] > expected[name]
+        for index in np.flatnonzero(~ok):
+            violations.append(
+                ClearanceViolation(
+                    index=int(index),
+                    metric=name,
+                    value=float(metrics[name][index]),
+                    expected=float(expected[name][index]),
+                    params={n: float(f[n][index]) for n in CLEARANCE_FIELDS},
+                )
+            )
+    violations.sort(key=lambda v: v.index)
+    return violations
+
+
+def verify_thread_clearances(
+    ths: ThreadHelixes, abs_tol: float = 1e-9
+) -> List[ClearanceViolation]:
+    """
+    Verify the clearances of one set of parameters, the same as
+    verify_clearances but the profiles are those of ths and it takes
+    microseconds rather than the overhead of numpy.
+
+    :param ths: The helixes returned by helical_thread
+    :param abs_tol: The absolute tolerance of the comparisons
+    :returns: The violations, the index of each is 0
+    """
+    ht: HelicalThread = ths.ht
+    int_pts: List[Tuple[float, float]] = [
+        (hl.radius + hl.horz_offset, hl.vert_offset) for hl in ths.int_helixes
+    ]
+    profiles: Dict[str, List[Tuple[float, float]]] = {
+        "int": int_pts,
+        "ext": [
+            (hl.radius + hl.horz_offset, hl.vert_offset + (ht.pitch / 2))
+            for hl in ths.ext_helixes
+        ],
+        "nxi": [(x, y + ht.pitch) for x, y in int_pts],
+    }
+    distances: Dict[str, float] = {
+        "slope": ht.ext_clearance,
+        "overlap": ht.ext_clearance + ht.thread_overlap,
+    }
+
+    violations: List[ClearanceViolation] = []
+    for name, (pt, i, line, j, k, distance, op) in CLEARANCE_METRICS.items():
+        try:
+            value: float = perpendicular_distance_pt_to_line_2d(
+                profiles[pt][i], profiles[line][j], profiles[line][k]
+            )
+        except ZeroDivisionError:
+            value = math.nan
+        expected: float = distances[distance]
+        ok: bool = abs(value - expected) <= abs_tol
+        if op == ">=":
+            ok = ok or (value > expected)
+        if not ok:
+            violations.append(
+                ClearanceViolation(
+                    index=0,
+                    metric=name,
+                    value=value,
+                    expected=expected,
+                    params={n: float(getattr(ht, n)) for n in CLEARANCE_FIELDS},
+                )
+            )
+    return violations
@@ -1,9 +1,13 @@
 import sys
 from functools import reduce
 from math import radians, sqrt
-from typing import List, Sequence, Tuple, Union, cast
+from typing import TYPE_CHECKING, List, Sequence, Tuple, Union, cast
 
-import cadquery as cq
+import numpy as np
+import numpy.typing as npt
+
+if TYPE_CHECKING:
+    import cadquery as cq
 
 X: int = 0
 Y: int = 1
@@ -40,6 +44,9 @@ if "cq_editor" in sys.modules:
 else:
 
     def show(o: object, name=None):
+        # Imported here so dbg and the 2d functions don't import cadquery
+        import cadquery as cq
+
         if name is None:
             name = str(id(o))
         if o is None:
@@ -292,16 +299,132 @@ def perpendicular_distance_pt_to_line_2d(
     return dist
 
 
-def valid(wp: Union[cq.Workplane, Sequence[cq.Workplane]]) -> bool:
+# Array versions of the 2D functions above, they accept arrays of points
+# whose last dimension is 2, i.e. (2,), (N, 2) or (K, N, 2). The arrays
+# are broadcast against each other so one line can be used with many
+# points or a batch of lines with a batch of points. The results are
+# identical to the scalar versions as the same operations are performed
+# in the same order.
+
+
+def translate_2d_np(pts: npt.ArrayLike, t: npt.ArrayLike) -> np.ndarray:
+    """Translate 2D points to a different location on a plane"""
+    return np.asarray(pts, dtype=float) + np.asarray(t, dtype=float)
+
+
+def lineToPtDirection_2d_np(
+    linePt1: npt.ArrayLike, linePt2: npt.ArrayLike, pts: npt.ArrayLike
+) -> np.ndarray:
+    """
+    Return an array of values which are > 0 if the corresponding point is
+    above the line, < 0 if below and 0 if on the line, see lineToPtDirection_2d.
+    """
+    l1: np.ndarray = np.asarray(linePt1, dtype=float)
+    linePt2_o: np.ndarray = np.asarray(linePt2, dtype=float) - l1
+    pts_o: np.ndarray = np.asarray(pts, dtype=float) - l1
+    return (linePt2_o[..., X] * pts_o[..., Y]) - (linePt2_o[..., Y] * pts_o[..., X])
+
+
+def intersectionLines_2d_np(
+    line1Pt1: npt.ArrayLike,
+    line1Pt2: npt.ArrayLike,
+    line2Pt1: npt.ArrayLike,
+    line2Pt2: npt.ArrayLike,
+) -> np.ndarray:
+    """
+    Return an array of the intersection points of pairs of lines, parallel
+    lines have an intersection of (sys.float_info.max, sys.float_info.max)
+    as in intersectionLines_2d.
+    """
+    l1p1: np.ndarray = np.asarray(line1Pt1, dtype=float)
+    l1p2: np.ndarray = np.asarray(line1Pt2, dtype=float)
+    l2p1: np.ndarray = np.asarray(line2Pt1, dtype=float)
+    l2p2: np.ndarray = np.asarray(line2Pt2, dtype=float)
+
+    # Line1 (a1 * x) + (b1 * y) = c1
+    a1: np.ndarray = l1p2[..., Y] - l1p1[..., Y]
+    b1: np.ndarray = l1p1[..., X] - l1p2[..., X]
+    c1: np.ndarray = (a1 * l1p1[..., X]) + (b1 * l1p1[..., Y])
+
+    # Line2 (a2 * x) + (b2 * y) = c2
+    a2: np.ndarray = l2p2[..., Y] - l2p1[..., Y]
+    b2: np.ndarray = l2p1[..., X] - l2p2[..., X]
+    c2: np.ndarray = (a2 * l2p1[..., X]) + (b2 * l2p1[..., Y])
+
+    determinant: np.ndarray = (a1 * b2) - (a2 * b1)
+    parallel: np.ndarray = determinant == 0
+    d: np.ndarray = np.where(parallel, 1.0, determinant)
+    x: np.ndarray = np.where(parallel, sys.float_info.max, ((b2 * c1) - (b1 * c2)) / d)
+    y: np.ndarray = np.where(parallel, sys.float_info.max, ((a1 * c2) - (a2 * c1)) / d)
+    return np.stack([x, y], axis=-1)
+
+
+def split_2d_np(
+    linePt1: npt.ArrayLike, linePt2: npt.ArrayLike, pts: npt.ArrayLike, retAbove=True,
+) -> Union[np.ndarray, List[np.ndarray]]:
+    """
+    Split the closed 2D object defined by pts (N, 2) using the line,
+    see split_2d. If pts is a batch of objects, (K, N, 2), each is split
+    by the corresponding line and a list of the K resulting arrays is
+    returned as their lengths may differ.
+
+    :param pts: array of 2D points
+    :param retAbove: If True the points >= line are returned else <= line
+    """
+    p: np.ndarray = np.asarray(pts, dtype=float)
+    l1: np.ndarray = np.asarray(linePt1, dtype=float)[..., np.newaxis, :]
+    l2: np.ndarray = np.asarray(linePt2, dtype=float)[..., np.newaxis, :]
+
+    curDir: np.ndarray = lineToPtDirection_2d_np(l1, l2, p)
+    prvPts: np.ndarray = np.roll(p, 1, axis=-2)
+    prvDir: np.ndarray = np.roll(curDir, 1, axis=-1)
+
+    # Points on either side of the line have an interpolated point
+    # added before the current point
+    crossing: np.ndarray = ((curDir > 0) & (prvDir < 0)) | (
+        (curDir < 0) & (prvDir > 0)
+    )
+    wanted: np.ndarray = (curDir >= 0) if retAbove else (curDir <= 0)
+    intrPts: np.ndarray = intersectionLines_2d_np(l1, l2, p, prvPts)
+
+    # Interleave the interpolated and current points then select
+    # the ones that are in the result
+    candidates: np.ndarray = np.stack([intrPts, p], axis=-2)
+    selected: np.ndarray = np.stack([crossing, wanted], axis=-1)
+    if p.ndim == 2:
+        return candidates.reshape(-1, 2)[selected.reshape(-1)]
+    else:
+        return [c.reshape(-1, 2)[s.reshape(-1)] for c, s in zip(candidates, selected)]
+
+
+def perpendicular_distance_pt_to_line_2d_np(
+    pts: npt.ArrayLike, linePt1: npt.ArrayLike, linePt2: npt.ArrayLike,
+) -> np.ndarray:
+    """
+    Return an array of the distances from pts to the lines defined
+    by linePt1 and linePt2, see perpendicular_distance_pt_to_line_2d.
+    """
+    p: np.ndarray = np.asarray(pts, dtype=float)
+    l1: np.ndarray = np.asarray(linePt1, dtype=float)
+    l2: np.ndarray = np.asarray(linePt2, dtype=float)
+    ydist: np.ndarray = l2[..., Y] - l1[..., Y]
+    xdist: np.ndarray = l2[..., X] - l1[..., X]
+    cross: np.ndarray = (l2[..., X] * l1[..., Y]) - (l2[..., Y] * l1[..., X])
+    n: np.ndarray = np.abs((ydist * p[..., X]) - (xdist * p[..., Y]) + cross)
+    d: np.ndarray = np.sqrt((ydist * ydist) + (xdist * xdist))
+    return n / d
+
+
+def valid(wp: Union["cq.Workplane", Sequence["cq.Workplane"]]) -> bool:
     if isinstance(wp, Sequence):
         return reduce(
-            lambda value, s: value and cast(cq.Shape, s.val()).isValid(), wp, True
+            lambda value, s: value and cast("cq.Shape", s.val()).isValid(), wp, True
         )
     else:
-        return cast(cq.Shape, wp.val()).isValid()
+        return cast("cq.Shape", wp.val()).isValid()
 
 
-def updatePending(wp: cq.Workplane) -> cq.Workplane:
+def updatePending(wp: "cq.Workplane") -> "cq.Workplane":
     """
     Clear pendingWires and pendingEdges and then add
     objects that are wires or edges to the appropriate